@@ -0,0 +1,108 @@
+import pandas as pd
+import numpy as np
+import os
+from grid_index import read_tracks_coordinates
+from zones import zone_polygon
+
+# Density grids of the raw points of the tracks (also the parts outside the paths), to draw them as images over the maps. For each zoom, the
+# cells are the pixels of the map at that zoom (256 px tiles in Web Mercator), inside the bounding box of the zone. Only the tiles with points
+# are kept (the finest zoom of a large zone would be millions of empty pixels), with the counts of the points of each pixel, so the grids are
+# updated adding the counts of the new tracks and subtracting the ones of the removed tracks
+
+# Zooms of the grids, and size of the tiles (in pixels)
+density_zooms = [10, 12, 14]
+density_tile_size = 256
+
+# Global pixel coordinates (x and y, the y grows to the south) of some coordinates at a zoom
+def mercator_pixels(lons, lats, zoom):
+
+    world_size = density_tile_size * 2 ** zoom
+    lats = np.radians(np.clip(np.asarray(lats, dtype=float), -85.0511, 85.0511))
+    x = (np.asarray(lons, dtype=float) + 180) / 360 * world_size
+    y = (1 - np.log(np.tan(lats) + 1 / np.cos(lats)) / np.pi) / 2 * world_size
+
+    return x, y
+
+# Pixels of the bounding box of a zone at a zoom (min x, min y, max x, max y)
+def zone_pixel_bounds(bounds, zoom):
+
+    min_lon, min_lat, max_lon, max_lat = bounds
+    (min_x, max_x), (max_y, min_y) = mercator_pixels([min_lon, max_lon], [min_lat, max_lat], zoom)
+
+    return int(np.floor(min_x)), int(np.floor(min_y)), int(np.ceil(max_x)), int(np.ceil(max_y))
+
+# Counts of some points (lat and lon) in the pixels of a zoom inside some pixel bounds - only the tiles with points, each one with the counts
+# of its pixels (rows from the north, columns from the west)
+def points_tiles(points_df, pixel_bounds, zoom):
+
+    min_x, min_y, max_x, max_y = pixel_bounds
+    x, y = mercator_pixels(points_df['lon'].to_numpy(dtype=float), points_df['lat'].to_numpy(dtype=float), zoom)
+    inside = (x >= min_x) & (x < max_x) & (y >= min_y) & (y < max_y)
+    x, y = np.floor(x[inside]).astype(np.int64), np.floor(y[inside]).astype(np.int64)
+
+    # Tile of each point (numbered by rows from the first tile of the zone), and its pixel inside the tile
+    first_x, first_y = min_x // density_tile_size, min_y // density_tile_size
+    tiles_row = (max_x - 1) // density_tile_size - first_x + 1
+    tiles = (y // density_tile_size - first_y) * tiles_row + x // density_tile_size - first_x
+    pixels = (y % density_tile_size) * density_tile_size + x % density_tile_size
+
+    # Points of each tile counted in its pixels
+    order = np.argsort(tiles)
+    tiles, pixels = tiles[order], pixels[order]
+    numbers, starts = np.unique(tiles, return_index=True)
+    ends = np.append(starts[1:], len(tiles))
+    return {(int(first_x + number % tiles_row), int(first_y + number // tiles_row)):
+            np.bincount(pixels[start:end], minlength=density_tile_size ** 2).astype(np.uint32).reshape(density_tile_size, density_tile_size)
+            for number, start, end in zip(numbers, starts, ends)}
+
+# Updates the density grids of a zone with the tracks of the tracks information - only the new and the removed tracks are read (if a removed
+# track does not have its points anymore, or the zone has changed, the grids are created again). Returns the tiles of each zoom and its pixels
+def update_density_grids(data_path, zone, rebuild=False):
+
+    # Paths of the zone
+    output_path = os.path.join(data_path, zone, 'Output-Data')
+    dataframes_path = os.path.join(output_path, 'Data-Frames')
+    all_tracks_path = os.path.join(output_path, 'Tracks-Output', 'All-Tracks')
+    grids_path = os.path.join(dataframes_path, 'density_grids.npz')
+
+    # Current tracks, and the pixels of the zone in each zoom
+    list_tracks = set(pd.read_csv(os.path.join(dataframes_path, 'tracks_info.csv'), usecols=['track_id'])['track_id'].tolist())
+    bounds = zone_polygon(zone, data_path).bounds
+    pixel_bounds = {zoom: zone_pixel_bounds(bounds, zoom) for zoom in density_zooms}
+
+    # Saved grids, only if they have the same zooms and pixels
+    grids, grid_tracks = None, set()
+    if os.path.exists(grids_path) and not rebuild:
+        with np.load(grids_path) as saved:
+            if all(f'tiles_{zoom}' in saved and tuple(saved[f'bounds_{zoom}']) == pixel_bounds[zoom] for zoom in density_zooms):
+                grids = {zoom: dict(zip(map(tuple, saved[f'keys_{zoom}'].tolist()), saved[f'tiles_{zoom}'])) for zoom in density_zooms}
+                grid_tracks = set(saved['track_ids'].tolist())
+
+    # Tracks to add and to remove (the removed ones need their points)
+    new_tracks = sorted(list_tracks - grid_tracks)
+    removed_tracks = sorted(grid_tracks - list_tracks)
+    if grids is not None and not new_tracks and not removed_tracks:
+        return grids, pixel_bounds
+    if grids is None or not all(os.path.exists(os.path.join(all_tracks_path, f'{track_id}.csv')) for track_id in removed_tracks):
+        grids, new_tracks, removed_tracks = {zoom: {} for zoom in density_zooms}, sorted(list_tracks), []
+
+    # Add the counts of the new tracks and subtract the ones of the removed tracks (the tiles left without points are deleted)
+    new_points_df = read_tracks_coordinates(all_tracks_path, new_tracks)
+    removed_points_df = read_tracks_coordinates(all_tracks_path, removed_tracks)
+    for zoom in density_zooms:
+        for key, counts in points_tiles(new_points_df, pixel_bounds[zoom], zoom).items():
+            grids[zoom][key] = grids[zoom][key] + counts if key in grids[zoom] else counts
+        for key, counts in points_tiles(removed_points_df, pixel_bounds[zoom], zoom).items():
+            grids[zoom][key] = grids[zoom][key] - counts
+            if not grids[zoom][key].any():
+                del grids[zoom][key]
+
+    # Save the tiles with their keys (tile x and y), the pixels of each zoom and the tracks
+    keys = {zoom: sorted(grids[zoom]) for zoom in density_zooms}
+    np.savez_compressed(grids_path, track_ids=np.array(sorted(list_tracks), dtype=np.int64),
+                        **{f'keys_{zoom}': np.array(keys[zoom], dtype=np.int64).reshape(-1, 2) for zoom in density_zooms},
+                        **{f'tiles_{zoom}': np.array([grids[zoom][key] for key in keys[zoom]], dtype=np.uint32).reshape(-1, density_tile_size, density_tile_size)
+                           for zoom in density_zooms},
+                        **{f'bounds_{zoom}': np.array(pixel_bounds[zoom]) for zoom in density_zooms})
+
+    return grids, pixel_bounds
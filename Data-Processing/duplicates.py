@@ -0,0 +1,97 @@
+import pandas as pd
+import numpy as np
+import os
+from minhash import hash_tokens, minhash_signature, lsh_band_keys, estimate_similarity, encode_signature, decode_signature
+
+# Near-duplicate tracks: the same outing uploaded several times by a user, or by several members of a group. Each track is fingerprinted with a
+# MinHash signature of its edges sequence (shingles of consecutive edges), and the candidates are found with LSH bands. Two tracks are duplicates
+# if their sequences are very similar and they have the same user or the same date. The first track of each group (smaller id) is the original
+
+# Consecutive edges of a shingle, bands of the LSH (the signature has 64 values, so 16 bands of 4 rows) and minimum estimated similarity
+shingle_size = 3
+duplicate_bands = 16
+duplicate_similarity = 0.8
+
+# Given the edges sequence of a track, returns the hashes of its shingles (the consecutive repeated edges are removed)
+def sequence_shingles(edge_ids):
+
+    edge_ids = np.asarray(edge_ids, dtype=np.int64)
+    if len(edge_ids) == 0:
+        return np.array([], dtype=np.uint64)
+    edge_ids = edge_ids[np.concatenate([[True], edge_ids[1:] != edge_ids[:-1]])]
+
+    # A short track is only one shingle
+    if len(edge_ids) < shingle_size:
+        edge_ids = np.pad(edge_ids, (0, shingle_size - len(edge_ids)), constant_values=-1)
+
+    return hash_tokens(np.lib.stride_tricks.sliding_window_view(edge_ids, shingle_size))
+
+# Returns the signature of the edges sequence of a track
+def track_sequence_signature(partial_edges_path, track_id):
+
+    edge_ids = pd.read_csv(os.path.join(partial_edges_path, f'{track_id}.csv'), usecols=['edge_id'])['edge_id'].to_numpy()
+    return minhash_signature(sequence_shingles(edge_ids))
+
+# Finds the near-duplicates of the tracks - returns the duplicated tracks with their original and the estimated similarity
+def find_duplicates(tracks_df, signatures, bands=duplicate_bands, min_similarity=duplicate_similarity):
+
+    buckets = {}
+    original = {}
+    duplicates = []
+
+    # Tracks from the oldest id, so the original of a group is always the first upload
+    for track_id, user, date in tracks_df.sort_values(by='track_id')[['track_id','user','date']].itertuples(index=False):
+        signature = signatures[track_id]
+        keys = lsh_band_keys(signature, bands)
+
+        # Candidates in the same buckets, and the most similar one with the same user or the same date
+        candidates = set(candidate for key in keys for candidate in buckets.get(key, []))
+        best = None
+        for candidate_id, candidate_user, candidate_date in candidates:
+            if candidate_user == user or candidate_date == date:
+                similarity = estimate_similarity(signature, signatures[candidate_id])
+                if similarity >= min_similarity and (best is None or similarity > best[1]):
+                    best = (candidate_id, similarity)
+
+        # A duplicate gets the original of its most similar track
+        if best is not None:
+            original[track_id] = original[best[0]]
+            duplicates.append({'track_id': track_id, 'duplicate_of': original[track_id], 'similarity': round(best[1], 3)})
+        else:
+            original[track_id] = track_id
+
+        # Add the track into its buckets
+        for key in keys:
+            buckets.setdefault(key, []).append((track_id, user, date))
+
+    return pd.DataFrame(duplicates, columns=['track_id','duplicate_of','similarity'])
+
+# Main function - updates the signatures with the new tracks of the zone and saves the duplicates
+def main_duplicates(data_path, zone):
+
+    # Paths of the zone
+    output_path = os.path.join(data_path, zone, 'Output-Data')
+    dataframes_path = os.path.join(output_path, 'Data-Frames')
+    partial_edges_path = os.path.join(output_path, 'Tracks-Output', 'Partial-Edges')
+    signatures_path = os.path.join(dataframes_path, 'sequence_signatures.csv')
+
+    # Tracks of the zone, and the saved signatures
+    tracks_df = pd.read_csv(os.path.join(dataframes_path, 'tracks_info.csv'), usecols=['track_id','user','date'])
+    if os.path.exists(signatures_path):
+        signatures_df = pd.read_csv(signatures_path)
+        signatures_df = signatures_df[signatures_df['track_id'].isin(tracks_df['track_id'])]
+    else:
+        signatures_df = pd.DataFrame(columns=['track_id','signature'])
+
+    # Signatures of the new tracks
+    new_tracks = tracks_df[~tracks_df['track_id'].isin(signatures_df['track_id'])]['track_id'].tolist()
+    new_signatures_df = pd.DataFrame({'track_id': new_tracks, 'signature': [encode_signature(track_sequence_signature(partial_edges_path, track_id)) for track_id in new_tracks]})
+    signatures_df = pd.concat([df for df in [signatures_df, new_signatures_df] if len(df) > 0] + [signatures_df.head(0)], ignore_index=True)
+    signatures_df.to_csv(signatures_path, index=False)
+
+    # Find and save the duplicates
+    signatures = dict(zip(signatures_df['track_id'], signatures_df['signature'].map(decode_signature)))
+    duplicates_df = find_duplicates(tracks_df, signatures)
+    duplicates_df.to_csv(os.path.join(dataframes_path, 'duplicates.csv'), index=False)
+
+    return duplicates_df
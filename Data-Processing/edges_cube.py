@@ -0,0 +1,96 @@
+import pandas as pd
+import numpy as np
+
+# Sparse cube of the edges usage: for each edge and each combination of the dimensions, the tracks and the pace sums.
+# Only the combinations with tracks are saved, and it is updated with sums (and subtractions) like the edges state
+
+# Dimensions of the cube (the hour is -1 if it is not known), and aggregated values
+cube_dimensions = ['year','month','weekday','hour','weather_condition','difficulty']
+cube_values = ['total_tracks','pace_count','pace_sum']
+
+# Months of each season (same seasons as the tracks information)
+season_months_dict = {'Win': ['Dec','Jan','Feb'], 'Spr': ['Mar','Apr','May'], 'Sum': ['Jun','Jul','Aug'], 'Aut': ['Sep','Oct','Nov']}
+
+# Given the tracks information, returns the dimensions of each track
+def obtain_tracks_dimensions(tracks_info_df):
+
+    # The starting hour is only available if the tracks information has it
+    dimensions_df = tracks_info_df[['track_id'] + [dimension for dimension in cube_dimensions if dimension != 'hour']].copy()
+    dimensions_df['hour'] = tracks_info_df['start_hour'].fillna(-1).astype(int) if 'start_hour' in tracks_info_df.columns else -1
+
+    return dimensions_df[['track_id'] + cube_dimensions]
+
+# Given the edges of some tracks and their dimensions, returns the cube values (multiplied by the sign, -1 to remove them)
+def obtain_cube_delta(tracks_edges_df, dimensions_df, sign=1):
+
+    if len(tracks_edges_df) == 0:
+        return pd.DataFrame(columns=['edge_id'] + cube_dimensions + cube_values)
+
+    # Aggregate each track and edge - a track counts once for each edge, but all its passes are used for the pace
+    tracks_edges_df = tracks_edges_df.copy()
+    tracks_edges_df['pace_count'] = tracks_edges_df['avg_pace'].notna().astype(int)
+    tracks_edges_df['pace_sum'] = tracks_edges_df['avg_pace'].fillna(0)
+    tracks_edges_df = tracks_edges_df.groupby(['track_id','edge_id'], as_index=False)[['pace_count','pace_sum']].sum()
+    tracks_edges_df['total_tracks'] = 1
+
+    # Add the dimensions of each track, and aggregate by edge and dimensions
+    delta_df = tracks_edges_df.merge(dimensions_df.fillna({'weather_condition': 'Unknown', 'difficulty': 'Unknown'}), on='track_id')
+    delta_df = delta_df.groupby(['edge_id'] + cube_dimensions, as_index=False)[cube_values].sum()
+    delta_df[cube_values] = delta_df[cube_values] * sign
+
+    return delta_df
+
+# Merges some cubes, removing the cells without tracks
+def merge_edges_cubes(cubes):
+
+    cube_df = pd.concat(cubes, ignore_index=True).astype({'total_tracks': int, 'pace_count': int, 'pace_sum': float})
+    cube_df = cube_df.groupby(['edge_id'] + cube_dimensions, as_index=False)[cube_values].sum()
+
+    return cube_df[cube_df['total_tracks'] > 0].reset_index(drop=True)
+
+# Loads the cube as arrays to do fast queries: each dimension as integer codes, and the edge of each cell as an index
+def load_edges_cube(cube_path):
+
+    cube_df = pd.read_csv(cube_path)
+    cube = {'edge_ids': np.sort(cube_df['edge_id'].unique())}
+    cube['edge_index'] = np.searchsorted(cube['edge_ids'], cube_df['edge_id'].to_numpy())
+
+    # Codes of each dimension, and the values of each code
+    for dimension in cube_dimensions:
+        codes, uniques = pd.factorize(cube_df[dimension])
+        cube[dimension] = (codes, uniques)
+
+    # Values of the cells
+    for value in cube_values:
+        cube[value] = cube_df[value].to_numpy(dtype=float)
+
+    return cube
+
+# Slices the cube with some filters and aggregates by edge - each filter is a value or a list of values of a dimension.
+# The season filter is also accepted (as months). Example: slice_edges_cube(cube, year=[2022, 2023], season='Sum', weather_condition='Clear')
+def slice_edges_cube(cube, **filters):
+
+    # Season to months
+    if 'season' in filters:
+        seasons = filters.pop('season')
+        seasons = seasons if isinstance(seasons, (list, tuple, set)) else [seasons]
+        months = [month for season in seasons for month in season_months_dict[season]]
+        filters['month'] = [month for month in months if month in filters['month']] if 'month' in filters else months
+
+    # Select the cells with the filters
+    selected = np.ones(len(cube['edge_index']), dtype=bool)
+    for dimension, values in filters.items():
+        values = values if isinstance(values, (list, tuple, set)) else [values]
+        codes, uniques = cube[dimension]
+        selected &= np.isin(codes, np.flatnonzero(uniques.isin(values)))
+
+    # Aggregate the selected cells by edge
+    edge_index = cube['edge_index'][selected]
+    totals = {value: np.bincount(edge_index, weights=cube[value][selected], minlength=len(cube['edge_ids'])) for value in cube_values}
+    used = totals['total_tracks'] > 0
+
+    # Dataframe with the edges and their aggregates
+    slice_df = pd.DataFrame({'edge_id': cube['edge_ids'][used], 'total_tracks': totals['total_tracks'][used].astype(int)})
+    slice_df['avg_pace'] = np.round(totals['pace_sum'][used] / np.where(totals['pace_count'][used] > 0, totals['pace_count'][used], np.nan), 2)
+
+    return slice_df
@@ -3,6 +3,9 @@ from pandas.errors import SettingWithCopyWarning
 import os
 import numpy as np
 import warnings
+from edges_cube import cube_dimensions, obtain_tracks_dimensions, obtain_cube_delta, merge_edges_cubes
+from similar_tracks import update_similarity_index
+from quantile_sketch import create_sketch, add_to_sketch, merge_sketches, sketch_quantile, pace_histogram_columns, pace_histogram_bins, histogram_quantiles, encode_pace_histogram
 
 warnings.filterwarnings("ignore", category=FutureWarning)
 warnings.filterwarnings("ignore", category=SettingWithCopyWarning)
@@ -11,6 +14,9 @@ warnings.filterwarnings("ignore", category=SettingWithCopyWarning)
 pace_color_dict = {'Less than 15 min/km':'#ae017e', 'From 15 to 30 min/km':'#f768a1', 'From 30 to 45 min/km':'#fbb4b9', 'More than 45 min/km':'#feebe2'}
 tracks_color_dict = {'Less than 25 tracks':'#ffffb2', 'From 25 to 50 tracks':'#fecc5c', 'From 50 to 75 tracks':'#fd8d3c', 'More than 75 tracks':'#e31a1c'}
 
+# Columns of the state of the edges aggregates - all of them are sums
+state_columns = ['total_tracks','pace_count','pace_sum','pace_sq_sum'] + pace_histogram_columns
+
 # Formats the pace
 def format_pace(pace_min_per_km):
 
@@ -51,45 +57,111 @@ def total_tracks_group(total_tracks):
     else:
         return 'More than 75 tracks'
 
-# Given a list of filtered tracks, gets the partial edges dataframe
-def create_partial_edges_df(list_tracks, edges_df, partial_edges_path):
+# Given the groups columns of a tracks dataframe, returns a long dataframe with the group names of each track
+def obtain_tracks_groups(info_groups):
+
+    # All the tracks are in the full edges group
+    all_groups = [pd.DataFrame({'track_id': info_groups['track_id'], 'group': 'all_edges'})]
 
-    # Create a copy
-    partial_edges_df = edges_df[['id','geometry']].copy()
+    # Difficulty, year and weather condition groups (same names as the saved dataframes)
+    valid = info_groups[info_groups['difficulty'].notna()]
+    all_groups.append(pd.DataFrame({'track_id': valid['track_id'], 'group': 'difficulty_' + valid['difficulty'].str.lower().str.replace(' ', '_')}))
+    valid = info_groups[info_groups['year'].notna()]
+    all_groups.append(pd.DataFrame({'track_id': valid['track_id'], 'group': 'year_' + valid['year'].astype(int).astype(str)}))
+    valid = info_groups[info_groups['weather_condition'].notna()]
+    all_groups.append(pd.DataFrame({'track_id': valid['track_id'], 'group': 'weather_' + valid['weather_condition'].str.lower().str.replace(' ', '_')}))
 
-    # Create an empty list for the tracks, and another for the average pace
-    partial_edges_df['list_tracks'] = [[] for _ in range(len(partial_edges_df))]
-    partial_edges_df['list_avg_pace'] = [[] for _ in range(len(partial_edges_df))]
+    return pd.concat(all_groups, ignore_index=True)
 
-    # Set 'id' as index for faster lookup
-    partial_edges_df.set_index('id', inplace=True)
+# Reads the edges of some tracks (only the needed columns)
+def read_tracks_edges(list_tracks, partial_edges_path):
 
-    # Append the track into the list of tracks
+    all_tracks_edges = []
     for track_id in list_tracks:
+        track_df = pd.read_csv(os.path.join(partial_edges_path, str(track_id)+'.csv'), usecols=['edge_id','avg_pace'])
+        track_df['track_id'] = track_id
+        all_tracks_edges.append(track_df)
+
+    if not all_tracks_edges:
+        return pd.DataFrame(columns=['edge_id','avg_pace','track_id'])
+
+    return pd.concat(all_tracks_edges, ignore_index=True)
+
+# Given the edges of some tracks and their groups, returns the partial state of the edges aggregates for each group (multiplied by the sign, -1 to remove them)
+def obtain_edges_delta(tracks_edges_df, info_groups, sign=1):
+
+    if len(tracks_edges_df) == 0:
+        return pd.DataFrame(columns=['group','edge_id'] + state_columns)
+
+    # Aggregate each track and edge - a track counts once for each edge, but all its passes are used for the pace
+    tracks_edges_df = tracks_edges_df.copy()
+    tracks_edges_df['pace_count'] = tracks_edges_df['avg_pace'].notna().astype(int)
+    tracks_edges_df['pace_sum'] = tracks_edges_df['avg_pace'].fillna(0)
+    tracks_edges_df['pace_sq_sum'] = tracks_edges_df['pace_sum'] ** 2
+
+    # One column for each bin of the pace histogram, with a 1 in the bin of the pace
+    bins = pace_histogram_bins(tracks_edges_df['avg_pace'])
+    for i, column in enumerate(pace_histogram_columns):
+        tracks_edges_df[column] = ((bins == i) & tracks_edges_df['avg_pace'].notna()).astype(int)
+
+    tracks_edges_df = tracks_edges_df.groupby(['track_id','edge_id'], as_index=False)[state_columns[1:]].sum()
+    tracks_edges_df['total_tracks'] = 1
+
+    # Add the groups of each track, and aggregate by group and edge
+    delta_df = tracks_edges_df.merge(obtain_tracks_groups(info_groups), on='track_id')
+    delta_df = delta_df.groupby(['group','edge_id'], as_index=False)[state_columns].sum()
+    delta_df[state_columns] = delta_df[state_columns] * sign
+
+    return delta_df
+
+# Given the edges of some tracks and their groups, returns the pace sketches of each group
+def obtain_pace_sketches(tracks_edges_df, info_groups):
 
-        # Read the csv
-        track_df = pd.read_csv(os.path.join(partial_edges_path, str(track_id)+'.csv'))
+    # Paces of each group
+    group_paces_df = tracks_edges_df[['track_id','avg_pace']].merge(obtain_tracks_groups(info_groups), on='track_id')
 
-        # For each row (edge)
-        for index, row in track_df.iterrows():
-            if row['edge_id'] in partial_edges_df.index:
-                partial_edges_df.at[row['edge_id'], 'list_tracks'].append(track_id)
-                partial_edges_df.at[row['edge_id'], 'list_avg_pace'].append(row['avg_pace'])
+    # Add the paces of each group into a sketch
+    all_sketches = [create_sketch().assign(group=pd.Series(dtype=str))]
+    for group, paces in group_paces_df.groupby('group')['avg_pace']:
+        all_sketches.append(add_to_sketch(create_sketch(), paces).assign(group=group))
 
-    # Reset index
-    partial_edges_df.reset_index(inplace=True)
+    return pd.concat(all_sketches, ignore_index=True)[['group','mean','weight']]
 
-    # Create the total tracks column, and filter
-    partial_edges_df['total_tracks'] = partial_edges_df['list_tracks'].map(len)
-    partial_edges_df = partial_edges_df[partial_edges_df['total_tracks'] > 0]
+# Merges the sketches of each group
+def merge_groups_sketches(sketches):
+
+    all_sketches = [create_sketch().assign(group=pd.Series(dtype=str))]
+    for group, group_sketches in pd.concat(sketches, ignore_index=True).groupby('group'):
+        all_sketches.append(merge_sketches([group_sketches[['mean','weight']]]).assign(group=group))
+
+    return pd.concat(all_sketches, ignore_index=True)[['group','mean','weight']]
+
+# Merges partial states of the edges aggregates (the aggregates are sums, so the merge is a sum)
+def merge_edges_states(states):
+
+    # Concatenate and sum by group and edge
+    state_df = pd.concat(states, ignore_index=True).astype({column: int for column in state_columns} | {'pace_sum': float, 'pace_sq_sum': float})
+    state_df = state_df.groupby(['group','edge_id'], as_index=False)[state_columns].sum()
+
+    # Remove the edges without tracks (all their tracks have been removed)
+    state_df = state_df[state_df['total_tracks'] > 0].reset_index(drop=True)
+
+    return state_df
+
+# Given the state and the pace sketch of a group, gets the partial edges dataframe
+def create_partial_edges_df(group_state_df, edges_df, group_sketch):
+
+    # Add the geometry to the aggregates, only for the edges in the edges dataframe
+    partial_edges_df = edges_df[['id','geometry']].merge(group_state_df.rename(columns={'edge_id':'id'}), on='id')
+    partial_edges_df['total_tracks'] = partial_edges_df['total_tracks'].astype(int)
 
     # Create the average pace column
-    partial_edges_df['avg_pace'] = round(partial_edges_df['list_avg_pace'].apply(lambda paces: np.mean(paces) if paces else None), 2)
+    partial_edges_df['avg_pace'] = round(partial_edges_df['pace_sum'] / partial_edges_df['pace_count'].where(partial_edges_df['pace_count'] > 0), 2)
 
     # Normalize the average pace column
-    # Calculate the IQR
-    Q1 = partial_edges_df['avg_pace'].quantile(0.35)
-    Q3 = partial_edges_df['avg_pace'].quantile(0.65)
+    # Calculate the IQR with the sketch of the paces of the group
+    Q1 = sketch_quantile(group_sketch, 0.35)
+    Q3 = sketch_quantile(group_sketch, 0.65)
     IQR = Q3 - Q1
 
     # Define the bounds
@@ -97,10 +169,17 @@ def create_partial_edges_df(list_tracks, edges_df, partial_edges_path):
     upper_bound = Q3 + 1.5 * IQR
 
     # Calculate the mean without the outliers to put it into the outpliers
-    mean_without_outliers = partial_edges_df.loc[(partial_edges_df['avg_pace'] >= lower_bound) & (partial_edges_df['avg_pace'] <= upper_bound), 'avg_pace'].mean()
+    inside_bounds = (partial_edges_df['avg_pace'] >= lower_bound) & (partial_edges_df['avg_pace'] <= upper_bound)
+    mean_without_outliers = partial_edges_df.loc[inside_bounds, 'avg_pace'].mean()
 
     # Apply the values
-    partial_edges_df['avg_pace'] = round(partial_edges_df['avg_pace'].apply(lambda x: mean_without_outliers if (x < lower_bound or x > upper_bound) else x), 2)
+    partial_edges_df['avg_pace'] = round(partial_edges_df['avg_pace'].where(inside_bounds, mean_without_outliers), 2)
+
+    # Percentiles 10, 50 and 90 of the pace, with the histogram
+    histograms = partial_edges_df[pace_histogram_columns].to_numpy()
+    percentiles = np.round(histogram_quantiles(histograms, [0.1, 0.5, 0.9]), 2)
+    partial_edges_df['pace_p10'], partial_edges_df['pace_median'], partial_edges_df['pace_p90'] = percentiles[:, 0], percentiles[:, 1], percentiles[:, 2]
+    partial_edges_df['pace_histogram'] = [encode_pace_histogram(histogram) for histogram in histograms]
 
     # Apply the pace group, and the color
     partial_edges_df['pace_group'] = partial_edges_df['avg_pace'].apply(average_pace_group)
@@ -110,37 +189,23 @@ def create_partial_edges_df(list_tracks, edges_df, partial_edges_path):
     partial_edges_df['total_tracks_group'] = partial_edges_df['total_tracks'].apply(total_tracks_group)
     partial_edges_df['total_tracks_color'] = partial_edges_df['total_tracks_group'].map(tracks_color_dict)
 
-    # Create empty columns for tooltip and popup
-    partial_edges_df['map_tooltip'] = None
-    partial_edges_df['map_popup'] = None
-
-    for index, row in partial_edges_df.iterrows():
-
-        # Create the tooltip and add it into the dataframe
-        tooltip_html = f'Edge <b>{row['id']}</b>'
-        partial_edges_df.at[index, 'map_tooltip'] = tooltip_html
-
-        # Form the average pace
-        formatted_pace = format_pace(row['avg_pace'])
-
-        # Create the popup
-        popup_html = f'''<div style="font-size: 10px;">
-                        <b>Edge {row['id']}</b><br>
+    # Create the tooltip and the popup
+    partial_edges_df['map_tooltip'] = 'Edge <b>' + partial_edges_df['id'].astype(str) + '</b>'
+    partial_edges_df['map_popup'] = [f'''<div style="font-size: 10px;">
+                        <b>Edge {edge_id}</b><br>
                         <ul style="padding-left: 16px; margin: 4px 0;">
-                            <li><b>Total registered tracks</b>: {row['total_tracks']}</li>
-                            <li><b>Average pace</b>: {formatted_pace}</li>
-                        </ul></div>'''
-
-        # Add the popup to the dataframe
-        partial_edges_df.at[index, 'map_popup'] = popup_html
+                            <li><b>Total registered tracks</b>: {total_tracks}</li>
+                            <li><b>Average pace</b>: {format_pace(avg_pace)}</li>
+                            <li><b>Pace of most tracks</b>: from {format_pace(pace_p10)} to {format_pace(pace_p90)}</li>
+                        </ul></div>''' for edge_id, total_tracks, avg_pace, pace_p10, pace_p90 in zip(partial_edges_df['id'], partial_edges_df['total_tracks'], partial_edges_df['avg_pace'], partial_edges_df['pace_p10'], partial_edges_df['pace_p90'])]
 
     # Reorder the dataframe
-    partial_edges_df = partial_edges_df[['id','avg_pace','pace_group','pace_color','total_tracks','total_tracks_group','total_tracks_color','list_tracks','map_tooltip','map_popup','geometry']]
+    partial_edges_df = partial_edges_df[['id','avg_pace','pace_p10','pace_median','pace_p90','pace_histogram','pace_group','pace_color','total_tracks','total_tracks_group','total_tracks_color','map_tooltip','map_popup','geometry']]
 
     return partial_edges_df
 
-# Main edges postprocessing
-def main_edges_postprocessing(data_path, zone):
+# Main edges postprocessing - only the new, changed or removed tracks are read, and the aggregates are updated
+def main_edges_postprocessing(data_path, zone, rebuild=False):
 
     # Obtain all the paths
     zone_path = os.path.join(data_path, zone)
@@ -151,78 +216,112 @@ def main_edges_postprocessing(data_path, zone):
     tracks_info_path = os.path.join(dataframes_path, 'tracks_info.csv')
     tracks_info_df = pd.read_csv(tracks_info_path)
 
-    # Read the edges dataframe
-    edges_df = pd.read_csv(os.path.join(dataframes_path, 'edges.csv'))
+    # The near-duplicates are counted once - only the original track of each group is aggregated
+    duplicates_path = os.path.join(dataframes_path, 'duplicates.csv')
+    if os.path.exists(duplicates_path):
+        tracks_info_df = tracks_info_df[~tracks_info_df['track_id'].isin(pd.read_csv(duplicates_path)['track_id'])]
+
+    # Read the segments of the edges (the unit of the aggregates), or the edges if the network is not contracted
+    segments_path = os.path.join(dataframes_path, 'segments.csv')
+    edges_df = pd.read_csv(segments_path if os.path.exists(segments_path) else os.path.join(dataframes_path, 'edges.csv'))
 
     # Tracks output path and others
     tracks_output_path = os.path.join(output_path, 'Tracks-Output')
     partial_edges_path = os.path.join(tracks_output_path, 'Partial-Edges')
 
-    # Create the information dataframe
-    info_groups = tracks_info_df[['track_id','difficulty','year','weather_condition']]
+    # Create the information dataframe (the dimensions of the cube include the groups)
+    info_groups = obtain_tracks_dimensions(tracks_info_df)
 
     # Create the edges dataframes directory
     edges_dir_path = os.path.join(dataframes_path, 'Edges-Dataframes')
     os.makedirs(edges_dir_path, exist_ok=True)
 
-    # Full edges dataframe
-    dataframe_path = os.path.join(edges_dir_path, 'all_edges.csv')
-    partial_edges_df = create_partial_edges_df(info_groups['track_id'].unique().tolist(), edges_df, partial_edges_path)   
-    partial_edges_df.to_csv(dataframe_path, index=False)
-
-    # For each difficulty level
-    for difficulty in info_groups['difficulty'].unique().tolist():
-
-        # Get the path
-        dataframe_path = os.path.join(edges_dir_path, f'difficulty_{difficulty.lower().replace(" ", "_")}.csv')
-
-        # Only if the dataframe does not exist
-        if not os.path.exists(dataframe_path):
-
-            # Obtain the partial df
-            partial_df = info_groups[info_groups['difficulty'] == difficulty]
-            list_tracks = partial_df['track_id'].unique().tolist()
-
-            # Apply the function
-            partial_edges_df = create_partial_edges_df(list_tracks, edges_df, partial_edges_path)    
-
-            # Save the dataframe
-            partial_edges_df.to_csv(dataframe_path, index=False)
-
-    # For each year
-    for year in info_groups['year'].unique().tolist():
-
-        # Get the path
-        dataframe_path = os.path.join(edges_dir_path, f'year_{year}.csv')
-
-        # Only if the dataframe does not exist
-        if not os.path.exists(dataframe_path):
-
-            # Obtain the partial df
-            partial_df = info_groups[info_groups['year'] == year]
-            list_tracks = partial_df['track_id'].unique().tolist()
-
-            # Apply the function
-            partial_edges_df = create_partial_edges_df(list_tracks, edges_df, partial_edges_path)    
-
-            # Save the dataframe
-            partial_edges_df.to_csv(dataframe_path, index=False)
-
-    # For each weather condition
-    for weather in info_groups['weather_condition'].unique().tolist():
+    # Paths of the state (aggregates of each group and edge), of the pace sketches of each group, of the edges usage cube, and of the aggregated tracks with their dimensions
+    state_path = os.path.join(edges_dir_path, 'edges_state.csv')
+    sketches_path = os.path.join(edges_dir_path, 'pace_sketches.csv')
+    cube_path = os.path.join(edges_dir_path, 'edges_cube.csv')
+    aggregated_path = os.path.join(edges_dir_path, 'aggregated_tracks.csv')
+
+    # Read the state, or start from an empty one (also if the state has been saved with other columns)
+    saved_state = all(os.path.exists(path) for path in [state_path, sketches_path, cube_path, aggregated_path]) and not rebuild
+    if saved_state and os.path.exists(segments_path):
+        saved_state = os.path.getmtime(segments_path) <= os.path.getmtime(state_path)     # The state of the edges before the segments is not valid
+    if saved_state:
+        state_df = pd.read_csv(state_path)
+        aggregated_df = pd.read_csv(aggregated_path)
+        saved_state = set(state_columns).issubset(state_df.columns) and set(cube_dimensions).issubset(aggregated_df.columns)
+
+    if saved_state:
+        sketches_df = pd.read_csv(sketches_path)
+        cube_df = pd.read_csv(cube_path)
+    else:
+        state_df = pd.DataFrame(columns=['group','edge_id'] + state_columns)
+        sketches_df = pd.DataFrame(columns=['group','mean','weight'])
+        cube_df = obtain_cube_delta(pd.DataFrame(), info_groups)
+        aggregated_df = pd.DataFrame(columns=info_groups.columns)
+
+    # Compare the aggregated tracks with the current ones - a track is removed if it is not in the tracks info or its dimensions changed
+    compared_df = aggregated_df.merge(info_groups, on='track_id', how='outer', suffixes=('_old', ''), indicator=True)
+    changed = pd.Series(False, index=compared_df.index)
+    for column in cube_dimensions:
+        changed = changed | ~((compared_df[column + '_old'] == compared_df[column]) | (compared_df[column + '_old'].isna() & compared_df[column].isna()))
+    changed = changed & (compared_df['_merge'] == 'both')
+    removed_tracks = compared_df[(compared_df['_merge'] == 'left_only') | changed]['track_id'].tolist()
+    added_tracks = compared_df[(compared_df['_merge'] == 'right_only') | changed]['track_id'].tolist()
+
+    # The removed tracks are subtracted with their edges - if the edges of some of them do not exist anymore, the aggregates are created again
+    if saved_state and not all(os.path.exists(os.path.join(partial_edges_path, f'{track_id}.csv')) for track_id in removed_tracks):
+        return main_edges_postprocessing(data_path, zone, rebuild=True)
+
+    # Update the index of the similar routes with the edges sets of the tracks
+    update_similarity_index(partial_edges_path, tracks_info_df['track_id'].tolist(), os.path.join(edges_dir_path, 'edge_set_signatures.csv'))
+
+    # Nothing to update
+    if not removed_tracks and not added_tracks and os.path.exists(os.path.join(edges_dir_path, 'all_edges.csv')):
+        return
+
+    # Read the edges of the tracks to remove and to add
+    removed_edges_df = read_tracks_edges(removed_tracks, partial_edges_path)
+    added_edges_df = read_tracks_edges(added_tracks, partial_edges_path)
+
+    # Partial states to remove (with the old groups), and to add
+    removed_delta = obtain_edges_delta(removed_edges_df, aggregated_df, sign=-1)
+    added_delta = obtain_edges_delta(added_edges_df, info_groups)
+
+    # Merge the states, and the cube
+    state_df = merge_edges_states([state_df, removed_delta, added_delta])
+    cube_df = merge_edges_cubes([cube_df, obtain_cube_delta(removed_edges_df, aggregated_df, sign=-1), obtain_cube_delta(added_edges_df, info_groups)])
+
+    # A sketch can not remove values, so the sketches of the groups with removed tracks are rebuilt with the tracks of these groups
+    rebuilt_groups = set(removed_delta['group'].tolist())
+    tracks_groups_df = obtain_tracks_groups(info_groups)
+    rebuilt_tracks = tracks_groups_df[tracks_groups_df['group'].isin(rebuilt_groups) & ~tracks_groups_df['track_id'].isin(added_tracks)]['track_id'].unique().tolist()
+    rebuilt_sketches = obtain_pace_sketches(read_tracks_edges(rebuilt_tracks, partial_edges_path), info_groups)
+    rebuilt_sketches = rebuilt_sketches[rebuilt_sketches['group'].isin(rebuilt_groups)]
+
+    # Merge the sketches with the ones of the added tracks
+    sketches_df = merge_groups_sketches([sketches_df[~sketches_df['group'].isin(rebuilt_groups)], rebuilt_sketches, obtain_pace_sketches(added_edges_df, info_groups)])
+
+    # Groups to update: the ones with changes (the all edges group is always updated)
+    updated_groups = set(removed_delta['group'].tolist() + added_delta['group'].tolist() + ['all_edges'])
+    for group in updated_groups:
 
         # Get the path
-        dataframe_path = os.path.join(edges_dir_path, f'weather_{weather.lower().replace(" ", "_")}.csv')
-
-        # Only if the dataframe does not exist
-        if not os.path.exists(dataframe_path):
-
-            # Obtain the partial df
-            partial_df = info_groups[info_groups['weather_condition'] == weather]
-            list_tracks = partial_df['track_id'].unique().tolist()
-
-            # Apply the function
-            partial_edges_df = create_partial_edges_df(list_tracks, edges_df, partial_edges_path)    
-
-            # Save the dataframe
-            partial_edges_df.to_csv(dataframe_path, index=False)
\ No newline at end of file
+        dataframe_path = os.path.join(edges_dir_path, f'{group}.csv')
+        group_state_df = state_df[state_df['group'] == group]
+
+        # Remove the dataframe if the group does not have tracks anymore
+        if len(group_state_df) == 0:
+            if os.path.exists(dataframe_path):
+                os.remove(dataframe_path)
+            continue
+
+        # Apply the function and save the dataframe
+        partial_edges_df = create_partial_edges_df(group_state_df, edges_df, sketches_df[sketches_df['group'] == group])
+        partial_edges_df.to_csv(dataframe_path, index=False)
+
+    # Save the state and the aggregated tracks
+    state_df.to_csv(state_path, index=False)
+    sketches_df.to_csv(sketches_path, index=False)
+    cube_df.to_csv(cube_path, index=False)
+    info_groups.to_csv(aggregated_path, index=False)
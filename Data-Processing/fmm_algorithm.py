@@ -5,9 +5,7 @@ from geopy.distance import geodesic
 from shapely.wkt import loads
 from shapely.geometry import LineString
 from fmm import Network,NetworkGraph,UBODTGenAlgorithm,UBODT,FastMapMatch, FastMapMatchConfig
-
-# Define the bounds for each zone
-bounds_dict = {"canigo": (2.2, 2.7, 42.4, 42.6), "matagalls": (2.3, 2.5, 41.8, 41.9), "vallferrera": (1.2, 1.7, 42.5, 42.8), "exemple": (2.3, 2.5, 41.8, 41.9)}
+from zones import zone_polygon, inside_polygon
 
 # Create needed datclearaframes
 def create_dataframes(dataframes_path, osm_path):
@@ -31,13 +29,12 @@ def create_dataframes(dataframes_path, osm_path):
     return fmm_conf_df, fmm_conf_path, disc_df, disc_path
 
 # Checks if the file is valid depending on the coordinates
-def check_coordinates(track_id, coords_df, bounds, disc_df, disc_path):
+def check_coordinates(track_id, coords_df, polygon, disc_df, disc_path):
 
-    # Check if all the coordinates are inside the bounds
-    inside_bounds = ((coords_df["Longitude"] >= bounds[0]).all() & (coords_df["Longitude"] <= bounds[1]).all() &
-                     (coords_df["Latitude"] >= bounds[2]).all() & (coords_df["Latitude"] <= bounds[3]).all())
+    # Check if all the coordinates are inside the polygon of the zone
+    inside_bounds = inside_polygon(polygon, coords_df["Longitude"], coords_df["Latitude"])
     
-    if not inside_bounds:   # If the track is not in the defined bounds, error type 2
+    if not inside_bounds:   # If the track is not in the polygon of the zone, error type 2
         disc_df = pd.concat([disc_df, pd.DataFrame({'track_id':[track_id], 'error_type':[2]})], ignore_index=True)
         disc_df.to_csv(disc_path, index=False)
         return disc_df, False
@@ -123,8 +120,20 @@ def save_fmm_result(fmm_result, track_id, fmm_out_path):
     # Save the dataframe
     df.to_csv(output_path, index=False)
 
-# Main FMM function
-def main_fmm(data_path, zone):
+# Loads the FastMapMatching model of a zone with the network, the graph, and the udobt file. The network, the graph and the udobt are returned
+# with the model, since the model only keeps references to them
+def load_fmm_model(osm_path):
+
+    network = Network(os.path.join(osm_path, 'edges.shp'), "fid", "u", "v")     # Network of the zone with FMM
+    graph = NetworkGraph(network)   # Network graph of the zone with FMM
+    ubodt = UBODT.read_ubodt_csv(os.path.join(osm_path, 'udobt.txt'))    # Read the UDOBT file
+    model = FastMapMatch(network,graph,ubodt)   # Creation of the model using FMM
+
+    return {'network': network, 'graph': graph, 'ubodt': ubodt, 'model': model}
+
+# Main FMM function - if a list of track ids is given, only these tracks are matched. A loaded model can be given (the watch mode keeps it
+# between the batches), otherwise it is loaded
+def main_fmm(data_path, zone, track_ids=None, fmm_model=None):
 
     # Obtain all the paths
     zone_path = os.path.join(data_path, zone)
@@ -140,15 +149,19 @@ def main_fmm(data_path, zone):
     # Get a list with the tracks ids already processed
     processed_tracks = list(set(disc_df['track_id'].unique().tolist() + fmm_conf_df['track_id'].unique().tolist()))
 
-    # Obtain the FastMapMatching model of the zone with the network, the graph, and the udobt file
-    network = Network(os.path.join(osm_path, 'edges.shp'), "fid", "u", "v")     # Network of the zone with FMM
-    graph = NetworkGraph(network)   # Network graph of the zone with FMM
-    ubodt = UBODT.read_ubodt_csv(os.path.join(osm_path, 'udobt.txt'))    # Read the UDOBT file
-    model = FastMapMatch(network,graph,ubodt)   # Creation of the model using FMM
+    # Obtain the FastMapMatching model of the zone
+    if fmm_model is None:
+        fmm_model = load_fmm_model(osm_path)
+    model = fmm_model['model']
+
+    # Polygon of the zone, to check the coordinates
+    polygon = zone_polygon(zone, data_path)
 
     # For each track, proceed with the fast map matching
     for track in os.listdir(input_path):
         track_id = int(track.split('.')[0])           # Obtain the track id
+        if track_ids is not None and track_id not in track_ids:     # Skip the tracks outside the given batch
+            continue
         if track_id not in processed_tracks:          # Only process the track if it is not already done
 
             # Print information
@@ -168,9 +181,10 @@ def main_fmm(data_path, zone):
             if activity_type != 'Senderisme':
                 disc_df = pd.concat([disc_df, pd.DataFrame({'track_id':[track_id], 'error_type':[1]})], ignore_index=True)
                 disc_df.to_csv(disc_path, index=False)
+                valid_file = False
 
             else:
-                disc_df, valid_file = check_coordinates(track_id, coords_df, bounds_dict[zone], disc_df, disc_path)
+                disc_df, valid_file = check_coordinates(track_id, coords_df, polygon, disc_df, disc_path)
 
             if valid_file:
                 valid_file, fmm_result, k, r, e = matching_track(model, coords_df)      # Apply the fast map matching algorithm
@@ -1,8 +1,14 @@
+import os
 from preprocessing import main_preprocessing
 from fmm_algorithm import main_fmm
 from postprocessing import main_postprocessing
+from duplicates import main_duplicates
 from edges_postprocessing import main_edges_postprocessing
 from waypoints_postprocessing import obtain_waypoints_df
+from stay_points import main_stay_points
+from grid_index import update_grid_index
+from density_grids import update_density_grids
+from zones import route_combined_dump, combined_dump_name
 
 # Main function - calls all zones
 def main():
@@ -10,34 +16,55 @@ def main():
     # Define the data path
     data_path = '../../Data/Processing-Data'
 
+    # Route the tracks of the combined dump (if there is one) into the input directories of the zones
+    dump_path = os.path.join(data_path, 'Zip-Files', combined_dump_name)
+    if os.path.exists(dump_path):
+        route_combined_dump(dump_path, data_path)
+
     # Canigo
     main_preprocessing(data_path, 'canigo')
     main_fmm(data_path, 'canigo')
     main_postprocessing(data_path, 'canigo')
+    main_duplicates(data_path, 'canigo')
     main_edges_postprocessing(data_path, 'canigo')
     obtain_waypoints_df(data_path, 'canigo')
+    main_stay_points(data_path, 'canigo')
+    update_grid_index(data_path, 'canigo')
+    update_density_grids(data_path, 'canigo')
 
 
     # Matagalls
     main_preprocessing(data_path, 'matagalls')
     main_fmm(data_path, 'matagalls')
     main_postprocessing(data_path, 'matagalls')
+    main_duplicates(data_path, 'matagalls')
     main_edges_postprocessing(data_path, 'matagalls')
     obtain_waypoints_df(data_path, 'matagalls')
+    main_stay_points(data_path, 'matagalls')
+    update_grid_index(data_path, 'matagalls')
+    update_density_grids(data_path, 'matagalls')
 
     # # Vall Ferrera
     main_preprocessing(data_path, 'vallferrera')
     main_fmm(data_path, 'vallferrera')
     main_postprocessing(data_path, 'vallferrera')
+    main_duplicates(data_path, 'vallferrera')
     main_edges_postprocessing(data_path, 'vallferrera')
     obtain_waypoints_df(data_path, 'vallferrera')
+    main_stay_points(data_path, 'vallferrera')
+    update_grid_index(data_path, 'vallferrera')
+    update_density_grids(data_path, 'vallferrera')
 
     # Example - Matagalls subset
     main_preprocessing(data_path, 'exemple')
     main_fmm(data_path, 'exemple')
     main_postprocessing(data_path, 'exemple')
+    main_duplicates(data_path, 'exemple')
     main_edges_postprocessing(data_path, 'exemple')
     obtain_waypoints_df(data_path, 'exemple')
+    main_stay_points(data_path, 'exemple')
+    update_grid_index(data_path, 'exemple')
+    update_density_grids(data_path, 'exemple')
 
 
 main()
\ No newline at end of file
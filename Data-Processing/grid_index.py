@@ -0,0 +1,149 @@
+import pandas as pd
+import numpy as np
+import os
+import shapely
+
+# Hierarchical grid index of the tracks points: for each cell of each level, the tracks that pass through it and their number of points.
+# Each level has cells ten times smaller than the previous one, and the cells of the finest level are used to obtain the others (so a cell
+# is always inside its parent). It is saved as a csv, and updated only with the new or removed tracks
+
+# Size of the cells of the finest level (in degrees, around 100 meters), and number of levels (0.1, 0.01 and 0.001 degrees)
+index_finest_size = 0.001
+index_levels = 3
+
+# Size of the cells of a level
+def level_cell_size(level):
+    return index_finest_size * 10 ** (index_levels - 1 - level)
+
+# Given the points of some tracks (track_id, lat and lon), returns the cells of all the levels with their points
+def obtain_tracks_cells(points_df):
+
+    # Cell of the finest level
+    finest_x = np.floor(points_df['lon'].to_numpy(dtype=float) / index_finest_size).astype(np.int64)
+    finest_y = np.floor(points_df['lat'].to_numpy(dtype=float) / index_finest_size).astype(np.int64)
+
+    cells = []
+    for level in range(index_levels):
+
+        # Parent cells with integer divisions
+        factor = 10 ** (index_levels - 1 - level)
+        level_df = pd.DataFrame({'track_id': points_df['track_id'].to_numpy(), 'cell_x': finest_x // factor, 'cell_y': finest_y // factor})
+        cells.append(level_df.groupby(['track_id','cell_x','cell_y'], as_index=False).size().rename(columns={'size': 'total_points'}).assign(level=level))
+
+    return pd.concat(cells, ignore_index=True)[['level','cell_x','cell_y','track_id','total_points']]
+
+# Reads the points (track_id, lat and lon) of some tracks from the all tracks directory
+def read_tracks_coordinates(all_tracks_path, list_tracks):
+
+    points = []
+    for track_id in list_tracks:
+        track_path = os.path.join(all_tracks_path, f'{track_id}.csv')
+        if os.path.exists(track_path):
+            points.append(pd.read_csv(track_path, usecols=['lat','lon']).assign(track_id=track_id))
+
+    if not points:
+        return pd.DataFrame(columns=['track_id','lat','lon'])
+
+    return pd.concat(points, ignore_index=True)
+
+# Updates the grid index of a zone with the tracks of the tracks information - only the new tracks are read, and the removed ones are deleted
+def update_grid_index(data_path, zone, rebuild=False):
+
+    # Paths of the zone
+    output_path = os.path.join(data_path, zone, 'Output-Data')
+    dataframes_path = os.path.join(output_path, 'Data-Frames')
+    all_tracks_path = os.path.join(output_path, 'Tracks-Output', 'All-Tracks')
+    index_path = os.path.join(dataframes_path, 'grid_index.csv')
+
+    # Current tracks, and the saved index
+    list_tracks = set(pd.read_csv(os.path.join(dataframes_path, 'tracks_info.csv'), usecols=['track_id'])['track_id'].tolist())
+    if os.path.exists(index_path) and not rebuild:
+        index_df = pd.read_csv(index_path)
+    else:
+        index_df = pd.DataFrame(columns=['level','cell_x','cell_y','track_id','total_points'])
+
+    # Tracks to add and to remove
+    indexed_tracks = set(index_df['track_id'].unique().tolist())
+    new_tracks = sorted(list_tracks - indexed_tracks)
+    removed_tracks = indexed_tracks - list_tracks
+
+    if not new_tracks and not removed_tracks and os.path.exists(index_path):
+        return index_df
+
+    # Remove the old tracks, and add the cells of the new ones
+    index_df = index_df[~index_df['track_id'].isin(removed_tracks)]
+    new_cells_df = obtain_tracks_cells(read_tracks_coordinates(all_tracks_path, new_tracks))
+    index_df = pd.concat([df for df in [index_df, new_cells_df] if len(df) > 0] + [index_df.head(0)], ignore_index=True)
+
+    index_df = index_df.astype(int).sort_values(by=['level','cell_x','cell_y','track_id']).reset_index(drop=True)
+    index_df.to_csv(index_path, index=False)
+
+    return index_df
+
+# Loads the grid index to query it - a dataframe for each level
+def load_grid_index(index_path):
+
+    index_df = pd.read_csv(index_path)
+
+    return {level: index_df[index_df['level'] == level].reset_index(drop=True) for level in range(index_levels)}
+
+# Given some cells of a level, returns their boxes as shapely geometries (in lon and lat)
+def cells_boxes(cells_df, level):
+
+    size = level_cell_size(level)
+    cell_x, cell_y = cells_df['cell_x'].to_numpy(), cells_df['cell_y'].to_numpy()
+    return shapely.box(cell_x * size, cell_y * size, (cell_x + 1) * size, (cell_y + 1) * size)
+
+# Returns the tracks that pass through a polygon (in lon and lat), with their number of points inside. From the coarsest level to the finest:
+# the cells inside the polygon are accepted, the cells outside are discarded, and only the cells in the border are checked in the next level
+def query_polygon(grid_index, polygon):
+
+    shapely.prepare(polygon)
+    accepted = []
+
+    # Cells of the coarsest level that can intersect the polygon (with the bounding box)
+    min_lon, min_lat, max_lon, max_lat = polygon.bounds
+    size = level_cell_size(0)
+    cells_df = grid_index[0]
+    cells_df = cells_df[(cells_df['cell_x'] >= np.floor(min_lon / size)) & (cells_df['cell_x'] <= np.floor(max_lon / size)) &
+                        (cells_df['cell_y'] >= np.floor(min_lat / size)) & (cells_df['cell_y'] <= np.floor(max_lat / size))]
+
+    for level in range(index_levels):
+
+        # Classify the distinct cells of the level
+        unique_cells = cells_df[['cell_x','cell_y']].drop_duplicates()
+        boxes = cells_boxes(unique_cells, level)
+        inside = shapely.contains(polygon, boxes)
+        border = ~inside & shapely.intersects(polygon, boxes)
+
+        # The cells inside are accepted - in the finest level, also the cells in the border
+        accepted_cells = unique_cells[inside | border] if level == index_levels - 1 else unique_cells[inside]
+        accepted.append(cells_df.merge(accepted_cells, on=['cell_x','cell_y']))
+
+        # Children of the border cells in the next level
+        if level < index_levels - 1:
+            border_cells = unique_cells[border]
+            next_df = grid_index[level + 1]
+            next_df = next_df[next_df['cell_x'].between(border_cells['cell_x'].min() * 10, border_cells['cell_x'].max() * 10 + 9) &
+                              next_df['cell_y'].between(border_cells['cell_y'].min() * 10, border_cells['cell_y'].max() * 10 + 9)]
+            cells_df = next_df.assign(parent_x=next_df['cell_x'] // 10, parent_y=next_df['cell_y'] // 10).merge(
+                border_cells.rename(columns={'cell_x': 'parent_x', 'cell_y': 'parent_y'}), on=['parent_x','parent_y'])
+
+    # Points of each track inside the accepted cells
+    tracks_df = pd.concat(accepted, ignore_index=True).groupby('track_id', as_index=False)['total_points'].sum()
+
+    return tracks_df.sort_values(by='total_points', ascending=False).reset_index(drop=True)
+
+# Returns the tracks that pass through a bounding box
+def query_bbox(grid_index, min_lat, min_lon, max_lat, max_lon):
+    return query_polygon(grid_index, shapely.box(min_lon, min_lat, max_lon, max_lat))
+
+# Density of a level for the heatmaps: the center of each cell with its points and its tracks
+def grid_heatmap(grid_index, level):
+
+    size = level_cell_size(level)
+    heatmap_df = grid_index[level].groupby(['cell_x','cell_y'], as_index=False).agg(total_points=('total_points', 'sum'), total_tracks=('track_id', 'nunique'))
+    heatmap_df['lat'] = ((heatmap_df['cell_y'] + 0.5) * size).round(6)
+    heatmap_df['lon'] = ((heatmap_df['cell_x'] + 0.5) * size).round(6)
+
+    return heatmap_df[['lat','lon','total_points','total_tracks']]
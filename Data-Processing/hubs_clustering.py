@@ -0,0 +1,148 @@
+import pandas as pd
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import connected_components
+from scipy.spatial import cKDTree
+
+# Start and finish hubs: the first and the last coordinates of all the tracks are clustered with DBSCAN, accelerated with a KD-tree and a grid
+# with the radius as the diagonal of the cells (a parking with thousands of points is a few dense cells, so its pairs of points are never
+# listed). Each track gets the hub of its start and finish. The new tracks of the watch mode are only assigned to the hubs found before, so
+# the ids of the hubs do not change between the batches
+
+# Radius of the neighborhood (in meters) and minimum points to be a core point
+hubs_eps = 150
+hubs_min_samples = 3
+
+# Max core points of a cell to compare it with its neighbors point by point (the denser ones use a KD-tree), and offsets of the neighbor cells
+hubs_dense_cell = 32
+hubs_cell_offsets = [(dx, dy) for dx in range(-2, 3) for dy in range(-2, 3) if (dx, dy) != (0, 0)]
+
+# Transforms the coordinates into local meters (the zones are small, so an equirectangular projection is enough)
+def to_local_meters(lats, lons):
+
+    lats, lons = np.asarray(lats, dtype=float), np.asarray(lons, dtype=float)
+    lat0 = np.radians(lats.mean()) if len(lats) > 0 else 0
+
+    return (lons - lons.mean()) * 111320 * np.cos(lat0), (lats - lats.mean()) * 110540
+
+# DBSCAN over a grid - returns the cluster of each point (-1 for the noise), the clusters are numbered from the biggest
+def grid_dbscan(x, y, eps=hubs_eps, min_samples=hubs_min_samples):
+
+    n = len(x)
+    if n == 0:
+        return np.array([], dtype=int)
+    points = np.column_stack([x, y])
+    tree = cKDTree(points)
+
+    # Cells with the radius as diagonal (all the points of a cell are neighbors), so the points of the cells with enough points are core points
+    # in bulk - the neighbors of the rest are only counted, not listed
+    keys = np.floor(points / (eps / np.sqrt(2))).astype(np.int64)
+    cell_keys, cell_of, cell_sizes = np.unique(keys, axis=0, return_inverse=True, return_counts=True)
+    cell_of = cell_of.ravel()
+    core = cell_sizes[cell_of] >= min_samples
+    sparse = np.flatnonzero(~core)
+    core[sparse] = tree.query_ball_point(points[sparse], eps, return_length=True) >= min_samples
+
+    # The core points of a cell are all connected, so the clusters are the connected components of the cells. Two cells (up to two cells
+    # away) are connected if they have a pair of core points closer than the radius
+    core_df = pd.DataFrame({'cx': keys[core, 0], 'cy': keys[core, 1], 'cell': cell_of[core], 'point': np.flatnonzero(core)})
+    core_sizes = core_df['cell'].map(core_df['cell'].value_counts())
+    first, second = [], []
+
+    # Pairs of the small cells, point by point
+    small_df = core_df[core_sizes <= hubs_dense_cell]
+    for dx, dy in hubs_cell_offsets:
+        candidates = small_df.merge(small_df.assign(cx=small_df['cx'] + dx, cy=small_df['cy'] + dy), on=['cx','cy'], suffixes=('', '_neighbor'))
+        i, j = candidates['point'].to_numpy(), candidates['point_neighbor'].to_numpy()
+        close = (x[i] - x[j]) ** 2 + (y[i] - y[j]) ** 2 <= eps ** 2
+        first.append(candidates['cell'].to_numpy()[close])
+        second.append(candidates['cell_neighbor'].to_numpy()[close])
+
+    # Pairs with a dense cell, with the nearest core point of the dense cell to each core point of the neighbor cell
+    cell_points = core_df.groupby('cell')['point'].apply(np.array).to_dict()
+    cell_by_key = {tuple(cell_keys[cell]): cell for cell in cell_points}
+    for cell in core_df.loc[core_sizes > hubs_dense_cell, 'cell'].unique():
+        cell_tree = cKDTree(points[cell_points[cell]])
+        for dx, dy in hubs_cell_offsets:
+            neighbor = cell_by_key.get((cell_keys[cell][0] + dx, cell_keys[cell][1] + dy))
+            if neighbor is not None and (cell_tree.query(points[cell_points[neighbor]], distance_upper_bound=eps * (1 + 1e-9))[0] <= eps).any():
+                first.append([cell])
+                second.append([neighbor])
+
+    i, j = np.concatenate(first).astype(int), np.concatenate(second).astype(int)
+    graph = csr_matrix((np.ones(len(i)), (i, j)), shape=(len(cell_keys), len(cell_keys)))
+    components = connected_components(graph, directed=False)[1]
+    labels = np.where(core, components[cell_of], -1)
+
+    # Border points get the cluster of a core neighbor (the points that are not core have less neighbors than the minimum)
+    not_core = np.flatnonzero(~core)
+    neighbors = tree.query_ball_point(points[not_core], eps)
+    owners = np.repeat(not_core, [len(point_neighbors) for point_neighbors in neighbors])
+    neighbors = np.concatenate(neighbors).astype(int) if len(not_core) > 0 else np.array([], dtype=int)
+    border = core[neighbors]
+    labels[owners[border]] = labels[neighbors[border]]
+
+    # Number the clusters from the biggest one
+    clusters, counts = np.unique(labels[labels >= 0], return_counts=True)
+    new_ids = np.full(components.max() + 1, -1)
+    new_ids[clusters[np.argsort(-counts, kind='stable')]] = np.arange(len(clusters))
+
+    return np.where(labels >= 0, new_ids[np.maximum(labels, 0)], -1)
+
+# Given the tracks information (with first_lat, first_lon, last_lat and last_lon), returns the start and finish hub of each track, and the hubs
+# dataframe with the centroids and the counts
+def obtain_hubs(tracks_info_df, eps=hubs_eps, min_samples=hubs_min_samples):
+
+    # Starts and finishes are clustered together - a parking is usually both
+    n = len(tracks_info_df)
+    lats = np.concatenate([tracks_info_df['first_lat'].to_numpy(dtype=float), tracks_info_df['last_lat'].to_numpy(dtype=float)])
+    lons = np.concatenate([tracks_info_df['first_lon'].to_numpy(dtype=float), tracks_info_df['last_lon'].to_numpy(dtype=float)])
+    x, y = to_local_meters(lats, lons)
+    labels = grid_dbscan(x, y, eps, min_samples)
+    start_zone, finish_zone = labels[:n], labels[n:]
+
+    return start_zone, finish_zone, create_hubs_df(lats, lons, labels)
+
+# Given the tracks information of the tracks with hubs and of the new tracks, returns the start and finish hub of each new track: the hub of the
+# nearest start or finish of a hub closer than the radius (a point near a hub would join it in the clustering), or -1
+def assign_hubs(hubs_tracks_df, new_tracks_df, eps=hubs_eps):
+
+    # Starts and finishes of both, in the same local meters
+    n, m = len(hubs_tracks_df), len(new_tracks_df)
+    lats = np.concatenate([hubs_tracks_df['first_lat'].to_numpy(dtype=float), hubs_tracks_df['last_lat'].to_numpy(dtype=float),
+                           new_tracks_df['first_lat'].to_numpy(dtype=float), new_tracks_df['last_lat'].to_numpy(dtype=float)])
+    lons = np.concatenate([hubs_tracks_df['first_lon'].to_numpy(dtype=float), hubs_tracks_df['last_lon'].to_numpy(dtype=float),
+                           new_tracks_df['first_lon'].to_numpy(dtype=float), new_tracks_df['last_lon'].to_numpy(dtype=float)])
+    x, y = to_local_meters(lats, lons)
+    labels = np.concatenate([hubs_tracks_df['start_zone'].to_numpy(dtype=float), hubs_tracks_df['finish_zone'].to_numpy(dtype=float)])
+
+    # Nearest point of a hub to each new point
+    in_hub = np.flatnonzero(labels >= 0)
+    new_labels = np.full(2 * m, -1)
+    if len(in_hub) > 0 and m > 0:
+        distances, nearest = cKDTree(np.column_stack([x[in_hub], y[in_hub]])).query(np.column_stack([x[2 * n:], y[2 * n:]]), distance_upper_bound=eps * (1 + 1e-9))
+        close = distances <= eps
+        new_labels[close] = labels[in_hub[nearest[close]]].astype(int)
+
+    return new_labels[:m], new_labels[m:]
+
+# Hubs dataframe with the centroid, the counts, the tooltip and the popup of each hub, given the starts and finishes (first all the starts,
+# then all the finishes) and their hubs
+def create_hubs_df(lats, lons, labels):
+
+    n = len(labels) // 2
+    points_df = pd.DataFrame({'hub_id': labels, 'lat': lats, 'lon': lons, 'start': np.repeat([1, 0], n), 'finish': np.repeat([0, 1], n)})
+    hubs_df = points_df[points_df['hub_id'] >= 0].groupby('hub_id', as_index=False).agg(lat=('lat', 'mean'), lon=('lon', 'mean'),
+                                                                                       total_starts=('start', 'sum'), total_finishes=('finish', 'sum'))
+    hubs_df[['lat','lon']] = hubs_df[['lat','lon']].round(6)
+
+    # Tooltip and popup of the hubs
+    hubs_df['map_tooltip'] = 'Hub <b>' + hubs_df['hub_id'].astype(str) + '</b>'
+    hubs_df['map_popup'] = ('<div style="font-size: 10px;"><b>Hub ' + hubs_df['hub_id'].astype(str) + '</b><br>' +
+                            '<ul style="padding-left: 16px; margin: 4px 0;">' +
+                            '<li><b>Tracks starting</b>: ' + hubs_df['total_starts'].astype(str) + '</li>' +
+                            '<li><b>Tracks finishing</b>: ' + hubs_df['total_finishes'].astype(str) + '</li>' +
+                            '<li><b>Longitude</b>: ' + hubs_df['lon'].astype(str) + '</li>' +
+                            '<li><b>Latitude</b>: ' + hubs_df['lat'].astype(str) + '</li></ul></div>')
+
+    return hubs_df
@@ -0,0 +1,63 @@
+import numpy as np
+
+# MinHash signatures and LSH bands. A signature summarizes a set of tokens (edges, or sequences of edges), and the fraction of equal values of two
+# signatures estimates the Jaccard similarity of the sets. The signatures are split in bands, and two sets with a band in common are candidates
+# to be similar - only the sets sharing a band are compared, instead of all the pairs
+
+# Number of hash functions of a signature, and prime of the hash functions (bigger than 2^32)
+minhash_permutations = 64
+minhash_prime = np.uint64(4294967311)
+
+# Parameters of the hash functions - with a fixed seed, so the saved signatures can be compared with the new ones
+hash_rng = np.random.default_rng(2024)
+hash_a = hash_rng.integers(1, 2 ** 32, minhash_permutations, dtype=np.uint64)
+hash_b = hash_rng.integers(0, 2 ** 32, minhash_permutations, dtype=np.uint64)
+
+# Mixes some integers into well distributed 64 bits hashes (splitmix64)
+def mix_hash(values):
+
+    with np.errstate(over='ignore'):
+        values = np.asarray(values).astype(np.uint64) + np.uint64(0x9E3779B97F4A7C15)
+        values = (values ^ (values >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        values = (values ^ (values >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+
+    return values ^ (values >> np.uint64(31))
+
+# Hashes some tokens into 32 bits integers - each row of a 2D array is a token (for example, a sequence of edges)
+def hash_tokens(tokens):
+
+    tokens = np.atleast_2d(np.asarray(tokens, dtype=np.int64))
+    hashes = np.zeros(len(tokens), dtype=np.uint64)
+    for column in range(tokens.shape[1]):
+        hashes = mix_hash(hashes ^ mix_hash(tokens[:, column]))
+
+    return hashes & np.uint64(0xFFFFFFFF)
+
+# MinHash signature of a set of hashed tokens - the minimum of each hash function (a * x + b) mod p
+def minhash_signature(token_hashes):
+
+    token_hashes = np.unique(np.asarray(token_hashes, dtype=np.uint64))
+    if len(token_hashes) == 0:
+        return np.full(minhash_permutations, minhash_prime, dtype=np.uint64)
+
+    return ((hash_a[:, None] * token_hashes[None, :] + hash_b[:, None]) % minhash_prime).min(axis=1)
+
+# Keys of the bands of a signature - each band is hashed into one integer, with the number of the band
+def lsh_band_keys(signature, bands):
+
+    rows = len(signature) // bands
+    band_hashes = hash_tokens(np.asarray(signature, dtype=np.uint64).astype(np.int64)[:bands * rows].reshape(bands, rows))
+
+    return [(band, int(band_hash)) for band, band_hash in enumerate(band_hashes)]
+
+# Estimated Jaccard similarity of two signatures
+def estimate_similarity(signature1, signature2):
+    return float(np.mean(np.asarray(signature1) == np.asarray(signature2)))
+
+# Signature to a compact text (values separated by spaces), to save it in a csv
+def encode_signature(signature):
+    return ' '.join(str(int(value)) for value in signature)
+
+# Compact text to signature
+def decode_signature(text):
+    return np.array(text.split(' '), dtype=np.uint64)
@@ -5,11 +5,13 @@ import json
 from geopy.distance import geodesic
 from pandas.errors import SettingWithCopyWarning
 from shapely.geometry import LineString
-from datetime import datetime
-import requests
 import numpy as np
 import warnings
 import ast
+from weather_archive import obtain_weather, obtain_tracks_weather
+from hubs_clustering import obtain_hubs, assign_hubs, create_hubs_df
+from zones import zone_center
+from segments import update_segments, obtain_segment_of
 
 warnings.filterwarnings("ignore", category=FutureWarning)
 warnings.filterwarnings("ignore", message="Could not find the number of physical cores")
@@ -19,8 +21,16 @@ warnings.filterwarnings("ignore", category=SettingWithCopyWarning)
 pace_color_dict = {'Less than 15 min/km':'#ae017e', 'From 15 to 30 min/km':'#f768a1', 'From 30 to 45 min/km':'#fbb4b9', 'More than 45 min/km':'#feebe2'}
 uphill_color_dict = {'Less than 7.5%':'#f1eef6', 'From 7.5% to 15%':'#bdc9e1', 'From 15% to 22.5%':'#74a9cf', 'More than 22.5%':'#0570b0'}
 
-# Dictionary with the center coordinates
-center_coords_dict = {"canigo": (2.5, 42.5), "matagalls": (2.4, 41.825), "vallferrera": (1.35, 42.6), "exemple": (2.4, 41.825)}
+# Dictionaries to parse the dates - catalan month names, month and weekday abbreviations, and meteorological seasons
+catalan_months_dict = {'gener': 1, 'febrer': 2, 'març': 3, 'abril': 4, 'maig': 5, 'juny': 6, 'juliol': 7, 'agost': 8, 'setembre': 9, 'octubre': 10, 'novembre': 11, 'desembre': 12}
+months_dict = {1: 'Jan', 2: 'Feb', 3: 'Mar', 4: 'Apr', 5: 'May', 6: 'Jun', 7: 'Jul', 8: 'Aug', 9: 'Sep', 10: 'Oct', 11: 'Nov', 12: 'Dec'}
+weekdays_dict = {0: 'Mon', 1: 'Tue', 2: 'Wed', 3: 'Thu', 4: 'Fri', 5: 'Sat', 6: 'Sun'}
+season_map = {'Dec':'Win', 'Jan':'Win', 'Feb':'Win', 'Mar':'Spr', 'Apr':'Spr', 'May':'Spr', 'Jun':'Sum', 'Jul':'Sum', 'Aug':'Sum', 'Sep':'Aut', 'Oct':'Aut', 'Nov':'Aut'}
+
+# Columns of the tracks information dataframe
+tracks_info_columns = ['track_id','user','title','url','difficulty','date','month','year','season','weekday','track_date','total_time',
+                       'total_distance','average_speed','average_pace','elevation_gain','min_temp','max_temp','weather_condition',
+                       'first_coordinate','last_coordinate','start_zone','finish_zone','geometry']
 
 # Given the total minutes, divide it into hours, minutes and seconds
 def format_time(total_minutes):
@@ -437,68 +447,52 @@ def create_edges_partial_df(track_df):
     # Return the dataframe
     return edges_df[['edge_id','avg_speed','avg_pace','pace_group','pace_color','time','dist','elev_gain','uphill_perc','uphill_perc_group','uphill_perc_color','geometry']]
 
-# Given a date in string format, returns other metrics
-def obtain_date(input_date):
+# Divides again the partial edges of the processed tracks into segments (when the segments are created), from the edges of all their coordinates.
+# The signatures of the old partial edges are removed, so they are computed again with the segments
+def rebuild_partial_edges(all_tracks_path, partial_edges_path, segment_of, dataframes_path):
 
-    # Clean the input date - initially it is in catalan, replace strings
-    input_date = input_date.replace("de gener", "January").replace("de febrer", "February").replace("de març", "March").replace("d’abril", "April").replace("d'abril", "April").replace("de maig", "May")
-    input_date = input_date.replace("de juny", "June").replace("de juliol", "July").replace("d’agost", "August").replace("d'agost", "August").replace("de setembre", "September").replace("d’octubre", "October")
-    input_date = input_date.replace("d'octubre", "October").replace("de novembre", "November").replace("de desembre", "December")
+    for file in os.listdir(all_tracks_path):
+        all_track_df = pd.read_csv(os.path.join(all_tracks_path, file))
+        edges_partial_df = create_edges_partial_df(all_track_df.assign(edge_id=all_track_df['edge_id'].map(segment_of)))
+        edges_partial_df.to_csv(os.path.join(partial_edges_path, file), index=False)
 
-    # Proceed with the conversion
-    date = input_date.replace(" de ", " ")  # Remove the extra 'de'
-    date = pd.to_datetime(datetime.strptime(date.strip(), "%d %B %Y").strftime("%d/%m/%Y"), dayfirst=True).date()   # Convert to datetime
-    
-    # Find the year, month, and weekday (first three leters)
-    year = date.year
-    month = date.strftime('%b')
-    weekday = date.strftime('%a')
-    
-    # Map months to meteorological seasons
-    season_map = {'Dec':'Win', 'Jan':'Win', 'Feb':'Win', 'Mar':'Spr', 'Apr':'Spr', 'May':'Spr', 'Jun':'Sum', 'Jul':'Sum', 'Aug':'Sum', 'Sep':'Aut', 'Oct':'Aut', 'Nov':'Aut'}
-    season = season_map[month]
+    for signatures_path in [os.path.join(dataframes_path, 'sequence_signatures.csv'), os.path.join(dataframes_path, 'Edges-Dataframes', 'edge_set_signatures.csv')]:
+        if os.path.exists(signatures_path):
+            os.remove(signatures_path)
+
+# Given the date-up (day, month and year) and the date-track (month and year) strings in catalan, returns the date metrics of each track.
+# Only the distinct strings are parsed (most of the tracks share them), and the results are mapped to all the tracks
+def obtain_dates_df(date_up, date_track):
 
-    return date, month, year, season, weekday
+    # Parse the distinct strings - an optional day, the month with its article, and the year ("4 d’octubre de 2022", "d’agost 2020")
+    uniques = pd.Series(pd.concat([pd.Series(date_up), pd.Series(date_track)]).dropna().unique(), dtype=str)
+    parts = uniques.str.replace('’', "'").str.lower().str.extract(r"^\s*(?:(\d{1,2})\s+)?(?:de\s+|d')(\w+)(?:\s+de)?\s+(\d{4})\s*$")
+    parsed = pd.DataFrame({'year': pd.to_numeric(parts[2]), 'month': parts[1].map(catalan_months_dict), 'day': pd.to_numeric(parts[0])})
+    parsed = pd.Series(pd.to_datetime(parsed.fillna({'day': 1}), errors='coerce').to_numpy(), index=uniques.to_numpy())
 
-# Function to obtain the weather information of a given zone from one date to another
-def obtain_weather_dataframe(start_date, end_date, zone):
+    # Dates of each track
+    dates = pd.Series(pd.Series(date_up).map(parsed).to_numpy(), dtype='datetime64[ns]')
+    track_dates = pd.Series(pd.Series(date_track).map(parsed).to_numpy(), dtype='datetime64[ns]')
 
-    # Transform the start and the end dates
-    start_date = pd.to_datetime(start_date).strftime('%Y-%m-%d')
-    end_date = pd.to_datetime(end_date).strftime('%Y-%m-%d')
+    # Find the year, month (first three letters), season and weekday (first three letters)
+    dates_df = pd.DataFrame({'date': dates.dt.date, 'month': dates.dt.month.map(months_dict), 'year': dates.dt.year})
+    dates_df['season'] = dates_df['month'].map(season_map)
+    dates_df['weekday'] = dates.dt.weekday.map(weekdays_dict)
+    dates_df['track_date'] = track_dates.dt.strftime('%Y-%m')     # Only the month and the year
 
-    # Obtain the center cords
-    center_cords = center_coords_dict[zone]
+    return dates_df
+
+# Function to obtain the weather information of a given zone from one date to another - from the local weather archive, only the missing days are fetched
+def obtain_weather_dataframe(start_date, end_date, zone, data_path, weather_fetcher=None):
+
+    # Obtain the center cords, from the zones registry
+    center_cords = zone_center(zone, data_path)
     lon = center_cords[0]
     lat = center_cords[1]
 
-    # Convert weather code to a readable condition
-    weather_mapping = {0: "Clear", 1: "Clear",          # The library has more weather conditions, but we define less groups
-                       2: "Cloudy", 3: "Cloudy",
-                       45: "Fog", 48: "Fog",
-                       51: "Drizzle", 53: "Drizzle", 55: "Drizzle",
-                       61: "Rain", 63: "Rain", 65: "Rain", 80: "Rain", 81: "Rain", 82: "Rain",
-                       71: "Snow", 73: "Snow", 75: "Snow",
-                       95: "Thunderstorm", 96: "Thunderstorm", 99: "Thunderstorm"}
-    
-    url = (f"https://archive-api.open-meteo.com/v1/archive?"    # Url with the information
-            f"latitude={lat}&longitude={lon}"
-            f"&start_date={start_date}&end_date={end_date}"
-            f"&daily=temperature_2m_min,temperature_2m_max,weathercode"
-            f"&timezone=auto")
-
-    data = requests.get(url).json()     # The request to json format
-
-    df = pd.DataFrame({"date": data["daily"]["time"],   # Result to dataframe
-                        "min_temp": data["daily"]["temperature_2m_min"],
-                        "max_temp": data["daily"]["temperature_2m_max"],
-                        "weather_code": data["daily"]["weathercode"]})
-    
-    df['weather_condition'] = df['weather_code'].map(weather_mapping)
+    return obtain_weather(os.path.join(data_path, 'Weather-Archive'), lat, lon, start_date, end_date, fetcher=weather_fetcher)
 
-    return df[['date', 'min_temp', 'max_temp', 'weather_condition']]
-
-# Part 1 of the postprocessing - obtains the routes information
+# Part 1 of the postprocessing - obtains the routes information, returns the ids of the new tracks of the tracks information
 def postprocessing_part1(input_path, osm_path, output_path, dataframes_path, fmm_out_path):
     
     # Obtain the edges dataframe
@@ -508,6 +502,10 @@ def postprocessing_part1(input_path, osm_path, output_path, dataframes_path, fmm
         edges_df = generate_edges_df(osm_path)
         edges_df.to_csv(os.path.join(dataframes_path, 'edges.csv'), index=False)
 
+    # Contract the edges into trail segments - the partial edges of the tracks are divided by segments (or by edges, if the contraction saves little)
+    _, edge_segments_df, new_segments = update_segments(dataframes_path, edges_df)
+    segment_of = obtain_segment_of(edge_segments_df)
+
     # Read the fmm output configuration dataframe
     fmm_config_df = pd.read_csv(os.path.join(dataframes_path, 'fmm_config.csv'))
 
@@ -529,23 +527,27 @@ def postprocessing_part1(input_path, osm_path, output_path, dataframes_path, fmm
     partial_edges_path = os.path.join(tracks_out_path, 'Partial-Edges')
     os.makedirs(partial_edges_path, exist_ok=True)
 
+    # The tracks processed before are divided again, only if the mapping of the edges into segments has changed
+    if new_segments:
+        rebuild_partial_edges(all_tracks_path, partial_edges_path, segment_of, dataframes_path)
+
     # Read the dataframe
     if os.path.exists(os.path.join(dataframes_path, 'tracks_info.csv')):
-        track_info_df = pd.read_csv(os.path.join(dataframes_path, 'tracks_info.csv'))
+        track_info_df = pd.read_csv(os.path.join(dataframes_path, 'tracks_info.csv')).reindex(columns=tracks_info_columns)     # Older files have no track date
     
     else:
-        # Create an empty dataframe, we will iterate to append information for each track
-        track_info_df = pd.DataFrame(columns=['track_id','user','title','url','difficulty','date','month','year','season','weekday','total_time',
-                                            'total_distance','average_speed','average_pace','elevation_gain','min_temp','max_temp','weather_condition',
-                                            'first_coordinate','last_coordinate','start_zone','finish_zone','geometry'])
+        # Create an empty dataframe, we will append the information of the new tracks
+        track_info_df = pd.DataFrame(columns=tracks_info_columns)
         track_info_df.to_csv(os.path.join(dataframes_path, 'tracks_info.csv'), index=False)
 
     # Obtain a list with the already processed tracks, the tracks in track_info_df, and the discarded files with error 7
     processed_tracks = list(set(track_info_df['track_id'].unique().tolist() + disc_df[disc_df['error_type'] == 7]['track_id'].unique().tolist()))
 
-    # Tracks to proceed
+    # Tracks to proceed, and the information of the new tracks
     len_df = len(fmm_config_df) - len(processed_tracks)
     index = 1
+    new_tracks = []
+    new_track_ids = []
     
     # For each track, proceed
     for track_id in fmm_config_df['track_id'].unique().tolist():
@@ -575,7 +577,7 @@ def postprocessing_part1(input_path, osm_path, output_path, dataframes_path, fmm
                     # Create the three partials dataframes
                     km_partial_df = create_km_partial_df(all_track_df)
                     pace_partial_df = create_pace_partial_df(all_track_df)
-                    edges_partial_df = create_edges_partial_df(all_track_df)
+                    edges_partial_df = create_edges_partial_df(all_track_df.assign(edge_id=all_track_df['edge_id'].map(segment_of)))     # By segments
 
                     # Save the partial df
                     km_partial_df.to_csv(os.path.join(partial_km_path, str(track_id)+'.csv'), index=False)
@@ -591,90 +593,119 @@ def postprocessing_part1(input_path, osm_path, output_path, dataframes_path, fmm
             with open(inp_json_path, "r", encoding="utf-8") as file:
                 json_data = json.load(file)
 
-            # List to store the track information while we are getting it
-            track_information = []
-
-            # Track id, and other information
-            track_information.extend([track_id, json_data['user'], json_data['title'], json_data['url'], json_data['difficulty']])
-
-            # Apply the function to know the date correctly and the other metrics
-            date, month, year, season, weekday = obtain_date(json_data['date-up'])
-
-            # Discard if the track is older than 2012 (only in canigo and vallferrera)
-            if year >= 2012:
-
-                # Add all this information into the list
-                track_information.extend([date, month, year, season, weekday])
-
-                # Extend the list with the track metrics (calculated in the dataframe before)
-                track_information.extend([all_track_df['elap_time'].iloc[-1],  # Total time
-                                        all_track_df['elap_dist'].iloc[-1],  # Total distance
-                                        round(all_track_df['speed'].mean(), 2),  # Average speed
-                                        round(all_track_df['pace'].mean(), 2),   # Average pace
-                                        all_track_df[all_track_df['elev_diff'] > 0]['elev_diff'].sum()])    # Elevation gain
-
-                # For the weather data, insert None data
-                track_information.extend([None, None, None])
+            # Apply a transformation into the difficulty - only 4 groups
+            difficulty = {'Fàcil': 'Easy',
+                          'Moderat': 'Moderate',
+                          'Difícil': 'Difficult',
+                          'Molt difícil': 'Very difficult',
+                          'Només experts': 'Very difficult'}.get(json_data['difficulty'], json_data['difficulty'])
+
+            # Track information - the dates are parsed after the loop, for all the new tracks at once
+            new_tracks.append({'track_id': track_id, 'user': json_data['user'], 'title': json_data['title'], 'url': json_data['url'], 'difficulty': difficulty,
+                               'date_up': json_data.get('date-up'), 'date_track': json_data.get('date-track'),
+                               'total_time': all_track_df['elap_time'].iloc[-1],     # Total time
+                               'total_distance': all_track_df['elap_dist'].iloc[-1],     # Total distance
+                               'average_speed': round(all_track_df['speed'].mean(), 2),  # Average speed
+                               'average_pace': round(all_track_df['pace'].mean(), 2),    # Average pace
+                               'elevation_gain': all_track_df[all_track_df['elev_diff'] > 0]['elev_diff'].sum(),    # Elevation gain
+                               'min_temp': None, 'max_temp': None, 'weather_condition': None,      # For the weather data, insert None data
+                               'first_coordinate': (all_track_df['lat'].iloc[0], all_track_df['lon'].iloc[0]),     # First and last coordinates, None data for the zone
+                               'last_coordinate': (all_track_df['lat'].iloc[-1], all_track_df['lon'].iloc[-1]),
+                               'start_zone': None, 'finish_zone': None,
+                               'geometry': LineString(zip(all_track_df['lat'], all_track_df['lon']))})
+
+    if new_tracks:
+
+        # Parse the dates of all the new tracks
+        new_tracks_df = pd.DataFrame(new_tracks)
+        new_tracks_df = pd.concat([new_tracks_df, obtain_dates_df(new_tracks_df['date_up'], new_tracks_df['date_track'])], axis=1)
+
+        # Discard the tracks older than 2012 (only in canigo and vallferrera), or without a valid date
+        old_tracks = ~(new_tracks_df['year'] >= 2012)
+        disc_df = pd.concat([disc_df, pd.DataFrame({'track_id': new_tracks_df[old_tracks]['track_id'], 'error_type': 7})], ignore_index=True)
+        disc_df.to_csv(disc_path, index=False)
+
+        # Add the information of the new tracks into the dataframe
+        new_tracks_df = new_tracks_df[~old_tracks].astype({'year': int})
+        track_info_df = pd.concat([df for df in [track_info_df, new_tracks_df[tracks_info_columns]] if len(df) > 0], ignore_index=True)
+        track_info_df.to_csv(os.path.join(dataframes_path, 'tracks_info.csv'), index=False)
+        new_track_ids = new_tracks_df['track_id'].astype(int).tolist()
 
-                # Insert the first and the last coordinates, also None data for the zone
-                track_information.extend([(all_track_df['lat'].iloc[0], all_track_df['lon'].iloc[0]),
-                                        (all_track_df['lat'].iloc[-1], all_track_df['lon'].iloc[-1]),
-                                        None, None])
+    return new_track_ids
 
-                # Insert the geometry
-                track_information.append(LineString(zip(all_track_df['lat'], all_track_df['lon'])))
+# Splits the first and the last coordinates of the tracks information into latitude and longitude columns
+def split_coordinates(tracks_info_df):
 
-                # Apply a transformation into the difficulty dataframe - only 4 groups
-                track_information['difficulty'] = track_information['difficulty'].replace({'Fàcil': 'Easy',
-                                                                                           'Moderat': 'Moderate',
-                                                                                           'Difícil': 'Difficult',
-                                                                                           'Molt difícil': 'Very difficult',
-                                                                                           'Només experts': 'Very difficult'})
-                
-                # # Add the track information into the dataframe
-                track_info_df.loc[len(track_info_df)] = track_information
-                track_info_df.to_csv(os.path.join(dataframes_path, 'tracks_info.csv'), index=False)
+    tracks_info_df = tracks_info_df.copy()
+    tracks_info_df['first_coordinate'] = tracks_info_df['first_coordinate'].apply(lambda x: ast.literal_eval(x) if isinstance(x, str) else x)   # String to tuple
+    tracks_info_df['last_coordinate'] = tracks_info_df['last_coordinate'].apply(lambda x: ast.literal_eval(x) if isinstance(x, str) else x)
+    tracks_info_df[['first_lat', 'first_lon']] = pd.DataFrame(tracks_info_df['first_coordinate'].tolist(), index=tracks_info_df.index, columns=[0, 1])     # Split into separate lat and lon columns
+    tracks_info_df[['last_lat', 'last_lon']] = pd.DataFrame(tracks_info_df['last_coordinate'].tolist(), index=tracks_info_df.index, columns=[0, 1])
 
-            else:
-                disc_df = pd.concat([disc_df, pd.DataFrame({'track_id':[track_id], 'error_type':[7]})], ignore_index=True)
-                disc_df.to_csv(disc_path, index=False)   
-                continue
+    return tracks_info_df
 
-# Part 2 of the postprocessing - inputs the weather information and the starting and ending zones
-def postprocessing_part2(zone, dataframes_path):
+# Part 2 of the postprocessing - inputs the weather information and the starting and ending zones (hubs). If some track ids are given (the new
+# tracks of a batch) and the hubs already exist, only these tracks get the weather and are assigned to the hubs, the other tracks are kept
+def postprocessing_part2(data_path, zone, dataframes_path, weather_fetcher=None, track_ids=None):
 
     # Read the tracks info dataframe
     tracks_info_path = os.path.join(dataframes_path, 'tracks_info.csv')
+    weather_path = os.path.join(dataframes_path, 'weather.csv')
+    hubs_path = os.path.join(dataframes_path, 'hubs.csv')
     tracks_info_df = pd.read_csv(tracks_info_path)
 
-    # Obtain the weather information dataframe
-    weather_df = obtain_weather_dataframe(tracks_info_df['date'].min(), tracks_info_df['date'].max(), zone)
+    # Tracks to proceed, and the tracks that are kept
+    incremental = track_ids is not None and os.path.exists(weather_path) and os.path.exists(hubs_path)
+    new_rows = tracks_info_df['track_id'].isin(track_ids) if incremental else pd.Series(True, index=tracks_info_df.index)
+    kept_df, tracks_info_df = tracks_info_df[~new_rows], tracks_info_df[new_rows]
+    if incremental and len(tracks_info_df) == 0:
+        return
+
+    # Obtain the weather information dataframe - with the stored weather, only the new days are added
+    if incremental:
+        stored_weather_df = pd.read_csv(weather_path)
+        weather_df = obtain_weather_dataframe(min(stored_weather_df['date'].min(), tracks_info_df['date'].min()),
+                                              max(stored_weather_df['date'].max(), tracks_info_df['date'].max()), zone, data_path, weather_fetcher)
+    else:
+        weather_df = obtain_weather_dataframe(tracks_info_df['date'].min(), tracks_info_df['date'].max(), zone, data_path, weather_fetcher)
 
     # Save the weather dataframe
-    weather_df.to_csv(os.path.join(dataframes_path, 'weather.csv'), index=False)
+    weather_df.to_csv(weather_path, index=False)
 
     # Drop the weather information columns from the initial dataframe
     tracks_info_df = tracks_info_df.drop(columns=['min_temp','max_temp','weather_condition'])
 
-    # Merge dataframes, and reorder the final one with the desired order
+    # Split the first and the last coordinates
+    tracks_info_df = split_coordinates(tracks_info_df)
+
+    # Weather of each track from its first coordinate, and the weather of the zone center for the tracks without it
+    tracks_weather_df = obtain_tracks_weather(os.path.join(data_path, 'Weather-Archive'), tracks_info_df.rename(columns={'first_lat': 'lat', 'first_lon': 'lon'}), fetcher=weather_fetcher)
     tracks_info_df = tracks_info_df.merge(weather_df, on='date')
-    
-    # Obtain ten clusters to identify start and ending zones
-    tracks_info_df['first_coordinate'] = tracks_info_df['first_coordinate'].apply(lambda x: ast.literal_eval(x) if isinstance(x, str) else x)   # String to tuple
-    tracks_info_df['last_coordinate'] = tracks_info_df['last_coordinate'].apply(lambda x: ast.literal_eval(x) if isinstance(x, str) else x)
-    tracks_info_df[['first_lat', 'first_lon']] = pd.DataFrame(tracks_info_df['first_coordinate'].tolist(), index=tracks_info_df.index)          # Split into separate lat and lon columns
-    tracks_info_df[['last_lat', 'last_lon']] = pd.DataFrame(tracks_info_df['last_coordinate'].tolist(), index=tracks_info_df.index)
+    tracks_info_df = tracks_info_df.set_index('track_id')
+    tracks_info_df.update(tracks_weather_df.set_index('track_id'))
+    tracks_info_df = tracks_info_df.reset_index()
+
+    # Cluster the first and the last coordinates to identify the start and finish zones (hubs), or assign the new tracks to the hubs (so the
+    # ids of the hubs do not change), and save the hubs
+    if incremental:
+        kept_coordinates_df = split_coordinates(kept_df)
+        tracks_info_df['start_zone'], tracks_info_df['finish_zone'] = assign_hubs(kept_coordinates_df, tracks_info_df)
+        all_coordinates_df = pd.concat([kept_coordinates_df, tracks_info_df], ignore_index=True)
+        hubs_df = create_hubs_df(np.concatenate([all_coordinates_df['first_lat'].to_numpy(dtype=float), all_coordinates_df['last_lat'].to_numpy(dtype=float)]),
+                                 np.concatenate([all_coordinates_df['first_lon'].to_numpy(dtype=float), all_coordinates_df['last_lon'].to_numpy(dtype=float)]),
+                                 np.concatenate([all_coordinates_df['start_zone'].fillna(-1).to_numpy(dtype=int), all_coordinates_df['finish_zone'].fillna(-1).to_numpy(dtype=int)]))
+    else:
+        tracks_info_df['start_zone'], tracks_info_df['finish_zone'], hubs_df = obtain_hubs(tracks_info_df)
+    hubs_df.to_csv(hubs_path, index=False)
 
-    # Reorder the dataframe
-    tracks_info_df = tracks_info_df[['track_id','user','title','url','difficulty','date','month','year','season','weekday','total_time',
-                                     'total_distance','average_speed','average_pace','elevation_gain','min_temp','max_temp','weather_condition',
-                                     'first_coordinate','last_coordinate','geometry']]
+    # Reorder the dataframe, with the kept tracks first
+    tracks_info_df = pd.concat([df for df in [kept_df, tracks_info_df.reindex(columns=tracks_info_columns)] if len(df) > 0], ignore_index=True)
 
     # Save the tracks info dataframe to the desired path
     tracks_info_df.to_csv(tracks_info_path, index=False)
 
-# Main postprocessing function
-def main_postprocessing(data_path, zone):
+# Main postprocessing function - with incremental, only the new tracks get the weather and the hubs. Returns the ids of the new tracks
+def main_postprocessing(data_path, zone, weather_fetcher=None, incremental=False):
 
     # Obtain all the paths
     zone_path = os.path.join(data_path, zone)
@@ -685,6 +716,8 @@ def main_postprocessing(data_path, zone):
     fmm_out_path = os.path.join(output_path, 'FMM-Output')
 
     # Proceed with the first part and second of the postprocessing
-    postprocessing_part1(input_path, osm_path, output_path, dataframes_path, fmm_out_path)
-    postprocessing_part2(zone, dataframes_path)
+    new_track_ids = postprocessing_part1(input_path, osm_path, output_path, dataframes_path, fmm_out_path)
+    postprocessing_part2(data_path, zone, dataframes_path, weather_fetcher, new_track_ids if incremental else None)
+
+    return new_track_ids
     
\ No newline at end of file
@@ -1,41 +1,33 @@
 from fmm import Network,NetworkGraph,UBODTGenAlgorithm
 import os
 import osmnx as ox
-from shapely.geometry import Polygon
 import shutil
 import zipfile
+from zones import zone_polygon
 
-bounds_dict = {"canigo": (2.2, 2.7, 42.4, 42.6), "matagalls": (2.3, 2.5, 41.8, 41.9), "vallferrera": (1.2, 1.7, 42.5, 42.8), "exemple": (2.3, 2.5, 41.8, 41.9)}
+# Copy into the input directory only the JSON files of the zip that are not already there, returns the new track ids
+def extract_new_zip_files(zip_file_path, input_path):
 
-# Unzip the zipped file, and drop all JSON files into the input directory
-def extract_zip_file(data_path, zip_file_path, input_path):
+    # Create the input path if needed, and obtain the files already extracted
+    os.makedirs(input_path, exist_ok=True)
+    extracted_files = set(os.listdir(input_path))
 
-    # Check if the input path exists to avoid execution
-    if os.path.exists(input_path):
-        return
-    
-    # Create a provisional directory to put all the files, at the end of the function, we will erase it
-    provisional_path = os.path.join(data_path,'Provisional-Zip-Data')
-    os.makedirs(provisional_path, exist_ok=True)
+    new_tracks = []
 
-    # Extract the zip file to the provisional path
+    # Read only the names of the zip, and extract the new JSON files one by one (the zip can have directories inside)
     with zipfile.ZipFile(zip_file_path, 'r') as zip_file:
-        zip_file.extractall(provisional_path)
-
-    # Create the input path
-    os.makedirs(input_path, exist_ok=True)
+        for member in zip_file.namelist():
+            file = os.path.basename(member)
+            if file.endswith('.json') and file not in extracted_files:
+                with zip_file.open(member) as source, open(os.path.join(input_path, file), 'wb') as target:
+                    shutil.copyfileobj(source, target)
+                extracted_files.add(file)
+                new_tracks.append(int(file.split('.')[0]))
 
-    # For each directory of the provisional path, we check the JSON files
-    for root, _, files in os.walk(provisional_path):
-        for file in files:
-            if file.endswith('.json'):
-                shutil.copy2(os.path.join(root, file), os.path.join(input_path, file))  # Move the file from the root to the input directory
-
-    # Remove the provisional path
-    shutil.rmtree(provisional_path)
+    return new_tracks
 
 # Fills the OSM-Data directory with the needed data of OSM
-def generate_osm_network(osm_path, zone, bound):
+def generate_osm_network(osm_path, zone, boundary_polygon):
 
     # Check if the OSM-Data path is already filled
     if os.path.exists(osm_path):
@@ -45,8 +37,6 @@ def generate_osm_network(osm_path, zone, bound):
     os.makedirs(osm_path, exist_ok=True)
 
     # Create a network and the graph with OSMNX
-    x1,x2,y1,y2 = bounds_dict.get(zone)      # Depending on the zone, select the bounds
-    boundary_polygon = Polygon([(x1,y1),(x2,y1),(x2,y2),(x1,y2)])   # Create the bounds polygon
     G = ox.graph_from_polygon(boundary_polygon, network_type='all')     # Create the graph (all type of paths)
 
     # Create the paths
@@ -75,23 +65,24 @@ def generate_osm_network(osm_path, zone, bound):
 # Creates all the directories
 def main_preprocessing(data_path, zone):
 
-    # Check if the zip file exists
+    # Check if the zip file exists - or if the input data is already there (routed from a combined dump)
     zip_file_path = os.path.join(data_path, 'Zip-Files', f'{zone}.zip')
-    if not os.path.exists(zip_file_path):
+    zone_path = os.path.join(data_path, zone)
+    input_path = os.path.join(zone_path, 'Input-Data')
+    if not os.path.exists(zip_file_path) and not os.path.exists(input_path):
         print(f'The zip file of the zone {zone} is not in directory Zip-Files.')
         return
 
-    # Define the zone path and create it
-    zone_path = os.path.join(data_path, zone)
+    # Create the zone path
     os.makedirs(zone_path, exist_ok=True)
 
-    # Input data path
-    input_path = os.path.join(zone_path, 'Input-Data')
-    extract_zip_file(data_path, zip_file_path, input_path)
+    # Input data path - only the files of the zip that are not there yet, the input directory can already have the tracks routed from a combined dump
+    if os.path.exists(zip_file_path):
+        extract_new_zip_files(zip_file_path, input_path)
 
     # OSM data path
     osm_path = os.path.join(zone_path, 'OSM-Data')
-    generate_osm_network(osm_path, zone, bounds_dict[zone])
+    generate_osm_network(osm_path, zone, zone_polygon(zone, data_path))     # Polygon of the zone, from the zones registry
 
     # Output data path
     output_path = os.path.join(zone_path, 'Output-Data')
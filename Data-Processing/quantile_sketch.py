@@ -0,0 +1,117 @@
+import pandas as pd
+import numpy as np
+
+# Mergeable quantile sketch (t-digest): a sketch is a dataframe of centroids with their mean and weight, sorted by the mean.
+# Centroids are small near the tails and big near the median, so the extreme quantiles are more precise
+
+# Compression of the t-digest - the sketch keeps around half this number of centroids
+sketch_compression = 100
+
+# Scale function of the t-digest, maps a quantile into the index of its centroid
+def scale_function(quantiles, compression=sketch_compression):
+    return compression / (2 * np.pi) * np.arcsin(2 * np.clip(quantiles, 0, 1) - 1)
+
+# Creates an empty sketch
+def create_sketch():
+    return pd.DataFrame({'mean': pd.Series(dtype=float), 'weight': pd.Series(dtype=float)})
+
+# Compresses the centroids of a sketch (they can be in any order, and repeated)
+def compress_sketch(sketch, compression=sketch_compression):
+
+    # Sort by the mean, and remove the empty values
+    sketch = sketch[sketch['weight'] > 0].dropna().sort_values(by='mean')
+    if len(sketch) == 0:
+        return create_sketch()
+
+    # Quantile in the middle of each centroid
+    means = sketch['mean'].to_numpy(dtype=float)
+    weights = sketch['weight'].to_numpy(dtype=float)
+    cumul_weights = np.cumsum(weights)
+    mid_quantiles = (cumul_weights - weights / 2) / cumul_weights[-1]
+
+    # The centroids with the same integer part of the scale function are merged (the scale grows less than 1 inside a centroid)
+    buckets = np.floor(scale_function(mid_quantiles, compression))
+    buckets = np.concatenate([[0], np.cumsum(buckets[1:] != buckets[:-1])])
+
+    # Weighted mean of each bucket
+    merged_weights = np.bincount(buckets, weights=weights)
+    merged_means = np.bincount(buckets, weights=means * weights) / merged_weights
+
+    return pd.DataFrame({'mean': merged_means, 'weight': merged_weights})
+
+# Adds some values (with weight 1) into a sketch
+def add_to_sketch(sketch, values, compression=sketch_compression):
+
+    # Values as centroids of weight 1
+    values = np.asarray(values, dtype=float)
+    values = values[~np.isnan(values)]
+    new_centroids = pd.DataFrame({'mean': values, 'weight': np.ones(len(values))})
+
+    return compress_sketch(pd.concat([sketch, new_centroids], ignore_index=True), compression)
+
+# Merges some sketches (of different groups, or of different shards of the data) into one
+def merge_sketches(sketches, compression=sketch_compression):
+    return compress_sketch(pd.concat(sketches, ignore_index=True), compression)
+
+# Obtains a quantile (from 0 to 1) of the values summarized in a sketch
+def sketch_quantile(sketch, quantile):
+
+    # Empty sketch
+    if len(sketch) == 0:
+        return np.nan
+
+    # Interpolate between the centers of the centroids
+    means = sketch['mean'].to_numpy(dtype=float)
+    weights = sketch['weight'].to_numpy(dtype=float)
+    mid_weights = np.cumsum(weights) - weights / 2
+
+    return float(np.interp(quantile * weights.sum(), mid_weights, means))
+
+# Fixed-size pace histograms: counts in log-spaced bins, from 3 to 120 min/km (the values outside go to the first or the last bin).
+# They have always the same size, and they can be merged (and also subtracted) as sums
+
+# Edges of the bins, and names of the columns of each bin
+pace_histogram_edges = np.geomspace(3, 120, 25)
+pace_histogram_columns = [f'pace_hist_{i:02d}' for i in range(len(pace_histogram_edges) - 1)]
+
+# Given some paces, returns the bin of each one
+def pace_histogram_bins(paces):
+    bins = np.searchsorted(pace_histogram_edges, np.asarray(paces, dtype=float), side='right') - 1
+    return np.clip(bins, 0, len(pace_histogram_columns) - 1)
+
+# Given some paces, returns their histogram as uint32 counts
+def create_pace_histogram(paces):
+    paces = np.asarray(paces, dtype=float)
+    return np.bincount(pace_histogram_bins(paces[~np.isnan(paces)]), minlength=len(pace_histogram_columns)).astype(np.uint32)
+
+# Obtains some quantiles (from 0 to 1) of the histograms, each row is a histogram - interpolation inside the bin in logarithmic scale
+def histogram_quantiles(histograms, quantiles):
+
+    # Cumulative counts of each histogram
+    histograms = np.atleast_2d(np.asarray(histograms, dtype=float))
+    cumul_counts = np.cumsum(histograms, axis=1)
+    totals = cumul_counts[:, -1]
+    rows = np.arange(len(histograms))
+
+    all_quantiles = []
+    for quantile in quantiles:
+
+        # Bin where the quantile is, and the position inside the bin
+        target = quantile * totals
+        bins = np.minimum((cumul_counts < target[:, None]).sum(axis=1), len(pace_histogram_columns) - 1)
+        previous = np.where(bins > 0, cumul_counts[rows, bins - 1], 0)
+        inside = np.clip((target - previous) / np.maximum(histograms[rows, bins], 1), 0, 1)
+
+        # Interpolate between the edges of the bin
+        low, high = np.log(pace_histogram_edges[bins]), np.log(pace_histogram_edges[bins + 1])
+        all_quantiles.append(np.where(totals > 0, np.exp(low + inside * (high - low)), np.nan))
+
+    return np.column_stack(all_quantiles)
+
+# Histogram to a compact text (counts separated by spaces), to save it in a csv
+def encode_pace_histogram(histogram):
+    return ' '.join(str(int(count)) for count in histogram)
+
+# Compact text to histogram
+def decode_pace_histogram(text):
+    return np.array(text.split(' '), dtype=np.uint32)
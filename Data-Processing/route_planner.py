@@ -0,0 +1,173 @@
+import pandas as pd
+import numpy as np
+import os
+import time
+import shapely
+from functools import lru_cache
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import dijkstra
+from scipy.spatial import cKDTree
+from edges_cube import load_edges_cube, slice_edges_cube, season_months_dict
+from spatial_queries import project_coords, project_geometries
+
+# Routes planner over the edges network of a zone. The network is loaded once as a CSR adjacency (the paths can be walked in both directions),
+# and the weights of the edges are precomputed for each filter (all the tracks, each difficulty and each season) from the edges usage cube.
+# The most popular route prefers the edges used by more tracks, and the fastest route uses the average pace of each edge
+
+# Pace of the edges without tracks (min/km) if the filter has no paces, and minimum length of an edge (meters)
+default_pace = 20
+min_edge_length = 0.1
+
+# Given the edges and the usage of a filter, returns the weights of the routes: the popular cost (length divided by the tracks) and the
+# expected time (length by the pace, the edges without pace have the median pace of the filter)
+def obtain_filter_weights(edges_info, slice_df):
+
+    usage_df = pd.DataFrame({'edge_id': edges_info['edge_ids']}).merge(slice_df, on='edge_id', how='left')
+    total_tracks = usage_df['total_tracks'].fillna(0).to_numpy()
+    paces = usage_df['avg_pace'].to_numpy(dtype=float)
+    median_pace = np.nanmedian(paces) if np.isfinite(paces).any() else default_pace
+    paces = np.where(np.isfinite(paces), paces, median_pace)
+
+    return {'total_tracks': total_tracks, 'pace': paces,
+            'popular': edges_info['lengths'] / (1 + total_tracks),
+            'fastest': edges_info['lengths'] / 1000 * paces}
+
+# Creates the CSR adjacency of some weights - with parallel edges, only the cheapest one is kept, and the edge of each cell is saved
+def create_adjacency(edges_info, weights):
+
+    # Both directions of each edge
+    edges_df = pd.DataFrame({'source': np.concatenate([edges_info['u'], edges_info['v']]), 'target': np.concatenate([edges_info['v'], edges_info['u']]),
+                             'weight': np.concatenate([weights, weights]), 'edge': np.tile(np.arange(len(weights)), 2)})
+    edges_df = edges_df.sort_values(by=['source','target','weight']).drop_duplicates(subset=['source','target'])
+
+    # Rows of the matrix, already sorted
+    n_nodes = len(edges_info['nodes'])
+    indptr = np.concatenate([[0], np.cumsum(np.bincount(edges_df['source'], minlength=n_nodes))])
+    graph = csr_matrix((edges_df['weight'].to_numpy(), edges_df['target'].to_numpy(), indptr), shape=(n_nodes, n_nodes))
+
+    return {'graph': graph, 'edges': edges_df['edge'].to_numpy()}
+
+# Filters of the planner: all the tracks, each difficulty and each season
+def obtain_planner_filters(cube):
+
+    filters = {'all': {}}
+    for difficulty in cube['difficulty'][1]:
+        filters[f'difficulty_{str(difficulty).lower()}'] = {'difficulty': difficulty}
+    for season in season_months_dict.keys():
+        filters[f'season_{season.lower()}'] = {'season': season}
+
+    return filters
+
+# Loads the planner of a zone - the network, the nodes tree and the adjacency of each filter and mode. Cached with the modification times of the files
+@lru_cache(maxsize=4)
+def load_cached_planner(edges_path, cube_path, edges_mtime, cube_mtime):
+
+    # Edges of the network, with the length in meters
+    edges_df = pd.read_csv(edges_path, usecols=['id','u','v','geometry'])
+    geometries = shapely.from_wkt(edges_df['geometry'].to_numpy())
+    min_lon, min_lat, max_lon, max_lat = shapely.total_bounds(geometries)
+    center = ((min_lon + max_lon) / 2, (min_lat + max_lat) / 2)
+    lengths = np.maximum(shapely.length(project_geometries(geometries, center)), min_edge_length)
+
+    # Nodes as consecutive indices, and their coordinates (first and last coordinates of the edges) in meters
+    nodes, node_index = np.unique(np.concatenate([edges_df['u'].to_numpy(), edges_df['v'].to_numpy()]), return_inverse=True)
+    u, v = node_index[:len(edges_df)], node_index[len(edges_df):]
+    node_coords = np.zeros((len(nodes), 2))
+    node_coords[u] = shapely.get_coordinates(shapely.get_point(geometries, 0))
+    node_coords[v] = shapely.get_coordinates(shapely.get_point(geometries, -1))
+
+    edges_info = {'edge_ids': edges_df['id'].to_numpy(), 'u': u, 'v': v, 'lengths': lengths, 'nodes': nodes, 'geometries': geometries}
+
+    # Weights and adjacencies of each filter
+    cube = load_edges_cube(cube_path)
+    filters = {}
+    for filter_name, filter_values in obtain_planner_filters(cube).items():
+        weights = obtain_filter_weights(edges_info, slice_edges_cube(cube, **dict(filter_values)))
+        filters[filter_name] = {'weights': weights, 'popular': create_adjacency(edges_info, weights['popular']), 'fastest': create_adjacency(edges_info, weights['fastest'])}
+
+    return {'center': center, 'edges': edges_info, 'nodes_tree': cKDTree(project_coords(node_coords, center)), 'filters': filters}
+
+# Returns the planner of a zone - over the segments of the network, the unit of the cube (or the edges, if the network is not contracted)
+def load_route_planner(data_path, zone):
+
+    dataframes_path = os.path.join(data_path, zone, 'Output-Data', 'Data-Frames')
+    edges_path = os.path.join(dataframes_path, 'segments.csv')
+    if not os.path.exists(edges_path):
+        edges_path = os.path.join(dataframes_path, 'edges.csv')
+    cube_path = os.path.join(dataframes_path, 'Edges-Dataframes', 'edges_cube.csv')
+
+    return load_cached_planner(edges_path, cube_path, os.path.getmtime(edges_path), os.path.getmtime(cube_path))
+
+# Nearest node of a point (lat and lon), with the distance in meters
+def nearest_node(planner, lat, lon):
+
+    distance, node = planner['nodes_tree'].query(project_coords(np.array([[lon, lat]], dtype=float), planner['center'])[0])
+    return int(node), float(distance)
+
+# Plans a route between two points (lat and lon) - mode 'popular' or 'fastest', and one of the filters of the planner. Returns the edges of the
+# route (in order, with their length, tracks and pace) and a summary with the distance, the ETA and the tracks of the route
+def plan_route(planner, start, end, mode='popular', filter_name='all'):
+
+    if filter_name not in planner['filters']:
+        raise ValueError(f'Filter {filter_name} not available - use one of {list(planner["filters"].keys())}')
+
+    # Nodes of the points
+    source, source_distance = nearest_node(planner, *start)
+    target, target_distance = nearest_node(planner, *end)
+
+    # Shortest path with the weights of the filter and mode
+    adjacency = planner['filters'][filter_name][mode]
+    _, predecessors = dijkstra(adjacency['graph'], indices=source, return_predecessors=True)
+    if source != target and predecessors[target] < 0:
+        return pd.DataFrame(columns=['edge_id','length','total_tracks','avg_pace','time']), None
+
+    # Path nodes, from the target to the source
+    path = [target]
+    while path[-1] != source:
+        path.append(predecessors[path[-1]])
+    path = np.array(path[::-1])
+
+    # Edge of each step - the cell of the adjacency between the nodes
+    graph = adjacency['graph']
+    steps = [graph.indptr[a] + np.flatnonzero(graph.indices[graph.indptr[a]:graph.indptr[a + 1]] == b)[0] for a, b in zip(path[:-1], path[1:])]
+    edges = adjacency['edges'][np.array(steps, dtype=int)]
+
+    # Route dataframe, and the summary
+    weights = planner['filters'][filter_name]['weights']
+    route_df = pd.DataFrame({'edge_id': planner['edges']['edge_ids'][edges], 'length': np.round(planner['edges']['lengths'][edges], 1),
+                             'total_tracks': weights['total_tracks'][edges].astype(int), 'avg_pace': np.round(weights['pace'][edges], 2)})
+    route_df['time'] = np.round(route_df['length'] / 1000 * route_df['avg_pace'], 2)
+
+    summary = {'mode': mode, 'filter': filter_name, 'distance_km': round(float(route_df['length'].sum()) / 1000, 2), 'eta_min': round(float(route_df['time'].sum()), 1),
+               'min_tracks': int(route_df['total_tracks'].min()) if len(route_df) > 0 else 0,
+               'popular_km': round(float(route_df[route_df['total_tracks'] > 0]['length'].sum()) / 1000, 2),
+               'start_distance': round(source_distance, 1), 'end_distance': round(target_distance, 1)}
+
+    return route_df, summary
+
+# Geometry of a route (lon and lat), to draw it in the maps
+def route_geometry(planner, route_df):
+
+    edge_index = pd.Index(planner['edges']['edge_ids']).get_indexer(route_df['edge_id'])
+
+    return shapely.line_merge(shapely.union_all(planner['edges']['geometries'][edge_index]))
+
+# Times some random routes of a zone (milliseconds per query, for each mode)
+def benchmark_route_planner(data_path, zone, queries=100, seed=0):
+
+    planner = load_route_planner(data_path, zone)
+    rng = np.random.default_rng(seed)
+
+    # Random pairs of nodes, as points
+    coords = planner['nodes_tree'].data
+    pairs = rng.integers(0, len(coords), (queries, 2))
+    lon_lat = coords / [111320 * np.cos(np.radians(planner['center'][1])), 110540] + planner['center']
+
+    results = []
+    for mode in ['popular','fastest']:
+        for filter_name in planner['filters'].keys():
+            start = time.perf_counter()
+            found = sum(plan_route(planner, lon_lat[a][::-1], lon_lat[b][::-1], mode, filter_name)[1] is not None for a, b in pairs)
+            results.append({'mode': mode, 'filter': filter_name, 'query_ms': round((time.perf_counter() - start) / queries * 1000, 3), 'found': found})
+
+    return pd.DataFrame(results)
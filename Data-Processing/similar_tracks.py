@@ -0,0 +1,78 @@
+import pandas as pd
+import numpy as np
+import os
+from functools import lru_cache
+from minhash import hash_tokens, minhash_signature, lsh_band_keys, encode_signature, decode_signature
+
+# Similar routes: each track has a MinHash signature of its set of edges, saved for each zone. To query the tracks similar to one, only the tracks
+# sharing an LSH band with it are compared, and they are ranked by the estimated Jaccard similarity of the edges sets
+
+# Bands of the LSH - 32 bands of 2 rows, so tracks sharing around a fifth of their edges are already candidates
+similar_bands = 32
+
+# Signature of the set of edges of a track
+def edge_set_signature(edge_ids):
+    return minhash_signature(hash_tokens(np.unique(np.asarray(edge_ids, dtype=np.int64))[:, None]))
+
+# Updates the signatures of the index with the tracks of the zone - only the new tracks are read, and the removed ones are deleted
+def update_similarity_index(partial_edges_path, list_tracks, index_path):
+
+    # Saved signatures of the current tracks
+    if os.path.exists(index_path):
+        saved_df = pd.read_csv(index_path)
+        index_df = saved_df[saved_df['track_id'].isin(list_tracks)]
+    else:
+        saved_df = None
+        index_df = pd.DataFrame(columns=['track_id','signature'])
+
+    # Nothing to update
+    new_tracks = [track_id for track_id in list_tracks if track_id not in set(index_df['track_id'])]
+    if saved_df is not None and not new_tracks and len(index_df) == len(saved_df):
+        return index_df
+
+    # Signatures of the new tracks
+    new_signatures_df = pd.DataFrame({'track_id': new_tracks, 'signature': [encode_signature(edge_set_signature(pd.read_csv(os.path.join(partial_edges_path, f'{track_id}.csv'), usecols=['edge_id'])['edge_id']))
+                                                                            for track_id in new_tracks]})
+    index_df = pd.concat([df for df in [index_df, new_signatures_df] if len(df) > 0] + [index_df.head(0)], ignore_index=True)
+    index_df.to_csv(index_path, index=False)
+
+    return index_df
+
+# Loads the index to query it - the signatures as a matrix, and the rows of each band bucket. Cached with the modification time of the file
+@lru_cache(maxsize=8)
+def load_cached_index(index_path, index_mtime):
+
+    index_df = pd.read_csv(index_path)
+    signatures = np.vstack([decode_signature(text) for text in index_df['signature']]) if len(index_df) > 0 else np.zeros((0, 1), dtype=np.uint64)
+
+    # Keys of the bands of all the signatures at once, and the rows of each key
+    rows = signatures.shape[1] // similar_bands
+    band_hashes = hash_tokens(signatures[:, :similar_bands * rows].astype(np.int64).reshape(-1, rows)).reshape(len(signatures), -1) if len(index_df) > 0 else np.zeros((0, similar_bands))
+    keys_df = pd.DataFrame({'band': np.tile(np.arange(similar_bands), len(signatures)), 'key': band_hashes.ravel().astype(np.uint64), 'row': np.repeat(np.arange(len(signatures)), similar_bands)})
+    buckets = {(band, int(key)): rows_df.to_numpy() for (band, key), rows_df in keys_df.groupby(['band','key'])['row']}
+
+    return {'track_ids': index_df['track_id'].to_numpy(), 'signatures': signatures, 'buckets': buckets}
+
+# Returns the index of a zone
+def load_similarity_index(index_path):
+    return load_cached_index(index_path, os.path.getmtime(index_path))
+
+# Returns the k tracks with the most similar route to a track, with the estimated Jaccard similarity of their edges
+def query_similar_tracks(similarity_index, track_id, k=5):
+
+    # Position of the track in the index
+    positions = np.flatnonzero(similarity_index['track_ids'] == int(track_id))
+    if len(positions) == 0:
+        return pd.DataFrame(columns=['track_id','similarity'])
+    signature = similarity_index['signatures'][positions[0]]
+
+    # Candidates in the buckets of the track (without the track itself)
+    buckets = [similarity_index['buckets'].get(key) for key in lsh_band_keys(signature, similar_bands)]
+    candidates = np.unique(np.concatenate([bucket for bucket in buckets if bucket is not None]))
+    candidates = candidates[candidates != positions[0]]
+
+    # Rank the candidates by the similarity
+    similarities = (similarity_index['signatures'][candidates] == signature).mean(axis=1)
+    top = np.argsort(-similarities, kind='stable')[:k]
+
+    return pd.DataFrame({'track_id': similarity_index['track_ids'][candidates[top]], 'similarity': np.round(similarities[top], 2)})
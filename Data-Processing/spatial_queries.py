@@ -0,0 +1,134 @@
+import pandas as pd
+import numpy as np
+import os
+import time
+import shapely
+from shapely import wkt
+from functools import lru_cache
+
+# Spatial queries over the tracks and the edges of a zone. The geometries are parsed once, projected to local meters, and kept in STRtrees,
+# cached for each zone (the cache is renewed when the dataframes change). The tracks are saved as (lat lon) and the edges as (lon lat), so the
+# tracks are swapped when they are loaded. All the queries receive and return coordinates in lon and lat, and distances in meters
+
+# Projects lon and lat coordinates into local meters around a center (equirectangular, enough for the size of a zone)
+def project_coords(coords, center):
+    return np.column_stack([(coords[:, 0] - center[0]) * 111320 * np.cos(np.radians(center[1])), (coords[:, 1] - center[1]) * 110540])
+
+# Projects some geometries (in lon and lat) into local meters
+def project_geometries(geometries, center):
+    return shapely.transform(geometries, lambda coords: project_coords(coords, center))
+
+# Loads the geometries and the trees of a zone - cached with the modification times of the files, so a new version of the files is loaded again
+@lru_cache(maxsize=8)
+def load_cached_geometries(tracks_info_path, edges_path, tracks_mtime, edges_mtime):
+
+    # Edges geometries (lon lat)
+    edges_df = pd.read_csv(edges_path, usecols=['id','geometry'])
+    edges = shapely.from_wkt(edges_df['geometry'].to_numpy())
+
+    # Tracks geometries, swapped from (lat lon) to (lon lat)
+    tracks_df = pd.read_csv(tracks_info_path, usecols=['track_id','geometry']).dropna()
+    tracks = shapely.transform(shapely.from_wkt(tracks_df['geometry'].to_numpy()), lambda coords: coords[:, ::-1])
+
+    # Center of the zone, and the geometries in meters
+    min_lon, min_lat, max_lon, max_lat = shapely.total_bounds(edges)
+    center = ((min_lon + max_lon) / 2, (min_lat + max_lat) / 2)
+    edges = project_geometries(edges, center)
+    tracks = project_geometries(tracks, center)
+
+    return {'center': center,
+            'edge_ids': edges_df['id'].to_numpy(), 'edges': edges, 'edges_tree': shapely.STRtree(edges),
+            'track_ids': tracks_df['track_id'].to_numpy(), 'tracks': tracks, 'tracks_tree': shapely.STRtree(tracks)}
+
+# Returns the geometries and the trees of a zone
+def load_zone_geometries(data_path, zone):
+
+    dataframes_path = os.path.join(data_path, zone, 'Output-Data', 'Data-Frames')
+    tracks_info_path = os.path.join(dataframes_path, 'tracks_info.csv')
+    edges_path = os.path.join(dataframes_path, 'edges.csv')
+
+    return load_cached_geometries(tracks_info_path, edges_path, os.path.getmtime(tracks_info_path), os.path.getmtime(edges_path))
+
+# Returns the tracks (target='tracks') or the edges (target='edges') that intersect a geometry
+def query_intersects(zone_geometries, geometry, target='tracks'):
+
+    geometry = project_geometries(geometry, zone_geometries['center'])
+    indices = zone_geometries[f'{target}_tree'].query(geometry, predicate='intersects')
+
+    return np.sort(zone_geometries[f'{target[:-1]}_ids'][indices])
+
+# Returns the tracks or the edges at less than some meters of a geometry
+def query_within_distance(zone_geometries, geometry, distance, target='tracks'):
+
+    geometry = project_geometries(geometry, zone_geometries['center'])
+    indices = zone_geometries[f'{target}_tree'].query(geometry, predicate='dwithin', distance=distance)
+
+    return np.sort(zone_geometries[f'{target[:-1]}_ids'][indices])
+
+# Returns the nearest edge of each point, with the distance in meters
+def query_nearest_edge(zone_geometries, lats, lons):
+
+    points = project_geometries(shapely.points(np.asarray(lons, dtype=float), np.asarray(lats, dtype=float)), zone_geometries['center'])
+    (point_indices, edge_indices), distances = zone_geometries['edges_tree'].query_nearest(points, return_distance=True, all_matches=False)
+
+    nearest_df = pd.DataFrame({'point': point_indices, 'edge_id': zone_geometries['edge_ids'][edge_indices], 'distance': np.round(distances, 2)})
+
+    return nearest_df.drop_duplicates(subset='point').sort_values(by='point').reset_index(drop=True)[['edge_id','distance']]
+
+# Times a function (milliseconds per call)
+def time_query(function, repeats):
+
+    start = time.perf_counter()
+    for _ in range(repeats):
+        result = function()
+
+    return (time.perf_counter() - start) / repeats * 1000, result
+
+# Compares the latency of the queries with the trees against a brute-force scan of all the geometries (and against parsing every row, as the
+# maps and the dataframes do now). Returns a dataframe with the times in milliseconds, and if both results are the same
+def benchmark_spatial_queries(data_path, zone, repeats=100, seed=0):
+
+    zone_geometries = load_zone_geometries(data_path, zone)
+    center = zone_geometries['center']
+    rng = np.random.default_rng(seed)
+
+    # Random queries around the edges: a box of 500 meters, a point for the distance query, and 1000 points for the nearest edges
+    lon, lat = center[0] + rng.uniform(-0.01, 0.01), center[1] + rng.uniform(-0.01, 0.01)
+    box = shapely.box(lon - 0.003, lat - 0.002, lon + 0.003, lat + 0.002)
+    point = shapely.Point(lon, lat)
+    lats, lons = center[1] + rng.uniform(-0.02, 0.02, 1000), center[0] + rng.uniform(-0.02, 0.02, 1000)
+
+    # Brute-force versions over all the geometries
+    def brute_intersects(target):
+        geometry = project_geometries(box, center)
+        return np.sort(zone_geometries[f'{target[:-1]}_ids'][shapely.intersects(zone_geometries[target], geometry)])
+
+    def brute_within(target):
+        geometry = project_geometries(point, center)
+        return np.sort(zone_geometries[f'{target[:-1]}_ids'][shapely.distance(zone_geometries[target], geometry) <= 200])
+
+    def brute_nearest():
+        points = project_geometries(shapely.points(lons, lats), center)
+        return np.round(shapely.distance(zone_geometries['edges'][None, :], points[:, None]).min(axis=1), 2)   # Distances, the nearest edge can be a tie
+
+    # Parsing every row of the tracks information with wkt.loads
+    def parse_intersects():
+        tracks_df = pd.read_csv(os.path.join(data_path, zone, 'Output-Data', 'Data-Frames', 'tracks_info.csv'), usecols=['track_id','geometry'])
+        swapped_box = shapely.box(lat - 0.002, lon - 0.003, lat + 0.002, lon + 0.003)
+        return np.sort(tracks_df[tracks_df['geometry'].apply(lambda geometry: wkt.loads(geometry).intersects(swapped_box))]['track_id'].to_numpy())
+
+    queries = [('tracks intersecting a box', lambda: query_intersects(zone_geometries, box), lambda: brute_intersects('tracks'), repeats),
+               ('edges intersecting a box', lambda: query_intersects(zone_geometries, box, target='edges'), lambda: brute_intersects('edges'), repeats),
+               ('tracks within 200 m', lambda: query_within_distance(zone_geometries, point, 200), lambda: brute_within('tracks'), repeats),
+               ('edges within 200 m', lambda: query_within_distance(zone_geometries, point, 200, target='edges'), lambda: brute_within('edges'), repeats),
+               ('nearest edge of 1000 points', lambda: query_nearest_edge(zone_geometries, lats, lons)['distance'].to_numpy(), brute_nearest, max(1, repeats // 10)),
+               ('tracks intersecting a box (parsing wkt)', lambda: query_intersects(zone_geometries, box), parse_intersects, max(1, repeats // 10))]
+
+    results = []
+    for name, tree_function, brute_function, query_repeats in queries:
+        tree_time, tree_result = time_query(tree_function, query_repeats)
+        brute_time, brute_result = time_query(brute_function, query_repeats)
+        results.append({'query': name, 'strtree_ms': round(tree_time, 3), 'brute_force_ms': round(brute_time, 3),
+                        'speedup': round(brute_time / tree_time, 1), 'same_result': np.array_equal(tree_result, brute_result)})
+
+    return pd.DataFrame(results)
@@ -0,0 +1,128 @@
+import pandas as pd
+import numpy as np
+import os
+from segments import obtain_segment_of
+
+# Stay points: the places where the people stop during a track. All the points of all the tracks are processed at once - a stop is a run of
+# consecutive slow points of a track that lasts enough time and stays inside a small radius. Everything is done with grouped operations,
+# so the time grows linearly with the total number of points
+
+# Maximum speed of a stopped point (m/s), minimum dwell time of a stop (seconds) and maximum radius of a stop (meters)
+stop_max_speed = 0.3
+stop_min_time = 300
+stop_max_radius = 75
+
+# Size of the cells of the hotspots grid (in degrees, around 100 meters)
+hotspots_grid_size = 0.001
+
+# Reads the points of some tracks from the all tracks directory, in one dataframe
+def read_tracks_points(all_tracks_path, list_tracks):
+
+    columns = ['lat','lon','time_diff','dist_diff','speed','elap_time','edge_id']
+    points = []
+    for track_id in list_tracks:
+        track_path = os.path.join(all_tracks_path, f'{track_id}.csv')
+        if os.path.exists(track_path):
+            points.append(pd.read_csv(track_path, usecols=columns).assign(track_id=track_id))
+
+    if not points:
+        return pd.DataFrame(columns=['track_id'] + columns)
+
+    return pd.concat(points, ignore_index=True)
+
+# Given the points of all the tracks (sorted by track and point), returns the stops with their location, edge and dwell time
+def detect_stay_points(points_df, max_speed=stop_max_speed, min_time=stop_min_time, max_radius=stop_max_radius):
+
+    # Slow points - the time and the distance of a point are from the previous point, so a pause of the device is also a slow point
+    slow = (points_df['speed'] < max_speed).to_numpy()
+    track_ids = points_df['track_id'].to_numpy()
+
+    # Runs of consecutive slow points of the same track
+    new_run = np.ones(len(points_df), dtype=bool)
+    new_run[1:] = (slow[1:] != slow[:-1]) | (track_ids[1:] != track_ids[:-1])
+    runs_df = points_df[slow].assign(run=np.cumsum(new_run)[slow])
+
+    # Aggregate each run - location, extent and dwell time
+    stops_df = runs_df.groupby('run').agg(track_id=('track_id', 'first'), lat=('lat', 'mean'), lon=('lon', 'mean'),
+                                          min_lat=('lat', 'min'), max_lat=('lat', 'max'), min_lon=('lon', 'min'), max_lon=('lon', 'max'),
+                                          start_time=('elap_time', 'min'), dwell_time=('time_diff', 'sum'), total_points=('lat', 'size'))
+
+    # Radius of the run, as half of the diagonal of its bounding box (in meters)
+    height = (stops_df['max_lat'] - stops_df['min_lat']) * 110540
+    width = (stops_df['max_lon'] - stops_df['min_lon']) * 111320 * np.cos(np.radians(stops_df['lat']))
+    stops_df['radius'] = np.sqrt(height ** 2 + width ** 2) / 2
+
+    # Edge where the run spends more time
+    edge_times = runs_df.groupby(['run','edge_id'], as_index=False)['time_diff'].sum().sort_values(by=['run','time_diff'])
+    stops_df['edge_id'] = edge_times.drop_duplicates(subset='run', keep='last').set_index('run')['edge_id']
+
+    # Only the runs long enough and small enough are stops
+    stops_df = stops_df[(stops_df['dwell_time'] >= min_time) & (stops_df['radius'] <= max_radius)].reset_index(drop=True)
+
+    # Start time of the stop (minutes from the start of the track), and dwell time in minutes
+    stops_df['dwell_time'] = round(stops_df['dwell_time'] / 60, 2)
+    stops_df['start_time'] = round(stops_df['start_time'], 2)
+    stops_df[['lat','lon']] = stops_df[['lat','lon']].round(6)
+    stops_df['radius'] = stops_df['radius'].round(1)
+
+    return stops_df[['track_id','lat','lon','edge_id','start_time','dwell_time','radius','total_points']]
+
+# Aggregates the stops into hotspots with dwell time statistics - by cells of a grid ('grid'), or by edges ('edge')
+def obtain_stop_hotspots(stops_df, key='grid', grid_size=hotspots_grid_size):
+
+    stops_df = stops_df.copy()
+    if key == 'grid':
+        stops_df['cell_lat'] = np.floor(stops_df['lat'] / grid_size).astype(int)
+        stops_df['cell_lon'] = np.floor(stops_df['lon'] / grid_size).astype(int)
+        keys = ['cell_lat','cell_lon']
+    else:
+        keys = ['edge_id']
+
+    # Statistics of each hotspot
+    hotspots_df = stops_df.groupby(keys, as_index=False).agg(lat=('lat', 'mean'), lon=('lon', 'mean'),
+                                                             total_stops=('track_id', 'size'), total_tracks=('track_id', 'nunique'),
+                                                             total_dwell_time=('dwell_time', 'sum'), mean_dwell_time=('dwell_time', 'mean'),
+                                                             median_dwell_time=('dwell_time', 'median'),
+                                                             p90_dwell_time=('dwell_time', lambda times: times.quantile(0.9)))
+
+    # Round the values, and sort by the number of stops
+    hotspots_df[['lat','lon']] = hotspots_df[['lat','lon']].round(6)
+    hotspots_df = hotspots_df.round({'total_dwell_time': 2, 'mean_dwell_time': 2, 'median_dwell_time': 2, 'p90_dwell_time': 2})
+
+    return hotspots_df.sort_values(by=['total_stops','total_dwell_time'], ascending=False).reset_index(drop=True)
+
+# Main function - detects the stops of all the tracks of a zone, and saves them with the grid and the edges hotspots. If some track ids are
+# given (the new tracks of a batch), only their stops are detected and added to the stored ones - unless the segments have changed after them
+def main_stay_points(data_path, zone, track_ids=None):
+
+    # Paths of the zone
+    output_path = os.path.join(data_path, zone, 'Output-Data')
+    dataframes_path = os.path.join(output_path, 'Data-Frames')
+    all_tracks_path = os.path.join(output_path, 'Tracks-Output', 'All-Tracks')
+    stops_path = os.path.join(dataframes_path, 'stops.csv')
+    edge_segments_path = os.path.join(dataframes_path, 'edge_segments.csv')
+
+    # Points of the new tracks, or of all the tracks of the tracks information
+    incremental = track_ids is not None and os.path.exists(stops_path) and not (os.path.exists(edge_segments_path) and os.path.getmtime(edge_segments_path) > os.path.getmtime(stops_path))
+    if incremental:
+        list_tracks = list(track_ids)
+    else:
+        list_tracks = pd.read_csv(os.path.join(dataframes_path, 'tracks_info.csv'), usecols=['track_id'])['track_id'].tolist()
+    points_df = read_tracks_points(all_tracks_path, list_tracks)
+
+    # Detect the stops and aggregate them
+    stops_df = detect_stay_points(points_df)
+
+    # Edges of the stops as segments (the unit of the edges maps)
+    if os.path.exists(edge_segments_path):
+        stops_df['edge_id'] = stops_df['edge_id'].map(obtain_segment_of(pd.read_csv(edge_segments_path)))
+
+    # Stored stops of the other tracks
+    if incremental:
+        stored_stops_df = pd.read_csv(stops_path)
+        stops_df = pd.concat([df for df in [stored_stops_df[~stored_stops_df['track_id'].isin(list_tracks)], stops_df] if len(df) > 0], ignore_index=True)
+        stops_df = stops_df.reindex(columns=stored_stops_df.columns)
+
+    stops_df.to_csv(stops_path, index=False)
+    obtain_stop_hotspots(stops_df, key='grid').to_csv(os.path.join(dataframes_path, 'stop_hotspots.csv'), index=False)
+    obtain_stop_hotspots(stops_df, key='edge').to_csv(os.path.join(dataframes_path, 'stop_edges.csv'), index=False)
@@ -0,0 +1,144 @@
+import os
+import sys
+import time
+import pandas as pd
+from preprocessing import main_preprocessing, extract_new_zip_files
+from fmm_algorithm import main_fmm, load_fmm_model
+from postprocessing import main_postprocessing
+from duplicates import main_duplicates
+from edges_postprocessing import main_edges_postprocessing
+from waypoints_postprocessing import obtain_waypoints_df
+from stay_points import main_stay_points
+from grid_index import update_grid_index
+from density_grids import update_density_grids
+from zones import route_combined_dump, combined_dump_name
+
+# Go to the 'Visualizations' folder to refresh the maps and the data of the app
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'Visualizations')))
+from all_vis_creation import main_save_visualizations
+
+# Returns the tracks of the input directory that are not matched nor discarded yet
+def obtain_pending_tracks(input_path, dataframes_path):
+
+    # Tracks in the input directory
+    if not os.path.exists(input_path):
+        return []
+    input_tracks = [int(file.split('.')[0]) for file in os.listdir(input_path) if file.endswith('.json')]
+
+    # Tracks already done by the FMM algorithm (matched or discarded)
+    done_tracks = set()
+    for name in ['fmm_config.csv', 'discarded.csv']:
+        path = os.path.join(dataframes_path, name)
+        if os.path.exists(path):
+            done_tracks.update(pd.read_csv(path)['track_id'].astype(int).tolist())
+
+    return [track_id for track_id in input_tracks if track_id not in done_tracks]
+
+# Pushes a micro-batch of new tracks through all the stages, up to the visualizations of the app, returns the tracks that reached the tracks
+# information. The FMM model of the zone is loaded once, and given to each batch
+def process_micro_batch(data_path, zone, batch, visualizations_path, fmm_model=None):
+
+    # Match only the tracks of the batch, the postprocessing already skips the processed tracks, and only the valid new tracks (the tracks of
+    # the batch that reach the tracks information) get the weather and the hubs
+    main_fmm(data_path, zone, track_ids=batch, fmm_model=fmm_model)
+    new_tracks = sorted(main_postprocessing(data_path, zone, incremental=True))
+
+    # Update the duplicates, the edges aggregates, the waypoints, the stay points, the grid index and the density grids with the new tracks
+    if new_tracks:
+        main_duplicates(data_path, zone)
+        main_edges_postprocessing(data_path, zone)
+        obtain_waypoints_df(data_path, zone, track_ids=new_tracks)
+        main_stay_points(data_path, zone, track_ids=new_tracks)
+        update_grid_index(data_path, zone)
+        update_density_grids(data_path, zone)
+
+        # Refresh the maps and the visualizations of the zone - only the ones outdated by the new dataframes are created again
+        main_save_visualizations(zone, data_path, visualizations_path)
+
+    return new_tracks
+
+# Long-running watch mode - detects new files of each zone and processes them in micro-batches
+def watch_zones(data_path, zones, visualizations_path, poll_interval=10, batch_size=50, latency_target=300, max_iterations=None):
+
+    # Route the tracks of the combined dump (if there is one) before preparing the zones
+    dump_path = os.path.join(data_path, 'Zip-Files', combined_dump_name)
+    dump_mtime = os.path.getmtime(dump_path) if os.path.exists(dump_path) else None
+    if dump_mtime is not None:
+        route_combined_dump(dump_path, data_path)
+
+    # Prepare the directories and the OSM network of each zone (only done if it does not exist)
+    for zone in zones:
+        main_preprocessing(data_path, zone)
+
+    # Time when each pending track has been detected, and the last batch duration of each zone
+    arrival_times = {zone: {} for zone in zones}
+    last_batch_time = {zone: 0.0 for zone in zones}
+    zip_mtimes = {zone: None for zone in zones}
+    fmm_models = {}
+
+    iteration = 0
+    while max_iterations is None or iteration < max_iterations:
+        iteration += 1
+
+        # Route the new tracks of the combined dump, only if it has been modified since the last check
+        if os.path.exists(dump_path) and os.path.getmtime(dump_path) != dump_mtime:
+            dump_mtime = os.path.getmtime(dump_path)
+            route_combined_dump(dump_path, data_path)
+
+        for zone in zones:
+
+            # Paths of the zone
+            input_path = os.path.join(data_path, zone, 'Input-Data')
+            dataframes_path = os.path.join(data_path, zone, 'Output-Data', 'Data-Frames')
+            zip_file_path = os.path.join(data_path, 'Zip-Files', f'{zone}.zip')
+
+            # Extract the new files of the zip, only if it has been modified since the last check
+            if os.path.exists(zip_file_path) and os.path.getmtime(zip_file_path) != zip_mtimes[zone]:
+                zip_mtimes[zone] = os.path.getmtime(zip_file_path)
+                extract_new_zip_files(zip_file_path, input_path)
+
+            # Register the arrival time of the new pending tracks
+            now = time.time()
+            pending_tracks = obtain_pending_tracks(input_path, dataframes_path)
+            arrival_times[zone] = {track_id: arrival_times[zone].get(track_id, now) for track_id in pending_tracks}
+
+            if not pending_tracks:
+                continue
+
+            # Flush the batch if it is full, or if waiting more would exceed the latency target (counting the expected processing time)
+            oldest_wait = now - min(arrival_times[zone].values())
+            if len(pending_tracks) < batch_size and oldest_wait + last_batch_time[zone] + poll_interval < latency_target:
+                continue
+
+            # Oldest tracks first
+            batch = sorted(pending_tracks, key=lambda track_id: arrival_times[zone][track_id])[:batch_size]
+
+            # FMM model of the zone, loaded with its first batch
+            if zone not in fmm_models:
+                fmm_models[zone] = load_fmm_model(os.path.join(data_path, zone, 'OSM-Data'))
+
+            start = time.time()
+            new_tracks = process_micro_batch(data_path, zone, batch, visualizations_path, fmm_models[zone])
+            last_batch_time[zone] = time.time() - start
+
+            # Latency from the arrival of the oldest track to its visibility in the app (the visualizations are refreshed)
+            latency = time.time() - min(arrival_times[zone][track_id] for track_id in batch)
+            print(f'{zone}: batch of {len(batch)} tracks ({len(new_tracks)} valid) processed in {last_batch_time[zone]:.1f} s, maximum latency {latency:.1f} s')
+
+            for track_id in batch:
+                arrival_times[zone].pop(track_id, None)
+
+        time.sleep(poll_interval)
+
+# Main function - watches all zones
+def main():
+
+    # Define the data path, and the visualizations path of the app
+    data_path = '../../Data/Processing-Data'
+    visualizations_path = '../../Data/Streamlit-Data/Visualizations'
+
+    watch_zones(data_path, ['canigo', 'matagalls', 'vallferrera'], visualizations_path)
+
+
+if __name__ == '__main__':
+    main()
@@ -22,12 +22,12 @@ def process_partial_waypoints_df(data, track_id):
     
     return df_waypoints
 
-# Main function to obtain the waypoints dataframe
-def obtain_waypoints_df(data_path, zone):
+# Main function to obtain the waypoints dataframe - if a list of track ids is given, only their waypoints are appended
+def obtain_waypoints_df(data_path, zone, track_ids=None):
 
     final_path = os.path.join(data_path,zone,'Output-Data','Data-Frames','waypoints.csv')
 
-    if os.path.exists(final_path):
+    if os.path.exists(final_path) and track_ids is None:
         return
 
     # Obtain the dataframe with the tracks information
@@ -36,6 +36,13 @@ def obtain_waypoints_df(data_path, zone):
     # Obtain a list with the processed tracks
     processed_tracks = tracks_info['track_id'].unique().tolist()
 
+    # Waypoints already saved, only the tracks of the batch that are not there are processed
+    if os.path.exists(final_path):
+        old_waypoints_df = pd.read_csv(final_path)
+        processed_tracks = [track for track in processed_tracks if track in track_ids and track not in old_waypoints_df['track_id'].unique()]
+    else:
+        old_waypoints_df = None
+
     # Path with the initial JSON files
     input_json_files = os.path.join(data_path,zone,'Input-Data')
 
@@ -57,6 +64,10 @@ def obtain_waypoints_df(data_path, zone):
             df = process_partial_waypoints_df(data, track)
             all_waypoints.append(df)  
 
+    # No new waypoints to add
+    if not all_waypoints:
+        return
+
     # Get the full dataframe
     waypoints_df = pd.concat(all_waypoints, ignore_index=True)
 
@@ -119,5 +130,9 @@ def obtain_waypoints_df(data_path, zone):
         # Add the popup to the dataframe
         waypoints_df['map_popup'].iloc[index] = popup_html
 
+    # Append the new waypoints to the already saved ones
+    if old_waypoints_df is not None:
+        waypoints_df = pd.concat([old_waypoints_df, waypoints_df], ignore_index=True)
+
     # Save the waypoints dataframe
     waypoints_df.to_csv(final_path, index=False)
\ No newline at end of file
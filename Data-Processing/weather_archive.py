@@ -0,0 +1,201 @@
+import pandas as pd
+import numpy as np
+import os
+import json
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+# Local archive of daily weather: one csv for each location, with the days already fetched. Only the missing days are requested.
+# The source of the data (fetcher) can be changed: the Open-Meteo archive, another url with the same API (a local stand-in server), or a fixture file.
+# A fetcher receives a list of locations (lat, lon) and a range of dates, and returns a dataframe for each location
+
+# Url of the archive API, it can be changed with an environment variable (for example, to use a local stand-in server)
+archive_url = os.environ.get('WEATHER_ARCHIVE_URL', 'https://archive-api.open-meteo.com/v1/archive')
+
+# Size of the grid (in degrees) where the locations of the tracks are snapped - around 10 km, the resolution of the archive
+weather_grid_size = 0.1
+
+# Convert weather code to a readable condition
+weather_mapping = {0: "Clear", 1: "Clear",          # The library has more weather conditions, but we define less groups
+                   2: "Cloudy", 3: "Cloudy",
+                   45: "Fog", 48: "Fog",
+                   51: "Drizzle", 53: "Drizzle", 55: "Drizzle",
+                   61: "Rain", 63: "Rain", 65: "Rain", 80: "Rain", 81: "Rain", 82: "Rain",
+                   71: "Snow", 73: "Snow", 75: "Snow",
+                   95: "Thunderstorm", 96: "Thunderstorm", 99: "Thunderstorm"}
+
+# Returns a fetcher that requests the archive API (Open-Meteo, or a server with the same API) - all the locations in one request
+def open_meteo_fetcher(url=None):
+
+    def fetcher(locations, start_date, end_date):
+
+        # Request the daily data of the locations
+        params = {'latitude': ','.join(str(lat) for lat, _ in locations), 'longitude': ','.join(str(lon) for _, lon in locations),
+                  'start_date': start_date, 'end_date': end_date,
+                  'daily': 'temperature_2m_min,temperature_2m_max,weathercode', 'timezone': 'auto'}
+        data = requests.get(url or archive_url, params=params, timeout=60).json()
+        data = data if isinstance(data, list) else [data]      # With only one location the API does not return a list
+
+        return [pd.DataFrame({"date": location_data["daily"]["time"],   # Result to dataframe
+                              "min_temp": location_data["daily"]["temperature_2m_min"],
+                              "max_temp": location_data["daily"]["temperature_2m_max"],
+                              "weather_code": location_data["daily"]["weathercode"]}) for location_data in data]
+
+    return fetcher
+
+# Returns a fetcher that reads a fixture csv (columns date, min_temp, max_temp and weather_code) - the same data for all the locations
+def fixture_fetcher(fixture_path):
+
+    fixture_df = pd.read_csv(fixture_path)
+
+    def fetcher(locations, start_date, end_date):
+        df = fixture_df[(fixture_df['date'] >= start_date) & (fixture_df['date'] <= end_date)][['date','min_temp','max_temp','weather_code']]
+        return [df.copy() for _ in locations]
+
+    return fetcher
+
+# Given the stored dates, returns the ranges (start and end dates) of the missing days between two dates
+def obtain_missing_ranges(stored_dates, start_date, end_date):
+
+    # Days of the range that are not stored
+    all_dates = pd.date_range(start=start_date, end=end_date)
+    missing = ~all_dates.isin(pd.to_datetime(pd.Series(stored_dates, dtype=str)))
+
+    # Group the consecutive missing days
+    groups = (pd.Series(missing) != pd.Series(missing).shift()).cumsum()[missing]
+    missing_dates = pd.Series(all_dates[missing])
+
+    return [(dates.min().strftime('%Y-%m-%d'), dates.max().strftime('%Y-%m-%d')) for _, dates in missing_dates.groupby(groups.to_numpy())]
+
+# Path of the csv of a location
+def location_archive_path(archive_path, lat, lon):
+    return os.path.join(archive_path, f'{lat:.4f}_{lon:.4f}.csv')
+
+# Reads the stored days of a location
+def read_location_archive(archive_path, lat, lon):
+
+    location_path = location_archive_path(archive_path, lat, lon)
+    if os.path.exists(location_path):
+        return pd.read_csv(location_path)
+
+    return pd.DataFrame(columns=['date','min_temp','max_temp','weather_code'])
+
+# Adds the fetched days to the stored ones and saves them - the days without data (too recent for the archive) are not stored
+def update_location_archive(archive_path, lat, lon, stored_df, fetched):
+
+    fetched = [df.dropna() for df in fetched if len(df.dropna()) > 0]
+    if not fetched:
+        return stored_df
+
+    os.makedirs(archive_path, exist_ok=True)
+    stored_df = pd.concat([df for df in [stored_df] + fetched if len(df) > 0], ignore_index=True)
+    stored_df = stored_df.drop_duplicates(subset='date').sort_values(by='date')
+    stored_df.to_csv(location_archive_path(archive_path, lat, lon), index=False)
+
+    return stored_df
+
+# Returns the daily weather of a location from one date to another, only the days not in the archive are fetched
+def obtain_weather(archive_path, lat, lon, start_date, end_date, fetcher=None):
+
+    # Transform the start and the end dates
+    start_date = pd.to_datetime(start_date).strftime('%Y-%m-%d')
+    end_date = pd.to_datetime(end_date).strftime('%Y-%m-%d')
+
+    # Fetch the missing ranges of the location
+    stored_df = read_location_archive(archive_path, lat, lon)
+    missing_ranges = obtain_missing_ranges(stored_df['date'], start_date, end_date)
+    if missing_ranges:
+        fetcher = fetcher or open_meteo_fetcher()
+        fetched = [fetcher([(lat, lon)], range_start, range_end)[0] for range_start, range_end in missing_ranges]
+        stored_df = update_location_archive(archive_path, lat, lon, stored_df, fetched)
+
+    # Days of the range
+    df = stored_df[(stored_df['date'] >= start_date) & (stored_df['date'] <= end_date)].reset_index(drop=True)
+    df['weather_condition'] = df['weather_code'].astype(int).map(weather_mapping)
+
+    return df[['date', 'min_temp', 'max_temp', 'weather_condition']]
+
+# Snaps some coordinates to the weather grid
+def snap_to_grid(values, grid_size=weather_grid_size):
+    return np.round(np.round(np.asarray(values, dtype=float) / grid_size) * grid_size, 4)
+
+# Returns the weather of each track from its location (lat and lon) and its date. The locations are snapped to the grid, so the tracks of the
+# same cell share the lookups, and the missing days are fetched in requests of many locations, done concurrently
+def obtain_tracks_weather(archive_path, tracks_df, fetcher=None, batch_size=50, max_workers=4):
+
+    # Snap the locations of the tracks to the grid
+    tracks_df = tracks_df[['track_id','lat','lon','date']].dropna().copy()
+    tracks_df['date'] = pd.to_datetime(tracks_df['date']).dt.strftime('%Y-%m-%d')
+    tracks_df['cell_lat'] = snap_to_grid(tracks_df['lat'])
+    tracks_df['cell_lon'] = snap_to_grid(tracks_df['lon'])
+
+    # Stored days of each cell, and the days that are missing
+    stored = {}
+    pending = []
+    for (lat, lon), dates in tracks_df.groupby(['cell_lat','cell_lon'])['date']:
+        stored[(lat, lon)] = read_location_archive(archive_path, lat, lon)
+        missing_dates = sorted(set(dates) - set(stored[(lat, lon)]['date'].astype(str)))
+        if missing_dates:
+            pending.append((lat, lon, missing_dates[0], missing_dates[-1]))
+
+    # Batches of locations with similar missing days - each batch is one request from its first to its last missing day
+    pending = sorted(pending, key=lambda cell: (cell[2], cell[3]))
+    batches = [pending[i:i + batch_size] for i in range(0, len(pending), batch_size)]
+
+    if batches:
+        fetcher = fetcher or open_meteo_fetcher()
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            results = executor.map(lambda batch: fetcher([(lat, lon) for lat, lon, _, _ in batch], batch[0][2], max(cell[3] for cell in batch)), batches)
+
+            # Save the fetched days of each cell
+            for batch, fetched in zip(batches, results):
+                for (lat, lon, _, _), df in zip(batch, fetched):
+                    stored[(lat, lon)] = update_location_archive(archive_path, lat, lon, stored[(lat, lon)], [df])
+
+    # Weather of each cell and day
+    weather_df = pd.concat([df.assign(cell_lat=lat, cell_lon=lon) for (lat, lon), df in stored.items() if len(df) > 0] +
+                           [pd.DataFrame(columns=['date','min_temp','max_temp','weather_code','cell_lat','cell_lon'])], ignore_index=True)
+    weather_df['date'] = weather_df['date'].astype(str)
+    weather_df['weather_condition'] = weather_df['weather_code'].astype(float).map(weather_mapping)
+
+    # Weather of each track
+    tracks_df = tracks_df.merge(weather_df, on=['cell_lat','cell_lon','date'])
+
+    return tracks_df[['track_id', 'min_temp', 'max_temp', 'weather_condition']]
+
+# Local stand-in server of the archive API, it answers with the data of a fixture csv (to work offline, or in tests)
+def run_stand_in_server(fixture_path, port=8765):
+
+    fetcher = fixture_fetcher(fixture_path)
+
+    class ArchiveHandler(BaseHTTPRequestHandler):
+
+        def do_GET(self):
+
+            # Read the parameters (the locations separated by commas), and obtain the data
+            params = parse_qs(urlparse(self.path).query)
+            locations = list(zip(params['latitude'][0].split(','), params['longitude'][0].split(',')))
+            dfs = fetcher(locations, params['start_date'][0], params['end_date'][0])
+
+            # Same format as the archive API - a list only if there are many locations
+            data = [{'latitude': float(lat), 'longitude': float(lon),
+                     'daily': {'time': df['date'].tolist(),
+                               'temperature_2m_min': df['min_temp'].tolist(),
+                               'temperature_2m_max': df['max_temp'].tolist(),
+                               'weathercode': df['weather_code'].tolist()}} for (lat, lon), df in zip(locations, dfs)]
+            body = json.dumps(data if len(data) > 1 else data[0]).encode('utf-8')
+
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            return
+
+    server = ThreadingHTTPServer(('127.0.0.1', port), ArchiveHandler)
+    print(f'Weather archive stand-in server in http://127.0.0.1:{port}/v1/archive')
+    server.serve_forever()
@@ -0,0 +1,138 @@
+import pandas as pd
+import numpy as np
+import os
+import json
+import zipfile
+import shapely
+from shapely.geometry import Polygon, shape
+
+# Registry of the zones: the polygon of each zone (in lon and lat), its center, and if the tracks of the combined dumps are routed to it (the
+# example zone is a subset of Matagalls, so it only has its own zip). The default zones are rectangles, but any polygon can be used - the zones
+# of the file zones.geojson in the data path (a feature for each zone, with the name in the properties) replace or extend them
+zones_dict = {"canigo": {'polygon': Polygon([(2.2, 42.4), (2.7, 42.4), (2.7, 42.6), (2.2, 42.6)]), 'center': (2.5, 42.5), 'routed': True},
+              "matagalls": {'polygon': Polygon([(2.3, 41.8), (2.5, 41.8), (2.5, 41.9), (2.3, 41.9)]), 'center': (2.4, 41.825), 'routed': True},
+              "vallferrera": {'polygon': Polygon([(1.2, 42.5), (1.7, 42.5), (1.7, 42.8), (1.2, 42.8)]), 'center': (1.35, 42.6), 'routed': True},
+              "exemple": {'polygon': Polygon([(2.3, 41.8), (2.5, 41.8), (2.5, 41.9), (2.3, 41.9)]), 'center': (2.4, 41.825), 'routed': False}}
+
+# Name of the combined dump (the tracks of many regions) in the zip files directory
+combined_dump_name = 'combined.zip'
+
+# Returns the zones of the registry, with the ones of the zones file of the data path
+def obtain_zones(data_path=None):
+
+    zones = dict(zones_dict)
+
+    # Zones of the file - the center is optional (the centroid is used if it is not given), and the zones are routed if it is not said otherwise
+    zones_path = os.path.join(data_path, 'zones.geojson') if data_path else None
+    if zones_path and os.path.exists(zones_path):
+        with open(zones_path, "r", encoding="utf-8") as file:
+            for feature in json.load(file)['features']:
+                polygon = shape(feature['geometry'])
+                center = feature['properties'].get('center') or (polygon.centroid.x, polygon.centroid.y)
+                zones[feature['properties']['name']] = {'polygon': polygon, 'center': tuple(center), 'routed': feature['properties'].get('routed', True)}
+
+    return zones
+
+# Polygon of a zone
+def zone_polygon(zone, data_path=None):
+    return obtain_zones(data_path)[zone]['polygon']
+
+# Center of a zone (lon and lat)
+def zone_center(zone, data_path=None):
+    return obtain_zones(data_path)[zone]['center']
+
+# Fraction of the coordinates of a track inside a polygon - first with the bounding boxes, and then with all the coordinates at once
+def polygon_coverage(polygon, lons, lats):
+
+    lons, lats = np.asarray(lons, dtype=float), np.asarray(lats, dtype=float)
+    if len(lons) == 0:
+        return 0.0
+
+    # The bounding boxes do not intersect, or the bounding box of the track is inside the polygon
+    track_box = shapely.box(lons.min(), lats.min(), lons.max(), lats.max())
+    if not shapely.intersects(polygon, track_box):
+        return 0.0
+    if shapely.contains(polygon, track_box):
+        return 1.0
+
+    return float(shapely.contains_xy(polygon, lons, lats).mean())
+
+# Checks if all the coordinates of a track are inside a polygon
+def inside_polygon(polygon, lons, lats):
+    return polygon_coverage(polygon, lons, lats) == 1.0
+
+# Router of the tracks: an STRtree with the polygons of the routed zones, to find the zones that cover each track
+def create_zones_router(zones):
+
+    names = [name for name, zone in zones.items() if zone.get('routed', True)]
+    polygons = np.array([zones[name]['polygon'] for name in names])
+    shapely.prepare(polygons)
+
+    return {'names': names, 'polygons': polygons, 'tree': shapely.STRtree(polygons)}
+
+# Returns the zone of a track with its coverage (None if it is outside all the zones): the zone that covers more coordinates - a zone that
+# contains the whole track, or the track will be discarded there with the error type 2, as before. If some zones cover the same, the smallest
+# one (the most specific) is chosen, and then the first name
+def route_track(router, lons, lats):
+
+    lons, lats = np.asarray(lons, dtype=float), np.asarray(lats, dtype=float)
+    if len(lons) == 0:
+        return None
+
+    # Candidate zones with the bounding box of the track
+    candidates = router['tree'].query(shapely.box(lons.min(), lats.min(), lons.max(), lats.max()), predicate='intersects')
+    coverages = [(router['names'][candidate], polygon_coverage(router['polygons'][candidate], lons, lats), shapely.area(router['polygons'][candidate]))
+                 for candidate in candidates]
+    coverages = [zone_coverage for zone_coverage in coverages if zone_coverage[1] > 0]
+    if not coverages:
+        return None
+
+    name, coverage, _ = min(coverages, key=lambda zone_coverage: (-zone_coverage[1], zone_coverage[2], zone_coverage[0]))
+    return name, coverage
+
+# Routes the tracks of a combined dump (a zip or a directory with JSON files of many regions) into the input directories of the zones (the
+# tracks already there are not written again). Returns (and saves) the routing of each track, the tracks outside all the zones have no zone
+def route_combined_dump(dump_path, data_path):
+
+    router = create_zones_router(obtain_zones(data_path))
+    routing = []
+
+    # Obtain the JSON files of the dump - from the zip, or from the directory
+    if zipfile.is_zipfile(dump_path):
+        zip_file = zipfile.ZipFile(dump_path, 'r')
+        members = [(os.path.basename(member), member) for member in zip_file.namelist() if member.endswith('.json')]
+        open_member = lambda member: zip_file.open(member)
+    else:
+        zip_file = None
+        members = [(file, os.path.join(root, file)) for root, _, files in os.walk(dump_path) for file in files if file.endswith('.json')]
+        open_member = lambda member: open(member, 'rb')
+
+    for file, member in members:
+
+        # Coordinates of the track (lon, lat, elevation and timestamp)
+        with open_member(member) as source:
+            content = source.read()
+        coordinates = np.array([coordinate[:2] for coordinate in json.loads(content).get('coordinates', [])], dtype=float).reshape(-1, 2)
+
+        # Zone of the track, and copy it to its input directory
+        track_zone = route_track(router, coordinates[:, 0], coordinates[:, 1])
+        if track_zone is None:
+            routing.append({'track_id': int(file.split('.')[0]), 'zone': None, 'coverage': 0.0})
+            continue
+
+        zone, coverage = track_zone
+        input_path = os.path.join(data_path, zone, 'Input-Data')
+        os.makedirs(input_path, exist_ok=True)
+        if not os.path.exists(os.path.join(input_path, file)):
+            with open(os.path.join(input_path, file), 'wb') as target:
+                target.write(content)
+        routing.append({'track_id': int(file.split('.')[0]), 'zone': zone, 'coverage': round(coverage, 4)})
+
+    if zip_file is not None:
+        zip_file.close()
+
+    # Save the routing of the tracks
+    routing_df = pd.DataFrame(routing, columns=['track_id','zone','coverage'])
+    routing_df.to_csv(os.path.join(data_path, 'routing.csv'), index=False)
+
+    return routing_df
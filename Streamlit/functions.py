@@ -12,10 +12,13 @@ processing_data_path = '../../Data/Processing-Data'
 
 # Go to the 'Visualizations' folder to obtain the functions
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'Visualizations')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'Data-Processing')))     # And 'Data-Processing', for the similar routes index
 
 # Import the functions
 from non_spatial import *
 from spatial import *
+from similar_tracks import load_similarity_index, query_similar_tracks
+from vector_tiles import filter_tiles_url
 
 # Given the zone, creates all the visualizations
 def create_visualizations(zone):
@@ -45,40 +48,22 @@ def create_visualizations(zone):
     with open(weather_vis_path, "r", encoding="utf-8") as f:
         weather_vis = f.read()
 
-    # Full map visualization - in HTML
-    full_map_path = os.path.join(streamlit_data_path, 'Visualizations', zone, 'Edges-Maps-Visualizations', 'all_edges_map.html')
-    with open(full_map_path, "r", encoding="utf-8") as f:
-        all_edges_map = f.read()
-    
+    # Edges maps - the shell of the zone with the data of each filter (and the vector tiles of the filter, if there is a tile server)
+    maps_path = os.path.join(streamlit_data_path, 'Visualizations', zone, 'Edges-Maps-Visualizations')
+    filter_map = lambda filter_name: edges_map_html(maps_path, filter_name, tiles_url=filter_tiles_url(maps_path, zone, filter_name))
+    all_edges_map = filter_map('all_edges')
+
     # All difficulties
     difficulties = ['easy', 'moderate', 'difficult', 'very_difficult']
-    diff_edges_maps = []
-    for diff in difficulties:
-        map_path = os.path.join(streamlit_data_path, 'Visualizations', zone, 'Edges-Maps-Visualizations', f'{diff}_edges.html')
-        with open(map_path, "r", encoding="utf-8") as f:
-            map = f.read()
-            diff_edges_maps.append(map)
+    diff_edges_maps = [filter_map(f'{diff}_edges') for diff in difficulties]
 
     # All weather conditions
     weather_cond = ['clear','cloudy','drizzle','rain','snow']
-    weather_edges_maps = []
-    for weath in weather_cond:
-        map_path = os.path.join(streamlit_data_path, 'Visualizations', zone, 'Edges-Maps-Visualizations', f'{weath}_edges.html')
-        with open(map_path, "r", encoding="utf-8") as f:
-            map = f.read()
-            weather_edges_maps.append(map)
-
-    # All years
+    weather_edges_maps = [filter_map(f'{weath}_edges') for weath in weather_cond]
+
+    # All years (None if the year does not have tracks)
     years = [2012, 2013, 2014, 2015, 2016, 2017, 2018, 2019, 2020, 2021, 2022, 2023, 2024]
-    years_edges_maps = []
-    for year in years:
-        map_path = os.path.join(streamlit_data_path, 'Visualizations', zone, 'Edges-Maps-Visualizations', f'{year}_edges.html')
-        if os.path.exists(map_path):
-            with open(map_path, "r", encoding="utf-8") as f:
-                map = f.read()
-                years_edges_maps.append(map)
-        else:
-            years_edges_maps.append(None)
+    years_edges_maps = [filter_map(f'{year}_edges') for year in years]
 
     # Return all the data
     return time_dist_vis, month_comp_vis, weekday_comp_vis, diff_info_vis, weather_vis, all_edges_map, diff_edges_maps, weather_edges_maps, years_edges_maps
@@ -178,6 +163,11 @@ def zone_home_page(zone, df):
 
     st.markdown('---')
 
+# WebGL map of all the edges of a zone - cached between the reruns of the app, and created again when the edges change (with its modification time)
+@st.cache_data(show_spinner=False)
+def webgl_edges_map(zone, all_edges_path, modification_time):
+    return create_webgl_edges_page(pd.read_csv(all_edges_path), zone, data_path=processing_data_path)
+
 # Question 1 function
 def question_1(zone, all_edges_map):
 
@@ -191,8 +181,19 @@ def question_1(zone, all_edges_map):
         st.markdown(content)
     st.markdown('---')
 
-    # Show the path
-    html(all_edges_map, height=800, scrolling=False)
+    # Show the path - with the leaflet map, or with the WebGL map (for the large networks)
+    renderer = st.radio('Map renderer', ['Leaflet', 'WebGL'], horizontal=True)
+    if renderer == 'Leaflet':
+        html(all_edges_map, height=800, scrolling=False)
+    else:
+        all_edges_path = os.path.join(processing_data_path, zone, 'Output-Data', 'Data-Frames', 'Edges-Dataframes', 'all_edges.csv')
+        html(webgl_edges_map(zone, all_edges_path, os.path.getmtime(all_edges_path)), height=800, scrolling=False)
+
+    # Density of all the raw points of the tracks (also outside the paths), if it is created
+    density_path = os.path.join(streamlit_data_path, 'Visualizations', zone, 'Edges-Maps-Visualizations', 'density_map.html')
+    if os.path.exists(density_path) and st.checkbox('Show the density of all the raw points of the tracks'):
+        with open(density_path, 'r', encoding='utf-8') as file:
+            html(file.read(), height=800, scrolling=False)
 
     st.markdown('---')
 
@@ -583,6 +584,33 @@ def track_visualizations(zone, df, track_id):
 
         st.markdown('---')
 
+        # Tracks with a similar route, from the index of the zone (if it exists)
+        index_path = os.path.join(processing_data_path, zone, 'Output-Data', 'Data-Frames', 'Edges-Dataframes', 'edge_set_signatures.csv')
+        if os.path.exists(index_path):
+
+            # Insert title
+            st.subheader(f'Tracks with a Similar Route to the Track {track_id}')
+
+            # Top tracks, with their information
+            similar_df = query_similar_tracks(load_similarity_index(index_path), track_id, k=5)
+            similar_df['track_id'] = similar_df['track_id'].astype(str)
+            similar_df = similar_df.merge(df[['track_id','title','date','difficulty','total_distance','url']], on='track_id', how='left')
+
+            if len(similar_df) > 0:
+                st.dataframe(similar_df,
+                             hide_index=True,
+                             column_config={'track_id':st.column_config.TextColumn('Track ID'),
+                                            'similarity':st.column_config.ProgressColumn('Shared edges', format="%.2f", min_value=0, max_value=1),
+                                            'title':st.column_config.TextColumn('Title'),
+                                            'date':st.column_config.DateColumn('Date', format="DD MMM YYYY"),
+                                            'difficulty':st.column_config.TextColumn('Difficulty'),
+                                            'total_distance':st.column_config.NumberColumn('Distance', format="%.2f km"),
+                                            'url': st.column_config.LinkColumn("URL")})
+            else:
+                st.markdown('There are no tracks with a similar route.')
+
+            st.markdown('---')
+
 # Function to create the individual tracks page for the zone
 def zone_individual_tracks(zone, df):
 
@@ -1,65 +1,128 @@
 import pandas as pd
 import os
 import altair as alt
+import spatial
 from spatial import *
 from non_spatial import *
+from vector_tiles import create_vector_tiles, save_tiles_mbtiles, summarize_vector_tiles, vector_tiles_dir
+from edges_lod import create_edges_lod, summarize_edges_lod
 
-# Function to create and save the edges map given some instructions
-def create_and_save_edges_map(zone, data_path, tracks_info_df, waypoints_df, name_df, name_column, filter_column, name_html, visualizations_path):
+# Checks if a file has to be created: it does not exist, or one of its sources (the ones that exist) has been modified after it
+def is_outdated(path, source_paths):
+    return not os.path.exists(path) or any(os.path.exists(source) and os.path.getmtime(source) > os.path.getmtime(path) for source in source_paths)
 
-    # Create the path, and check if it exists
-    path = os.path.join(visualizations_path, name_html)
-    if not os.path.exists(path):
+# Function to create and save the vector tiles of the edges of a filter (with the properties of the popups), returns the tiles
+def create_and_save_edges_tiles(edges_df, tiles_path, name_data):
 
-        # Read the edges dataframe
-        edges_df = pd.read_csv(f'{data_path}/{zone}/Output-Data/Data-Frames/Edges-Dataframes/{name_df}')
+    tiles = create_vector_tiles(add_edges_popup_columns(edges_df)[0])
+    save_tiles_mbtiles(tiles, tiles_path, name_data)
 
-        # Filter the tracks info dataframe using the column, and also filter the waypoints df
-        filtered_tracks_df = tracks_info_df[tracks_info_df[name_column] == filter_column]
-        list_filtered_tracks = filtered_tracks_df['track_id'].unique().tolist()
-        filtered_waypoints = waypoints_df[waypoints_df['track_id'].isin(list_filtered_tracks)]
+    return tiles
+
+# Function to create and save the data and the vector tiles of an edges map filter given some instructions
+def create_and_save_edges_map_data(zone, data_path, tracks_info_df, name_df, name_column, filter_column, name_data, visualizations_path):
+
+    # Create the paths, and check if they are outdated (the data depends on the edges and the tracks information, the tiles only on the edges)
+    path = os.path.join(visualizations_path, 'Map-Data', f'{name_data}.json')
+    tiles_path = os.path.join(visualizations_path, vector_tiles_dir, f'{name_data}.mbtiles')
+    edges_path = f'{data_path}/{zone}/Output-Data/Data-Frames/Edges-Dataframes/{name_df}'
+    tracks_info_path = f'{data_path}/{zone}/Output-Data/Data-Frames/tracks_info.csv'
+    if not os.path.exists(edges_path):
+        return
+    update_data, update_tiles = is_outdated(path, [edges_path, tracks_info_path]), is_outdated(tiles_path, [edges_path])
+
+    # Read the edges dataframe
+    if update_data or update_tiles:
+        edges_df = pd.read_csv(edges_path)
 
-        # Generate the edges map using the function and save it
-        edges_map = create_edges_map(edges_df, zone, filtered_tracks_df, filtered_waypoints)       # Create the map
-        edges_map.save(path)
+    if update_data:
 
-# Function to create all the edges maps
-def create_all_edges_maps(zone, data_path, tracks_info_df, waypoints_df, all_edges_df, visualizations_path):
+        # Filter the tracks info dataframe using the column (the points of the tracks are shared by all the filters)
+        filtered_tracks_df = tracks_info_df[tracks_info_df[name_column] == filter_column]
+
+        # Generate the data of the filter and save it
+        save_edges_map_data(create_edges_map_data(edges_df, filtered_tracks_df), path)
+
+    if update_tiles:
+        create_and_save_edges_tiles(edges_df, tiles_path, name_data)
+
+# Function to create all the edges maps - one shell for the zone, the shared points, and the data of each filter
+def create_all_edges_maps(zone, data_path, tracks_info_df, waypoints_df, hubs_df, all_edges_df, visualizations_path):
+
+    # Data directory of the maps, and the dataframes of the zone (the sources of the data)
+    map_data_path = os.path.join(visualizations_path, 'Map-Data')
+    os.makedirs(map_data_path, exist_ok=True)
+    dataframes_path = f'{data_path}/{zone}/Output-Data/Data-Frames'
+    tracks_info_path = os.path.join(dataframes_path, 'tracks_info.csv')
+    all_edges_csv_path = os.path.join(dataframes_path, 'Edges-Dataframes', 'all_edges.csv')
+
+    # Shell of the maps (it only depends on the code of the maps and the center of the zone), and the starting and ending points and waypoints of all the tracks
+    shell_path = os.path.join(visualizations_path, 'edges_map_shell.html')
+    if is_outdated(shell_path, [spatial.__file__, os.path.join(data_path, 'zones.geojson')]):
+        create_edges_map_shell(zone, data_path=data_path).save(shell_path)
+    points_path = os.path.join(map_data_path, 'points.json')
+    if is_outdated(points_path, [tracks_info_path, os.path.join(dataframes_path, 'waypoints.csv'), os.path.join(dataframes_path, 'hubs.csv')]):
+        save_edges_map_data(create_points_map_data(tracks_info_df, waypoints_df, hubs_df), points_path)
+
+    # Levels of detail of the lines of all the edges, shared by the filters (created again with the edges, or the new edges would be missing)
+    lod_path = os.path.join(map_data_path, 'edges_lod.json')
+    if is_outdated(lod_path, [all_edges_csv_path]):
+        edges_lod = create_edges_lod(all_edges_df)
+        save_edges_map_data(edges_lod, lod_path)
+        print(summarize_edges_lod(edges_lod, all_edges_df).to_string(index=False))
 
     # General edges map
-    all_edges_path = os.path.join(visualizations_path, 'all_edges_map.html')    # Generate path 
-    if not os.path.exists(all_edges_path):      # Check if it exists
-        all_edges_map = create_edges_map(all_edges_df, zone, tracks_info_df, waypoints_df)      # Create the map
-        all_edges_map.save(all_edges_path)  
+    all_edges_path = os.path.join(map_data_path, 'all_edges.json')    # Generate path 
+    if is_outdated(all_edges_path, [all_edges_csv_path, tracks_info_path]):      # Check if it is outdated
+        save_edges_map_data(create_edges_map_data(all_edges_df, tracks_info_df), all_edges_path)
     print('     All edges done')
 
+    # Vector tiles of all the edges (the tiles of the other filters are created with their data)
+    tiles_path = os.path.join(visualizations_path, vector_tiles_dir, 'all_edges.mbtiles')
+    if is_outdated(tiles_path, [all_edges_csv_path]):
+        print(summarize_vector_tiles(create_and_save_edges_tiles(all_edges_df, tiles_path, 'all_edges')).to_string(index=False))
+    print('     Vector tiles done')
+
+    # Density of the raw points of the tracks, created again if the grids have changed
+    grids_path = f'{data_path}/{zone}/Output-Data/Data-Frames/density_grids.npz'
+    density_path = os.path.join(visualizations_path, 'density_map.html')
+    if os.path.exists(grids_path) and is_outdated(density_path, [grids_path]):
+        density_levels = load_density_levels(grids_path)
+        create_density_map(zone, density_levels, data_path).save(density_path)
+        save_density_overlays(density_levels, os.path.join(visualizations_path, 'Density-Overlays'))
+    print('     Density map done')
+
     # Difficulties
-    create_and_save_edges_map(zone, data_path, tracks_info_df, waypoints_df, 'difficulty_easy.csv', 'difficulty', 'Easy', 'easy_edges.html', visualizations_path)
-    create_and_save_edges_map(zone, data_path, tracks_info_df, waypoints_df, 'difficulty_moderate.csv', 'difficulty', 'Moderate', 'moderate_edges.html', visualizations_path)
-    create_and_save_edges_map(zone, data_path, tracks_info_df, waypoints_df, 'difficulty_difficult.csv', 'difficulty', 'Difficult', 'difficult_edges.html', visualizations_path)
-    create_and_save_edges_map(zone, data_path, tracks_info_df, waypoints_df, 'difficulty_very_difficult.csv', 'difficulty', 'Very difficult', 'very_difficult_edges.html', visualizations_path)
+    create_and_save_edges_map_data(zone, data_path, tracks_info_df, 'difficulty_easy.csv', 'difficulty', 'Easy', 'easy_edges', visualizations_path)
+    create_and_save_edges_map_data(zone, data_path, tracks_info_df, 'difficulty_moderate.csv', 'difficulty', 'Moderate', 'moderate_edges', visualizations_path)
+    create_and_save_edges_map_data(zone, data_path, tracks_info_df, 'difficulty_difficult.csv', 'difficulty', 'Difficult', 'difficult_edges', visualizations_path)
+    create_and_save_edges_map_data(zone, data_path, tracks_info_df, 'difficulty_very_difficult.csv', 'difficulty', 'Very difficult', 'very_difficult_edges', visualizations_path)
     print('     All difficulties done')
 
     # Weather conditions
-    create_and_save_edges_map(zone, data_path, tracks_info_df, waypoints_df, 'weather_clear.csv', 'weather_condition', 'Clear', 'clear_edges.html', visualizations_path)
-    create_and_save_edges_map(zone, data_path, tracks_info_df, waypoints_df, 'weather_cloudy.csv', 'weather_condition', 'Cloudy', 'cloudy_edges.html', visualizations_path)
-    create_and_save_edges_map(zone, data_path, tracks_info_df, waypoints_df, 'weather_drizzle.csv', 'weather_condition', 'Drizzle', 'drizzle_edges.html', visualizations_path)
-    create_and_save_edges_map(zone, data_path, tracks_info_df, waypoints_df, 'weather_rain.csv', 'weather_condition', 'Rain', 'rain_edges.html', visualizations_path)
-    create_and_save_edges_map(zone, data_path, tracks_info_df, waypoints_df, 'weather_snow.csv', 'weather_condition', 'Snow', 'snow_edges.html', visualizations_path)
+    create_and_save_edges_map_data(zone, data_path, tracks_info_df, 'weather_clear.csv', 'weather_condition', 'Clear', 'clear_edges', visualizations_path)
+    create_and_save_edges_map_data(zone, data_path, tracks_info_df, 'weather_cloudy.csv', 'weather_condition', 'Cloudy', 'cloudy_edges', visualizations_path)
+    create_and_save_edges_map_data(zone, data_path, tracks_info_df, 'weather_drizzle.csv', 'weather_condition', 'Drizzle', 'drizzle_edges', visualizations_path)
+    create_and_save_edges_map_data(zone, data_path, tracks_info_df, 'weather_rain.csv', 'weather_condition', 'Rain', 'rain_edges', visualizations_path)
+    create_and_save_edges_map_data(zone, data_path, tracks_info_df, 'weather_snow.csv', 'weather_condition', 'Snow', 'snow_edges', visualizations_path)
     print('     All weather conditions done')
 
     # Years
     for year in tracks_info_df['year'].unique().tolist():
-        create_and_save_edges_map(zone, data_path, tracks_info_df, waypoints_df, f'year_{year}.csv', 'year', year, f'{year}_edges.html', visualizations_path)
+        create_and_save_edges_map_data(zone, data_path, tracks_info_df, f'year_{year}.csv', 'year', year, f'{year}_edges', visualizations_path)
     print('     All years done')
 
 # Function to create all the non-spatial visualizations
-def create_non_spatial_visualizations(zone, tracks_info_df, weather_df, visualizations_path):
+def create_non_spatial_visualizations(zone, data_path, tracks_info_df, weather_df, visualizations_path):
+
+    # Sources of the visualizations - the tracks information, and the weather for the weather calendar
+    tracks_info_path = f'{data_path}/{zone}/Output-Data/Data-Frames/tracks_info.csv'
+    weather_path_df = f'{data_path}/{zone}/Output-Data/Data-Frames/weather.csv'
 
-    # Only process time distribution if does not exist
+    # Only process time distribution if does not exist or is outdated
     time_dist_path = os.path.join(visualizations_path, 'time_distribution.html')
 
-    if not os.path.exists(time_dist_path):
+    if is_outdated(time_dist_path, [tracks_info_path]):
 
         # Time distribution call
         year_bar_chart, month_bar_chart, all_dates_line = time_distribution(tracks_info_df)
@@ -73,10 +136,10 @@ def create_non_spatial_visualizations(zone, tracks_info_df, weather_df, visualiz
         time_distribution_chart = alt.vconcat(alt.hconcat(year_bar_chart, month_bar_chart), all_dates_line)
         time_distribution_chart.save(time_dist_path)
 
-    # Check if it exist
+    # Check if it is outdated
     two_years_month_path = os.path.join(visualizations_path, 'two_years_month_comp.html')
 
-    if not os.path.exists(two_years_month_path):
+    if is_outdated(two_years_month_path, [tracks_info_path]):
 
         # Two years comparison
         two_years_month_chart = two_years_month_comparison(tracks_info_df)
@@ -87,10 +150,10 @@ def create_non_spatial_visualizations(zone, tracks_info_df, weather_df, visualiz
         # Save it
         two_years_month_chart.save(two_years_month_path)
 
-    # Check if it exist
+    # Check if it is outdated
     two_years_weekday_path = os.path.join(visualizations_path, 'two_years_weekday_comp.html')
 
-    if not os.path.exists(two_years_weekday_path):
+    if is_outdated(two_years_weekday_path, [tracks_info_path]):
 
         # Two years comparison
         two_years_weekday_chart = two_years_weekday_comparison(tracks_info_df)
@@ -101,10 +164,10 @@ def create_non_spatial_visualizations(zone, tracks_info_df, weather_df, visualiz
         # Save it
         two_years_weekday_chart.save(two_years_weekday_path)
 
-    # Check if it exist
+    # Check if it is outdated
     difficulty_path = os.path.join(visualizations_path, 'difficulty_info.html')
 
-    if not os.path.exists(difficulty_path):
+    if is_outdated(difficulty_path, [tracks_info_path]):
 
         # Obtain the charts
         difficulty_bars, min_max_lines, scatter_grid = difficulty_info(tracks_info_df)
@@ -116,10 +179,10 @@ def create_non_spatial_visualizations(zone, tracks_info_df, weather_df, visualiz
         difficulty_info_chart = alt.hconcat(alt.vconcat(difficulty_bars, min_max_lines), scatter_grid)
         difficulty_info_chart.save(difficulty_path)
 
-    # Check if it exists
+    # Check if it is outdated
     weather_path = os.path.join(visualizations_path, 'weather_calendar.html')
 
-    if not os.path.exists(weather_path):
+    if is_outdated(weather_path, [tracks_info_path, weather_path_df]):
 
         # Obtain visualizations
         pie_chart, scatter_plot, calendar = calendar_weather(tracks_info_df, weather_df)
@@ -133,20 +196,19 @@ def create_non_spatial_visualizations(zone, tracks_info_df, weather_df, visualiz
         weather_chart = alt.vconcat(alt.hconcat(pie_chart, scatter_plot), calendar)
         weather_chart.save(weather_path)
 
-# Main function
-def main_save_visualizations(zone):
-    
-    # Define the data path
-    data_path = '../../Data/Processing-Data'
+# Main function - creates the visualizations that do not exist or are outdated
+def main_save_visualizations(zone, data_path='../../Data/Processing-Data', streamlit_visualizations_path='../../Data/Streamlit-Data/Visualizations'):
 
     # Read all the needed paths
     tracks_info_df = pd.read_csv(f'{data_path}/{zone}/Output-Data/Data-Frames/tracks_info.csv')
     weather_df = pd.read_csv(f'{data_path}/{zone}/Output-Data/Data-Frames/weather.csv')
     waypoints_df = pd.read_csv(f'{data_path}/{zone}/Output-Data/Data-Frames/waypoints.csv')
     all_edges_df = pd.read_csv(f'{data_path}/{zone}/Output-Data/Data-Frames/Edges-Dataframes/all_edges.csv')
+    hubs_path = f'{data_path}/{zone}/Output-Data/Data-Frames/hubs.csv'
+    hubs_df = pd.read_csv(hubs_path) if os.path.exists(hubs_path) else None     # Starting and ending hubs, if they are computed
 
     # Create a visualizations directory if not created - inside the streamlit directory
-    visualizations_path = f'../../Data/Streamlit-Data/Visualizations/{zone}'
+    visualizations_path = os.path.join(streamlit_visualizations_path, zone)
     os.makedirs(visualizations_path, exist_ok=True)
 
     # Create the non spatial visualizations path
@@ -162,15 +224,16 @@ def main_save_visualizations(zone):
     os.makedirs(single_tracks_vis_path, exist_ok=True)
 
     # Create all edges maps
-    create_all_edges_maps(zone, data_path, tracks_info_df, waypoints_df, all_edges_df, maps_vis_path)
+    create_all_edges_maps(zone, data_path, tracks_info_df, waypoints_df, hubs_df, all_edges_df, maps_vis_path)
 
     # Create all non-spatial visualizations
-    create_non_spatial_visualizations(zone, tracks_info_df, weather_df, non_spatial_vis_path)
+    create_non_spatial_visualizations(zone, data_path, tracks_info_df, weather_df, non_spatial_vis_path)
 
 # Call the main function for the three zones
-print('El Canigó')
-main_save_visualizations('canigo')
-print('El Matagalls')
-main_save_visualizations('matagalls')
-print('La Vall Ferrera')
-main_save_visualizations('vallferrera')
+if __name__ == '__main__':
+    print('El Canigó')
+    main_save_visualizations('canigo')
+    print('El Matagalls')
+    main_save_visualizations('matagalls')
+    print('La Vall Ferrera')
+    main_save_visualizations('vallferrera')
@@ -0,0 +1,78 @@
+import pandas as pd
+import numpy as np
+import json
+import shapely
+
+# Level of detail pyramid of the edges geometries of a zone. Each level has the edges simplified with a tolerance (keeping the first and last
+# points, so the edges stay connected) and the coordinates quantized to some decimals. The coordinates of each edge are saved as integers,
+# the first point from the origin of the zone and the rest as moves from the previous point. The maps draw the level of their zoom
+
+# Levels of the pyramid - from the min zoom, the tolerance of the simplification (in meters) and the decimals of the coordinates
+lod_levels = [{'min_zoom': 0, 'tolerance': 25, 'decimals': 4},
+              {'min_zoom': 13, 'tolerance': 6, 'decimals': 5},
+              {'min_zoom': 15, 'tolerance': 1.5, 'decimals': 5},
+              {'min_zoom': 17, 'tolerance': 0, 'decimals': 6}]
+
+# Meters of a degree of latitude
+meters_per_degree = 111320
+
+# Given the edges dataframe (id and geometry), returns the pyramid: the origin, the ids of the edges and the lines of each level
+def create_edges_lod(edges_df, levels=lod_levels):
+
+    geometries = shapely.from_wkt(edges_df['geometry'].to_numpy())
+    min_lon, min_lat, max_lon, max_lat = shapely.total_bounds(geometries)
+    origin = [np.floor(min_lon * 100) / 100, np.floor(min_lat * 100) / 100]
+
+    # Geometries in meters from the origin, to simplify with the same tolerance in both axes
+    scale = np.array([meters_per_degree * np.cos(np.radians((min_lat + max_lat) / 2)), meters_per_degree])
+    projected = shapely.transform(geometries, lambda coords: (coords - origin) * scale)
+
+    lod = {'origin': origin, 'ids': edges_df['id'].astype(int).tolist(), 'levels': []}
+    for level in levels:
+
+        # Simplified coordinates of all the edges, back in degrees and quantized
+        simplified = shapely.simplify(projected, level['tolerance'], preserve_topology=True) if level['tolerance'] > 0 else projected
+        coords, index = shapely.get_coordinates(simplified, return_index=True)
+        quantized = np.round(coords / scale * 10 ** level['decimals']).astype(np.int64)
+
+        # Without the repeated points after the quantization (the last point of each edge is always kept)
+        last = np.concatenate([np.diff(index) != 0, [True]])
+        keep = np.concatenate([[True], (np.diff(quantized, axis=0) != 0).any(axis=1) | (np.diff(index) != 0)]) | last
+        quantized, index = quantized[keep], index[keep]
+
+        # Moves from the previous point of the edge (the first point from the origin)
+        moves = quantized.copy()
+        moves[1:] -= quantized[:-1]
+        starts = np.concatenate([[True], np.diff(index) != 0])
+        moves[starts] = quantized[starts]
+        lines = np.split(moves.ravel(), 2 * np.searchsorted(index, np.arange(1, len(geometries))))
+
+        lod['levels'].append({**level, 'lines': [line.tolist() for line in lines]})
+
+    return lod
+
+# Keeps only some edges in the pyramid
+def filter_edges_lod(lod, edge_ids):
+
+    selected = set(int(edge_id) for edge_id in edge_ids)
+    keep = [index for index, edge_id in enumerate(lod['ids']) if edge_id in selected]
+
+    return {'origin': lod['origin'], 'ids': [lod['ids'][index] for index in keep],
+            'levels': [{**level, 'lines': [level['lines'][index] for index in keep]} for level in lod['levels']]}
+
+# Decodes the coordinates (lon, lat) of the edges in a level of the pyramid
+def decode_edges_lod(lod, level):
+
+    origin = np.array(lod['origin'])
+    return [origin + np.cumsum(np.array(line).reshape(-1, 2), axis=0) / 10 ** level['decimals'] for line in level['lines']]
+
+# Vertices and size (in KB, as compact JSON) of each level of the pyramid - and of the full resolution edges with the coordinates as floats
+def summarize_edges_lod(lod, edges_df):
+
+    summary = [{'level': 'full geometry', 'min_zoom': None, 'vertices': int(shapely.get_num_coordinates(shapely.from_wkt(edges_df['geometry'].to_numpy())).sum()),
+                'kb': round(len(json.dumps([shapely.get_coordinates(line).round(6).tolist() for line in shapely.from_wkt(edges_df['geometry'].to_numpy())], separators=(',', ':'))) / 1000, 1)}]
+    for number, level in enumerate(lod['levels']):
+        summary.append({'level': f'level {number} ({level["tolerance"]} m, {level["decimals"]} decimals)', 'min_zoom': level['min_zoom'],
+                        'vertices': sum(len(line) // 2 for line in level['lines']), 'kb': round(len(json.dumps(level['lines'], separators=(',', ':'))) / 1000, 1)})
+
+    return pd.DataFrame(summary)
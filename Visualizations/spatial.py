@@ -2,12 +2,25 @@ import pandas as pd
 from pandas.errors import SettingWithCopyWarning
 import folium
 from shapely import wkt
+import shapely
 import numpy as np
-import ast
-from folium.plugins import GroupedLayerControl
+import base64
+import struct
+import zlib
+import time
+import json
+import os
+import sys
+from folium.plugins import GroupedLayerControl, MarkerCluster
 from branca.element import Template, MacroElement
+from vector_tiles import tiles_layer_name, tiles_min_zoom, tiles_max_zoom
+from edges_lod import filter_edges_lod, create_edges_lod, decode_edges_lod, lod_levels
 import warnings
 
+# Go to the 'Data-Processing' folder to obtain the zones registry
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'Data-Processing')))
+from zones import zone_center
+
 warnings.filterwarnings("ignore", category=FutureWarning)
 warnings.filterwarnings("ignore", category=SettingWithCopyWarning)
 
@@ -17,8 +30,8 @@ uphill_color_dict = {'Less than 7.5%':'#f1eef6', 'From 7.5% to 15%':'#bdc9e1', '
 tracks_color_dict = {'Less than 25 tracks':'#ffffb2', 'From 25 to 50 tracks':'#fecc5c', 'From 50 to 75 tracks':'#fd8d3c', 'More than 75 tracks':'#e31a1c'}
 comparison_color_dict = {'Fastest':'#3ca951', 'Slowest':'#ff725c'}
 
-# Dictionary with the center coordinates
-center_coords_dict = {"canigo": (2.5, 42.5), "matagalls": (2.4, 41.825), "vallferrera": (1.35, 42.6), "exemple": (2.4, 41.825)}
+# Widths of the edges in the WebGL maps (in pixels), for each popularity group
+tracks_width_dict = {'Less than 25 tracks': 2, 'From 25 to 50 tracks': 3, 'From 50 to 75 tracks': 4, 'More than 75 tracks': 6}
 
 # Formats the pace
 def format_pace(pace_min_per_km):
@@ -212,7 +225,46 @@ def create_points_tooltips_popups(track_df, max_elev_idx, min_elev_idx):
 
     return tooltip_start_point, popup_start_point, tooltip_end_point, popup_end_point, tooltip_highest_point, popup_highest_point, tooltip_lowest_point, popup_lowest_point
 
-# Create the single track map
+# Given a division of a track (a dataframe with the geometries, the tooltips, the popups and the colors), adds it to the map as a hidden GeoJSON layer.
+# The tooltip and the popup of each segment are saved once, as properties
+def create_division_geojson(division_df, color_columns, m):
+
+    division = folium.GeoJson(create_feature_collection(division_df, ['map_tooltip','map_popup'] + color_columns),
+                              style_function=lambda feature: {'color': feature['properties'][color_columns[0]], 'weight': 4, 'opacity': 1},
+                              tooltip=folium.GeoJsonTooltip(fields=['map_tooltip'], labels=False),
+                              popup=folium.GeoJsonPopup(fields=['map_popup'], labels=False),
+                              control=False, show=False)
+    division.add_to(m)
+
+    return division
+
+# Given the paintings of the layer control (an empty layer, a division and the property with the color), adds the script that shows the division
+# painted with the property when the painting is selected, and hides it when none of its paintings is selected
+def add_paintings_switch(m, paintings):
+
+    paintings_js = ', '.join(f"{{group: {layer.get_name()}, division: {division.get_name()}, color: '{color_column}'}}" for layer, division, color_column in paintings)
+    switch_js = f"""{{% macro script(this, kwargs) %}}
+        (function() {{
+            var paintings = [{paintings_js}];
+            paintings.forEach(function(painting) {{
+                painting.group.on('add', function() {{
+                    painting.division.setStyle(function(feature) {{ return {{color: feature.properties[painting.color]}}; }});
+                    painting.division.addTo({m.get_name()});
+                }});
+                painting.group.on('remove', function() {{
+                    var selected = paintings.some(function(other) {{ return other.division === painting.division && {m.get_name()}.hasLayer(other.group); }});
+                    if (!selected) {{ {m.get_name()}.removeLayer(painting.division); }}
+                }});
+            }});
+        }})();
+    {{% endmacro %}}"""
+
+    # Create the element
+    switch = MacroElement()
+    switch._template = Template(switch_js)
+    m.add_child(switch)
+
+# Create the single track map - each division of the track is drawn once, and the layer control changes its colors
 def create_track_map(track_id, tracks_info, all_edges_df, waypoints_df, track_df, track_km_df, track_pace_df, track_edges_df):
 
     # Read the information and waypoints
@@ -276,69 +328,27 @@ def create_track_map(track_id, tracks_info, all_edges_df, waypoints_df, track_df
     full_tooltip, full_popup = create_track_tooltip_popup(track_info)
     folium.PolyLine(locations=full_track_coords, tooltip=full_tooltip, popup=folium.Popup(full_popup, max_width=300), color='#efb118', weight=4).add_to(full_track)
 
-    # Add the kilometer division three layers - and the km points
-    for index, row in track_km_df.iterrows():
-
-        # Convert to Shapely LineString
-        line = wkt.loads(row['geometry'])
-        coords = [[lat, lon] for lon, lat in line.coords]   # Define the coordinates
+    # Divisions of the track (kilometers, pace zones and edges) - each one is a GeoJSON layer with all the colors as properties, drawn once
+    km_division = create_division_geojson(track_km_df, ['alternate_color','pace_color','uphill_perc_color'], m)
+    pace_division = create_division_geojson(track_pace_df, ['pace_color','uphill_perc_color'], m)
+    edges_division = create_division_geojson(track_edges_df, ['pace_color','all_tracks_avg_color','fast_slow_color','uphill_perc_color','total_tracks_color'], m)
 
-        # Obtain the tooltip and the popup
-        tooltip = row['map_tooltip']
-        popup1 = folium.Popup(row['map_popup'], max_width=300)     # Three popups because we can not use the same
-        popup2 = folium.Popup(row['map_popup'], max_width=300)
-        popup3 = folium.Popup(row['map_popup'], max_width=300)
+    # Each painting of the layer control shows a division with the color of a property
+    add_paintings_switch(m, [(km_alternate, km_division, 'alternate_color'), (km_pace, km_division, 'pace_color'), (km_uphill, km_division, 'uphill_perc_color'),
+                             (pace_pace, pace_division, 'pace_color'), (pace_uphill, pace_division, 'uphill_perc_color'),
+                             (edges_pace, edges_division, 'pace_color'), (edges_pace_all, edges_division, 'all_tracks_avg_color'), (edges_fast_slow, edges_division, 'fast_slow_color'),
+                             (edges_uphill, edges_division, 'uphill_perc_color'), (edges_popul, edges_division, 'total_tracks_color')])
 
-        # Add the three layers
-        folium.PolyLine(locations=coords, tooltip=tooltip, popup=popup1, color=row['alternate_color'], weight=4).add_to(km_alternate)
-        folium.PolyLine(locations=coords, tooltip=tooltip, popup=popup2, color=row['pace_color'], weight=4).add_to(km_pace)
-        folium.PolyLine(locations=coords, tooltip=tooltip, popup=popup3, color=row['uphill_perc_color'], weight=4).add_to(km_uphill)
-
-        # Add the kilometers markers
+    # Add the kilometers markers
+    for index, row in track_km_df.iterrows():
         if index != 0:
+            coords = [[lat, lon] for lon, lat in wkt.loads(row['geometry']).coords]     # Define the coordinates
+
             # Add the marker with text inside
             folium.Marker(location=coords[0], tooltip=f'Kilometer <b>{row['km']}</b>', popup=folium.Popup(f'<b>Kilometer {row['km']}</b>', max_width=300),
                         icon=folium.DivIcon(html=f"""<div style="background-color: yellow; border: 2px solid black; border-radius: 50%; width: 20px; height: 20px;
                                                                                                                 text-align: center; font-size: 10pt; font-weight: bold; line-height: 20px;">{row['km']}</div>""")).add_to(kms_division)
 
-    # Add the pace zones two layers
-    for index, row in track_pace_df.iterrows():
-
-        # Convert to Shapely LineString
-        line = wkt.loads(row['geometry'])
-        coords = [[lat, lon] for lon, lat in line.coords]   # Define the coordinates
-
-        # Obtain the tooltip and the popup
-        tooltip = row['map_tooltip']
-        popup1 = folium.Popup(row['map_popup'], max_width=300)     # Three popups because we can not use the same
-        popup2 = folium.Popup(row['map_popup'], max_width=300)
-
-        # Add the three layers
-        folium.PolyLine(locations=coords, tooltip=tooltip, popup=popup1, color=row['pace_color'], weight=4).add_to(pace_pace)
-        folium.PolyLine(locations=coords, tooltip=tooltip, popup=popup2, color=row['uphill_perc_color'], weight=4).add_to(pace_uphill)
-
-    # Add the edges division five layers
-    for index, row in track_edges_df.iterrows():
-
-        # Convert to Shapely LineString
-        line = wkt.loads(row['geometry'])
-        coords = [[lat, lon] for lon, lat in line.coords]   # Define the coordinates
-
-        # Obtain the tooltip and the popup
-        tooltip = row['map_tooltip']
-        popup1 = folium.Popup(row['map_popup'], max_width=300)     # Three popups because we can not use the same
-        popup2 = folium.Popup(row['map_popup'], max_width=300)
-        popup3 = folium.Popup(row['map_popup'], max_width=300)
-        popup4 = folium.Popup(row['map_popup'], max_width=300)
-        popup5 = folium.Popup(row['map_popup'], max_width=300)
-
-        # Add the three layers
-        folium.PolyLine(locations=coords, tooltip=tooltip, popup=popup1, color=row['pace_color'], weight=4).add_to(edges_pace)
-        folium.PolyLine(locations=coords, tooltip=tooltip, popup=popup2, color=row['all_tracks_avg_color'], weight=4).add_to(edges_pace_all)
-        folium.PolyLine(locations=coords, tooltip=tooltip, popup=popup3, color=row['uphill_perc_color'], weight=4).add_to(edges_uphill)
-        folium.PolyLine(locations=coords, tooltip=tooltip, popup=popup4, color=row['total_tracks_color'], weight=4).add_to(edges_popul)
-        folium.PolyLine(locations=coords, tooltip=tooltip, popup=popup5, color=row['fast_slow_color'], weight=4).add_to(edges_fast_slow)
-
     # Obtain the maximum and minimum elevation points index
     max_elev_idx = int(track_df.loc[track_df['elev'].idxmax(), ['id']].iloc[0] - 1)
     min_elev_idx = int(track_df.loc[track_df['elev'].idxmin(), ['id']].iloc[0] - 1)
@@ -383,11 +393,69 @@ def create_track_map(track_id, tracks_info, all_edges_df, waypoints_df, track_df
 
     return m
 
-# Given an edges dataframe, create the full map
-def create_edges_map(edges_df, zone, tracks_info, waypoints_df):
+# Given a dataframe with the geometries as WKT (lon lat), returns a GeoJSON FeatureCollection with some columns as the properties of each feature
+def create_feature_collection(df, columns):
+
+    # Coordinates of all the lines at once, split by line (rounded to 6 decimals, around 10 cm)
+    geometries = shapely.from_wkt(df['geometry'].to_numpy())
+    coords, index = shapely.get_coordinates(geometries, return_index=True)
+    lines = np.split(np.round(coords, 6), np.searchsorted(index, np.arange(1, len(geometries))))
+
+    # Properties without the empty values (not valid in JSON)
+    properties = df[columns].astype(object).where(df[columns].notna(), None).to_dict('records')
+
+    return {'type': 'FeatureCollection',
+            'features': [{'type': 'Feature', 'geometry': {'type': 'LineString', 'coordinates': line.tolist()}, 'properties': feature_properties}
+                         for line, feature_properties in zip(lines, properties)]}
+
+# Adds the formatted columns of the edges popups - returns the dataframe, the columns and their names in the popup
+def add_edges_popup_columns(edges_df):
+
+    edges_df = edges_df.copy()
+    edges_df['average_pace'] = edges_df['avg_pace'].apply(lambda pace: format_pace(pace) if pd.notna(pace) else None)
+    popup_fields, popup_aliases = ['total_tracks','average_pace'], ['Total registered tracks', 'Average pace']
+    if 'pace_p10' in edges_df.columns:
+        edges_df['pace_range'] = [f'from {format_pace(p10)} to {format_pace(p90)}' if pd.notna(p10) and pd.notna(p90) else None for p10, p90 in zip(edges_df['pace_p10'], edges_df['pace_p90'])]
+        popup_fields, popup_aliases = popup_fields + ['pace_range'], popup_aliases + ['Pace of most tracks']
+
+    return edges_df, popup_fields, popup_aliases
+
+# Adds the edges of a dataframe to the layers of the edges map as GeoJSON - for each layer, a black outline and the edges colored with a column.
+# The tooltips and the popups are built in the browser with the properties of the edges
+def add_edges_geojson(edges_df, layers_colors):
+
+    # Properties of the popups
+    edges_df, popup_fields, popup_aliases = add_edges_popup_columns(edges_df)
+
+    # One collection for the outlines, and one with the properties for the colored edges
+    outline_collection = create_feature_collection(edges_df, [])
+    edges_collection = create_feature_collection(edges_df, ['id'] + popup_fields + [color_column for _, color_column in layers_colors])
+
+    for layer, color_column in layers_colors:
+        folium.GeoJson(outline_collection, style_function=lambda feature: {'color': 'black', 'weight': 6, 'opacity': 1}).add_to(layer)
+        folium.GeoJson(edges_collection, style_function=lambda feature, color_column=color_column: {'color': feature['properties'][color_column], 'weight': 4, 'opacity': 1},
+                       tooltip=folium.GeoJsonTooltip(fields=['id'], aliases=['Edge'], labels=True),
+                       popup=folium.GeoJsonPopup(fields=popup_fields, aliases=popup_aliases, labels=True, style='font-size: 10px;')).add_to(layer)
+
+# Adds the edges of a dataframe to the layers of the edges map as one PolyLine for each edge and layer (the previous version, used to compare)
+def add_edges_polylines(edges_df, layers_colors):
 
-    # Obtain the center coords 
-    center_coords = center_coords_dict[zone]
+    for index, row in edges_df.iterrows():
+
+        # Convert to Shapely LineString
+        line = wkt.loads(row['geometry'])
+        coords = [[lat, lon] for lon, lat in line.coords]   # Define the coordinates
+
+        # Add a black line for the background, and the colored line with its own popup (a popup can not be used twice)
+        for layer, color_column in layers_colors:
+            folium.PolyLine(locations=coords, color='black', weight=6).add_to(layer)
+            folium.PolyLine(locations=coords, tooltip=row['map_tooltip'], popup=folium.Popup(row['map_popup'], max_width=300), color=row[color_column], weight=4).add_to(layer)
+
+# Creates the background map of a zone, with the different tiles
+def create_zone_map(zone, data_path='../../Data/Processing-Data'):
+
+    # Obtain the center coords (of the zones registry, with the zones file of the data path)
+    center_coords = zone_center(zone, data_path)
 
     # Generate the background map
     m = folium.Map(location=[center_coords[1], center_coords[0]], zoom_start=12, control_scale=True, tiles=None)
@@ -400,14 +468,22 @@ def create_edges_map(edges_df, zone, tracks_info, waypoints_df):
                         attr='Tiles © Esri — Source: Esri, Maxar, Earthstar Geographics, and the GIS User Community',
                         show=False).add_to(m)
 
+    return m
+
+# Creates the edges map without data: the tiles, the edges layers, the points layers and the legends. Returns the map and the layers
+def create_edges_map_base(zone, data_path='../../Data/Processing-Data'):
+
+    # Generate the background map
+    m = create_zone_map(zone, data_path)
+
     # Create the layers
     popularity = folium.FeatureGroup(name="Popularity", show=True)
     avg_pace = folium.FeatureGroup(name="Average pace", show=True)
 
-    # Create the points
-    starting_points = folium.FeatureGroup(name="Starting points", show=False)
-    ending_point = folium.FeatureGroup(name="Ending points", show=False)
-    waypoints = folium.FeatureGroup(name="Points of interest", show=False)
+    # Create the points, grouped in clusters
+    starting_points = MarkerCluster(name="Starting points", show=False, icon_create_function=points_cluster_icon_js, chunkedLoading=True)
+    ending_point = MarkerCluster(name="Ending points", show=False, icon_create_function=points_cluster_icon_js, chunkedLoading=True)
+    waypoints = MarkerCluster(name="Points of interest", show=False, icon_create_function=points_cluster_icon_js, chunkedLoading=True)
 
     # Create and add all FeatureGroups to the map
     layers = [popularity, avg_pace]
@@ -427,67 +503,583 @@ def create_edges_map(edges_df, zone, tracks_info, waypoints_df):
     m.add_child(pace_legend)
     m.add_child(popularity_legend)
 
-    # For each edge, add the line
-    for index, row in edges_df.iterrows():
-        
-        # Convert to Shapely LineString
-        line = wkt.loads(row['geometry'])
-        coords = [[lat, lon] for lon, lat in line.coords]   # Define the coordinates
-
-        # Obtain the tooltip and the popup
-        tooltip = row['map_tooltip']
-        popup1 = folium.Popup(row['map_popup'], max_width=300)     # Three popups because we can not use the same
-        popup2 = folium.Popup(row['map_popup'], max_width=300)
+    # Add the layer control
+    folium.LayerControl(position='topright', collapsed=False).add_to(m)
+    GroupedLayerControl(groups={'Edges painting': layers}, collapsed=True).add_to(m)
+    GroupedLayerControl(groups={'Add widgets': points}, exclusive_groups=False, collapsed=True).add_to(m)
 
-        # # Add a black line for the background
-        folium.PolyLine(locations=coords, color='black', weight=6).add_to(popularity)
-        folium.PolyLine(locations=coords, color='black', weight=6).add_to(avg_pace)
+    return m, popularity, avg_pace, starting_points, ending_point, waypoints
 
-        # Add the three layers
-        folium.PolyLine(locations=coords, tooltip=tooltip, popup=popup1, color=row['total_tracks_color'], weight=4).add_to(popularity)
-        folium.PolyLine(locations=coords, tooltip=tooltip, popup=popup2, color=row['pace_color'], weight=4).add_to(avg_pace)  
+# Given an edges dataframe, create the full map - if the hubs dataframe is given, the starting and ending points are grouped in hubs.
+# The edges are added as GeoJSON layers, or as one PolyLine for each edge if geojson is False
+def create_edges_map(edges_df, zone, tracks_info, waypoints_df, hubs_df=None, geojson=True, data_path='../../Data/Processing-Data'):
 
-    # Add the starting and ending points
-    for index, row in tracks_info.iterrows():
+    # Create the map with the layers and the legends
+    m, popularity, avg_pace, starting_points, ending_point, waypoints = create_edges_map_base(zone, data_path)
 
-        # Get the first and the last coordinate as pairs
-        start_coords = list(ast.literal_eval(row['first_coordinate']))
-        end_coords = list(ast.literal_eval(row['last_coordinate']))
+    # Add the edges, colored by popularity and by average pace
+    layers_colors = [(popularity, 'total_tracks_color'), (avg_pace, 'pace_color')]
+    if geojson:
+        add_edges_geojson(edges_df, layers_colors)
+    else:
+        add_edges_polylines(edges_df, layers_colors)
 
-        # Create the toolip
-        tooltip_html = f'Track <b>{row['track_id']}</b>'
+    # Add the starting and ending points (grouped in hubs if the hubs are given) and the waypoints, drawn in the browser from the points data
+    add_points_script(m, starting_points, ending_point, waypoints, create_points_map_data(tracks_info, waypoints_df, hubs_df))
 
+    return m
 
-        # Create the popup
-        start_popup_html = f'''<div style="font-size: 10px;">
-                        <b>Track {row['track_id']}</b><br>
-                        <ul style="padding-left: 16px; margin: 4px 0;">
-                            <li><b>Title</b>: {row['title']}</li>
-                            <li><b>Longitude</b>: {start_coords[0]}</li>
-                            <li><b>Latitude</b>: {start_coords[1]}</li>
-                            <li><a href="{row['url']}" target="_blank">Link to Wikiloc</a></li>
-                        </ul></div>'''
-        end_popup_html = f'''<div style="font-size: 10px;">
-                        <b>Track {row['track_id']}</b><br>
-                        <ul style="padding-left: 16px; margin: 4px 0;">
-                            <li><b>Title</b>: {row['title']}</li>
-                            <li><b>Longitude</b>: {end_coords[0]}</li>
-                            <li><b>Latitude</b>: {end_coords[1]}</li>
-                            <li><a href="{row['url']}" target="_blank">Link to Wikiloc</a></li>
-                        </ul></div>'''
+# Script of the points of the edges maps: the starting and ending points of some tracks (grouped in hubs if there are hubs) and their waypoints.
+# The points are created in bulk from the columns of the points data (the numeric columns are binary arrays) and added to the clusters of their
+# layers, and the tooltips and the popups are only created when they are opened
+edges_map_points_js = """
+        // Columns of the points data - the numeric columns are little endian arrays in base64 (divided by 10^decimals if they are quantized)
+        var arrayTypes = {float32: Float32Array, float64: Float64Array, int32: Int32Array, uint32: Uint32Array};
+        function decodeColumns(columns) {
+            var decoded = {};
+            Object.keys(columns).forEach(function(name) {
+                var column = columns[name];
+                if (!column || !column.dtype) { decoded[name] = column; return; }
+                var values = new arrayTypes[column.dtype](Uint8Array.from(atob(column.data), function(char) { return char.charCodeAt(0); }).buffer);
+                decoded[name] = column.decimals === undefined ? values : Float64Array.from(values, function(value) { return value / Math.pow(10, column.decimals); });
+            });
+            return decoded;
+        }
+
+        // Popup with a title and a list of items
+        function createPopup(title, items) {
+            return '<div style="font-size: 10px;"><b>' + title + '</b><br><ul style="padding-left: 16px; margin: 4px 0;">' +
+                   items.map(function(item) { return '<li><b>' + item[0] + '</b>: ' + item[1] + '</li>'; }).join('') + '</ul></div>';
+        }
+
+        // Circle of a point, with the tracks of the point (used by the clusters)
+        function createPoint(lat, lon, color, tracks, radius) {
+            return L.circleMarker([lat, lon], {radius: radius || 5, fill: true, fillOpacity: 0.75, color: color, tracks: tracks});
+        }
+
+        // Starting and ending points of the tracks (all the tracks if they are not given), and their waypoints
+        function drawPoints(points, tracks) {
+            var selected = tracks ? new Set(tracks) : null, info = decodeColumns(points.tracks), hubs = points.hubs ? decodeColumns(points.hubs) : null;
+            var ends = [{layer: startingPoints, color: 'green', lat: info.start_lat, lon: info.start_lon, zone: info.start_zone, counts: {}, markers: []},
+                        {layer: endingPoints, color: 'red', lat: info.end_lat, lon: info.end_lon, zone: info.finish_zone, counts: {}, markers: []}];
+
+            for (let i = 0; i < info.track_id.length; i++) {
+                if (selected && !selected.has(info.track_id[i])) { continue; }
+                ends.forEach(function(end) {
+                    if (hubs && end.zone[i] >= 0) { end.counts[end.zone[i]] = (end.counts[end.zone[i]] || 0) + 1; return; }
+                    end.markers.push(createPoint(end.lat[i], end.lon[i], end.color, 1)
+                        .bindTooltip(function() { return 'Track <b>' + info.track_id[i] + '</b>'; })
+                        .bindPopup(function() {
+                            return createPopup('Track ' + info.track_id[i], [['Title', info.title[i]], ['Latitude', end.lat[i]], ['Longitude', end.lon[i]]])
+                                   .replace('</ul>', '<li><a href="' + info.url[i] + '" target="_blank">Link to Wikiloc</a></li></ul>');
+                        }, {maxWidth: 300}));
+                });
+            }
+
+            // Hubs, with the size depending on the tracks starting or ending there
+            if (hubs) {
+                ends.forEach(function(end) {
+                    for (let j = 0; j < hubs.hub_id.length; j++) {
+                        let total = end.counts[hubs.hub_id[j]];
+                        if (!total) { continue; }
+                        end.markers.push(createPoint(hubs.lat[j], hubs.lon[j], end.color, total, Math.min(5 + 2 * Math.sqrt(total), 25))
+                            .bindTooltip(function() { return 'Hub <b>' + hubs.hub_id[j] + '</b> (' + total + ' tracks)'; })
+                            .bindPopup(function() {
+                                return createPopup('Hub ' + hubs.hub_id[j], [['Tracks starting', hubs.total_starts[j]], ['Tracks finishing', hubs.total_finishes[j]],
+                                                                            ['Latitude', hubs.lat[j]], ['Longitude', hubs.lon[j]]]);
+                            }, {maxWidth: 300}));
+                    }
+                });
+            }
+            ends.forEach(function(end) { end.layer.addLayers(end.markers); });
+
+            // Waypoints, with the photo if they have it
+            var poi = decodeColumns(points.waypoints), markers = [];
+            for (let k = 0; k < poi.track_id.length; k++) {
+                if (selected && !selected.has(poi.track_id[k])) { continue; }
+                markers.push(createPoint(poi.lat[k], poi.lon[k], 'orange', 1)
+                    .bindTooltip(function() { return 'Point of interest <b>' + poi.poi_id[k] + '</b>'; })
+                    .bindPopup(function() {
+                        var popup = createPopup('Point of interest ' + poi.poi_id[k], [['Latitude', poi.lat[k]], ['Longitude', poi.lon[k]],
+                                                ['Elevation', poi.elevation[k].toFixed(2) + ' meters'], ['Type', poi.type[k]]]);
+                        return poi.photo[k] ? popup.replace('</ul>', '<li><a href="' + poi.photo[k] + '" target="_blank">Photo</a></li></ul>') : popup;
+                    }, {maxWidth: 300}));
+            }
+            waypoints.addLayers(markers);
+        }
+"""
+
+# Icon of the clusters of the points - the number of tracks of the points of the cluster (a hub has many tracks)
+points_cluster_icon_js = """function(cluster) {
+    var total = cluster.getAllChildMarkers().reduce(function(sum, marker) { return sum + (marker.options.tracks || 1); }, 0);
+    var size = total < 10 ? 'small' : (total < 100 ? 'medium' : 'large');
+    return L.divIcon({html: '<div><span>' + total + '</span></div>', className: 'marker-cluster marker-cluster-' + size, iconSize: new L.Point(40, 40)});
+}"""
+
+# Script of a map with the points data in the page (all the tracks of the data are drawn)
+edges_map_points_script_js = """{% macro script(this, kwargs) %}
+    (function() {
+        var startingPoints = __STARTING_POINTS__, endingPoints = __ENDING_POINTS__, waypoints = __WAYPOINTS__;
+""" + edges_map_points_js + """
+        drawPoints({% raw %}__POINTS_DATA__{% endraw %}, null);
+    })();
+{% endmacro %}"""
+
+# Script of the edges maps shell - draws the edges of a filter and the points of its tracks. The data is taken from the page if it has been
+# injected, or fetched from the data directory (the filter is selected with ?filter=name in the URL, all the edges by default)
+edges_map_loader_js = """{% macro script(this, kwargs) %}
+    (function() {
+        var map = __MAP__;
+        var popularity = __POPULARITY__, avgPace = __AVG_PACE__;
+        var startingPoints = __STARTING_POINTS__, endingPoints = __ENDING_POINTS__, waypoints = __WAYPOINTS__;
+        var filterName = new URLSearchParams(window.location.search).get('filter') || window.edgesMapFilter || 'all_edges';
+
+        // Data of the page, or the data file
+        function loadData(name) {
+            if (window.edgesMapData && window.edgesMapData[name]) { return Promise.resolve(window.edgesMapData[name]); }
+            return fetch('__DATA_DIR__/' + name + '.json').then(function(response) { return response.json(); });
+        }
+
+""" + edges_map_points_js + """
+        // Edges, with a black outline and colored by popularity and by average pace - the popups are created when they are opened. The lines
+        // are taken from the level of detail of the zoom (decoded the first time it is used), and they are changed when the level changes
+        function drawEdges(edges, lod) {
+            var position = {};
+            lod.ids.forEach(function(id, index) { position[id] = index; });
+            function levelLatLngs(zoom) {
+                var level = lod.levels.filter(function(level) { return zoom >= level.min_zoom; }).pop() || lod.levels[0];
+                if (!level.latlngs) {
+                    var factor = Math.pow(10, level.decimals);
+                    level.latlngs = edges.id.map(function(id) {
+                        if (position[id] === undefined) { return null; }     // Edges missing in the pyramid are not drawn
+                        var line = level.lines[position[id]], lon = 0, lat = 0, latlngs = [];
+                        for (let i = 0; i < line.length; i += 2) {
+                            lon += line[i]; lat += line[i + 1];
+                            latlngs.push([lod.origin[1] + lat / factor, lod.origin[0] + lon / factor]);
+                        }
+                        return latlngs;
+                    });
+                }
+                return level.latlngs;
+            }
+
+            var current = levelLatLngs(map.getZoom()), lines = [];
+            [[popularity, 'total_tracks_color'], [avgPace, 'pace_color']].forEach(function(layerColor) {
+                edges.id.forEach(function(id, i) {
+                    if (!current[i]) { return; }
+                    lines.push([L.polyline(current[i], {color: 'black', weight: 6, opacity: 1, interactive: false}).addTo(layerColor[0]), i]);
+                    lines.push([L.polyline(current[i], {color: edges[layerColor[1]][i], weight: 4, opacity: 1})
+                        .bindTooltip('Edge <b>' + id + '</b>')
+                        .bindPopup(function() {
+                            var items = [['Total registered tracks', edges.total_tracks[i]], ['Average pace', edges.average_pace[i]]];
+                            if (edges.pace_range && edges.pace_range[i]) { items.push(['Pace of most tracks', edges.pace_range[i]]); }
+                            return createPopup('Edge ' + id, items);
+                        }, {maxWidth: 300}).addTo(layerColor[0]), i]);
+                });
+            });
+
+            map.on('zoomend', function() {
+                var latlngs = levelLatLngs(map.getZoom());
+                if (latlngs === current) { return; }
+                current = latlngs;
+                lines.forEach(function(line) { line[0].setLatLngs(latlngs[line[1]]); });
+            });
+        }
+
+        // Edges from the vector tiles of the zone (loading the VectorGrid plugin first), with the same outline and colors. The popups are
+        // only shown from the zoom with the properties of the edges
+        function drawTiles(tilesUrl) {
+            var script = document.createElement('script');
+            script.src = 'https://unpkg.com/leaflet.vectorgrid@1.3.0/dist/Leaflet.VectorGrid.bundled.js';
+            script.onload = function() {
+                [[popularity, 'total_tracks_color'], [avgPace, 'pace_color']].forEach(function(layerColor) {
+                    var options = {rendererFactory: L.canvas.tile, maxNativeZoom: __TILES_MAX_ZOOM__, minNativeZoom: __TILES_MIN_ZOOM__};
+                    L.vectorGrid.protobuf(tilesUrl, L.extend({vectorTileLayerStyles: {__TILES_LAYER__: {color: 'black', weight: 6, opacity: 1}}, zIndex: 2}, options)).addTo(layerColor[0]);
+                    L.vectorGrid.protobuf(tilesUrl, L.extend({
+                        vectorTileLayerStyles: {__TILES_LAYER__: function(properties) { return {color: properties[layerColor[1]], weight: 4, opacity: 1}; }},
+                        interactive: true, zIndex: 3
+                    }, options)).on('click', function(event) {
+                        var properties = event.layer.properties;
+                        if (properties.id === undefined) { return; }
+                        var items = [['Total registered tracks', properties.total_tracks], ['Average pace', properties.average_pace]];
+                        if (properties.pace_range) { items.push(['Pace of most tracks', properties.pace_range]); }
+                        L.popup({maxWidth: 300}).setLatLng(event.latlng).setContent(createPopup('Edge ' + properties.id, items)).openOn(map);
+                    }).addTo(layerColor[0]);
+                });
+            };
+            document.head.appendChild(script);
+        }
+
+        Promise.all([loadData('points'), loadData(filterName), window.edgesMapTiles ? null : loadData('edges_lod')]).then(function(data) {
+            if (window.edgesMapTiles) { drawTiles(window.edgesMapTiles); } else { drawEdges(data[1].edges, data[2]); }
+            drawPoints(data[0], data[1].tracks);
+        });
+    })();
+{% endmacro %}"""
+
+# Creates the shell of the edges maps of a zone - the map without data, with the script that draws the data of a filter
+def create_edges_map_shell(zone, data_dir='Map-Data', data_path='../../Data/Processing-Data'):
+
+    m, popularity, avg_pace, starting_points, ending_point, waypoints = create_edges_map_base(zone, data_path)
+
+    # Add the script with the names of the map and the layers
+    loader_js = edges_map_loader_js
+    for key, element in [('__MAP__', m), ('__POPULARITY__', popularity), ('__AVG_PACE__', avg_pace), ('__STARTING_POINTS__', starting_points),
+                         ('__ENDING_POINTS__', ending_point), ('__WAYPOINTS__', waypoints)]:
+        loader_js = loader_js.replace(key, element.get_name())
+    loader = MacroElement()
+    for key, value in [('__DATA_DIR__', data_dir), ('__TILES_LAYER__', tiles_layer_name), ('__TILES_MIN_ZOOM__', str(tiles_min_zoom)), ('__TILES_MAX_ZOOM__', str(tiles_max_zoom))]:
+        loader_js = loader_js.replace(key, value)
+    loader._template = Template(loader_js)
+    m.add_child(loader)
 
-        # Create green circles for the starting zone, and red circles for the ending
-        folium.CircleMarker(location=start_coords, tooltip=tooltip, popup=folium.Popup(start_popup_html, max_width=300), radius=5, fill=True, fillOpacity=0.75, color='green').add_to(starting_points)  
-        folium.CircleMarker(location=end_coords, tooltip=tooltip, popup=folium.Popup(end_popup_html, max_width=300), radius=5, fill=True, fillOpacity=0.75, color='red').add_to(ending_point)  
+    return m
 
-    # Add the waypoints
-    for index, row in waypoints_df.iterrows():
-        folium.CircleMarker(location=[row['lat'], row['lon']], tooltip=row['map_tooltip'], popup=folium.Popup(row['map_popup'], max_width=300), radius=5, fill=True, fillOpacity=0.75, color='orange').add_to(waypoints)  
+# Given a dataframe, returns its columns as lists (the empty values as None, valid in JSON)
+def dataframe_to_columns(df):
+    return {column: df[column].astype(object).where(df[column].notna(), None).tolist() for column in df.columns}
+
+# Data of a filter of the edges maps: the properties of the popups and the colors of the edges (the lines are in the level of detail pyramid
+# of the zone, shared by all the filters), and the tracks of the filter
+def create_edges_map_data(edges_df, tracks_info):
+
+    edges_df, popup_fields, _ = add_edges_popup_columns(edges_df)
+
+    return {'edges': dataframe_to_columns(edges_df[['id'] + popup_fields + ['total_tracks_color','pace_color']]), 'tracks': tracks_info['track_id'].astype(int).tolist()}
+
+# Encodes a numeric column as a little endian binary array in base64 - quantized to some decimals (as integers) if they are given
+def encode_column(values, dtype, decimals=None):
+
+    values = np.asarray(values, dtype=float if decimals is not None else None)
+    column = {'dtype': dtype}
+    if decimals is not None:
+        values, column['decimals'] = np.round(values * 10 ** decimals), decimals
+
+    column['data'] = base64.b64encode(values.astype(np.dtype(dtype).newbyteorder('<')).tobytes()).decode('ascii')
+    return column
+
+# Decodes the values of a binary column (without dividing the quantized values)
+def decode_column(column):
+    return np.frombuffer(base64.b64decode(column['data']), dtype=np.dtype(column['dtype']).newbyteorder('<'))
+
+# Given a column of coordinates as text, '(lat, lon)', returns them as an array
+def parse_coordinates(coordinates):
+    return coordinates.astype(str).str.strip('()[] ').str.split(',', expand=True).astype(float).to_numpy()
+
+# Data shared by all the filters of the edges maps: the starting and ending points of all the tracks, the hubs and the waypoints. The numeric
+# columns are binary (the coordinates with 6 decimals), the popups are created in the map with them
+def create_points_map_data(tracks_info, waypoints_df, hubs_df=None):
+
+    # First and last coordinates (lat, lon) of each track, and their hubs
+    first_coords, last_coords = parse_coordinates(tracks_info['first_coordinate']), parse_coordinates(tracks_info['last_coordinate'])
+    zones = [tracks_info[column].fillna(-1) if hubs_df is not None else np.full(len(tracks_info), -1) for column in ['start_zone','finish_zone']]
+    tracks = {'track_id': encode_column(tracks_info['track_id'], 'uint32'), **dataframe_to_columns(tracks_info[['title','url']]),
+              'start_lat': encode_column(first_coords[:, 0], 'int32', 6), 'start_lon': encode_column(first_coords[:, 1], 'int32', 6),
+              'end_lat': encode_column(last_coords[:, 0], 'int32', 6), 'end_lon': encode_column(last_coords[:, 1], 'int32', 6),
+              'start_zone': encode_column(zones[0], 'int32'), 'finish_zone': encode_column(zones[1], 'int32')}
+
+    # Hubs, with the tracks starting and finishing in each one
+    hubs = None
+    if hubs_df is not None:
+        hubs = {'hub_id': encode_column(hubs_df['hub_id'], 'int32'), 'lat': encode_column(hubs_df['lat'], 'int32', 6), 'lon': encode_column(hubs_df['lon'], 'int32', 6),
+                'total_starts': encode_column(hubs_df['total_starts'], 'int32'), 'total_finishes': encode_column(hubs_df['total_finishes'], 'int32')}
+
+    waypoints = {'track_id': encode_column(waypoints_df['track_id'], 'uint32'), 'poi_id': encode_column(waypoints_df['poi_id'], 'uint32'),
+                 'lat': encode_column(waypoints_df['lat'], 'int32', 6), 'lon': encode_column(waypoints_df['lon'], 'int32', 6),
+                 'elevation': encode_column(waypoints_df['elevation'], 'float32'), **dataframe_to_columns(waypoints_df[['type','photo']])}
+
+    return {'tracks': tracks, 'hubs': hubs, 'waypoints': waypoints}
+
+# Adds the points of the data to the points layers of a map - the data is in the page, and the points are created in the browser
+def add_points_script(m, starting_points, ending_point, waypoints, points):
+
+    points_js = edges_map_points_script_js
+    for key, element in [('__STARTING_POINTS__', starting_points), ('__ENDING_POINTS__', ending_point), ('__WAYPOINTS__', waypoints)]:
+        points_js = points_js.replace(key, element.get_name())
+    script = MacroElement()
+    script._template = Template(points_js.replace('__POINTS_DATA__', json.dumps(points, separators=(',', ':'), ensure_ascii=False).replace('</', '<\\/')))
+    m.add_child(script)
+
+# Saves the data of the edges maps as compact JSON
+def save_edges_map_data(data, path):
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump(data, file, separators=(',', ':'), ensure_ascii=False)
 
+# Keeps only the points of some tracks in the shared points data
+def filter_points_map_data(points, tracks):
+
+    filtered = dict(points)
+    for key in ['tracks','waypoints']:
+        keep = np.flatnonzero(np.isin(decode_column(points[key]['track_id']), np.asarray(tracks, dtype=np.int64)))
+        filtered[key] = {name: {**column, 'data': base64.b64encode(decode_column(column)[keep].tobytes()).decode('ascii')} if isinstance(column, dict) else [column[index] for index in keep]
+                         for name, column in points[key].items()}
+
+    return filtered
+
+# Returns the HTML of the edges map of a filter to show it in a page: the shell with the data of the filter, the points of its tracks and the
+# levels of detail of its edges injected, as a page without a server can not fetch the data files. With the url of the vector tiles, the edges
+# are drawn from the tiles and they are not injected. Returns None if the filter does not have data
+def edges_map_html(maps_path, filter_name, shell_name='edges_map_shell.html', data_dir='Map-Data', tiles_url=None):
+
+    filter_path = os.path.join(maps_path, data_dir, f'{filter_name}.json')
+    if not os.path.exists(filter_path):
+        return None
+
+    # Read the shell and the data
+    with open(os.path.join(maps_path, shell_name), 'r', encoding='utf-8') as file:
+        shell_html = file.read()
+    with open(filter_path, 'r', encoding='utf-8') as file:
+        filter_data = json.load(file)
+    with open(os.path.join(maps_path, data_dir, 'points.json'), 'r', encoding='utf-8') as file:
+        points = filter_points_map_data(json.load(file), filter_data['tracks'])
+
+    # Inject the data before the scripts of the shell (and the url of the tiles, without the edges)
+    map_data = {'points': points, filter_name: filter_data}
+    if tiles_url is not None:
+        filter_data['edges'] = None
+    else:
+        with open(os.path.join(maps_path, data_dir, 'edges_lod.json'), 'r', encoding='utf-8') as file:
+            map_data['edges_lod'] = filter_edges_lod(json.load(file), filter_data['edges']['id'])
+    data_js = json.dumps(map_data, separators=(',', ':'), ensure_ascii=False).replace('</', '<\\/')
+    data_script = f'<script>window.edgesMapFilter = {json.dumps(filter_name)}; window.edgesMapTiles = {json.dumps(tiles_url)}; window.edgesMapData = {data_js};</script>'
+
+    return shell_html.replace('<head>', '<head>' + data_script, 1)
+
+# Loads the density grids of the raw points of a zone - the tiles with points (256 px tiles in Web Mercator, by tile x and y) and the pixels of
+# the zone of each zoom
+def load_density_levels(grids_path):
+
+    with np.load(grids_path) as saved:
+        zooms = sorted(int(key.split('_')[1]) for key in saved.files if key.startswith('tiles_'))
+        return {zoom: {'tiles': dict(zip(map(tuple, saved[f'keys_{zoom}'].tolist()), saved[f'tiles_{zoom}'])),
+                       'pixel_bounds': tuple(saved[f'bounds_{zoom}'].tolist())} for zoom in zooms}
+
+# Bounds (south west and north east, in lat and lon) of some pixels of a zoom
+def density_latlon_bounds(pixel_bounds, zoom):
+
+    world_size = 256 * 2 ** zoom
+    min_x, min_y, max_x, max_y = pixel_bounds
+    lon = lambda x: x / world_size * 360 - 180
+    lat = lambda y: float(np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * y / world_size)))))
+
+    return [[lat(max_y), lon(min_x)], [lat(min_y), lon(max_x)]]
+
+# Bounds (in lat and lon) of a tile of a zoom
+def density_tile_bounds(key, zoom):
+    return density_latlon_bounds((key[0] * 256, key[1] * 256, (key[0] + 1) * 256, (key[1] + 1) * 256), zoom)
+
+# Colors of the density, from the fewest to the most points (the same as the popularity)
+density_color_dict = {'Few points': tracks_color_dict['Less than 25 tracks'], 'Some points': tracks_color_dict['From 25 to 50 tracks'],
+                      'Many points': tracks_color_dict['From 50 to 75 tracks'], 'Most points': tracks_color_dict['More than 75 tracks']}
+
+# Image (RGBA) of a density tile - the colors in a logarithmic scale of the points (up to the max of the zoom), and the cells without points
+# transparent
+def density_image(counts, max_count):
+
+    scale = np.log1p(counts.astype(np.float32)) / max(np.log1p(float(max_count)), 1e-9)
+    stops = np.linspace(0, 1, len(density_color_dict))
+    colors = np.array([[int(color[i:i + 2], 16) for i in (1, 3, 5)] for color in density_color_dict.values()], dtype=float)
+
+    image = np.zeros(counts.shape + (4,), dtype=np.uint8)
+    for channel in range(3):
+        image[..., channel] = np.interp(scale, stops, colors[:, channel])
+    image[..., 3] = 90 + 150 * scale
+    image[counts == 0] = 0
+
+    return image
+
+# PNG file of an RGBA image - with a medium compression (most of the pixels of the tiles are empty, and the maximum compression is much slower)
+def density_png(image):
+
+    height, width = image.shape[:2]
+    rows = np.concatenate([np.zeros((height, 1), dtype=np.uint8), image.reshape(height, width * 4)], axis=1)
+    chunk = lambda tag, data: struct.pack('>I', len(data)) + tag + data + struct.pack('>I', zlib.crc32(tag + data))
+
+    return (b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', struct.pack('>2I5B', width, height, 8, 6, 0, 0, 0)) +
+            chunk(b'IDAT', zlib.compress(rows.tobytes(), 6)) + chunk(b'IEND', b''))
+
+# Max points of a pixel of a zoom, for the scale of its tiles
+def density_max_count(level):
+    return max((int(counts.max()) for counts in level['tiles'].values()), default=0)
+
+# Saves the density images as PNG files (one for each tile of each zoom), with their bounds in a JSON file
+def save_density_overlays(density_levels, overlays_path):
+
+    os.makedirs(overlays_path, exist_ok=True)
+    bounds = {}
+    for zoom, level in density_levels.items():
+        max_count = density_max_count(level)
+        for key, counts in level['tiles'].items():
+            name = f'density_{zoom}_{key[0]}_{key[1]}.png'
+            with open(os.path.join(overlays_path, name), 'wb') as file:
+                file.write(density_png(density_image(counts, max_count)))
+            bounds[name] = density_tile_bounds(key, zoom)
+
+    with open(os.path.join(overlays_path, 'density_bounds.json'), 'w', encoding='utf-8') as file:
+        json.dump(bounds, file)
+
+# Creates the density map of the raw points of a zone: an image for each tile of the grids, and only the images of the zoom of the map are
+# shown (the finest grid with a zoom at most one more than the map)
+def create_density_map(zone, density_levels, data_path='../../Data/Processing-Data'):
+
+    m = create_zone_map(zone, data_path)
+    density = folium.FeatureGroup(name='Raw points density', show=True).add_to(m)
+
+    # One image for each tile (in Web Mercator pixels, so they are not projected again) - they are not shown, the script adds them
+    overlays = []
+    for zoom, level in sorted(density_levels.items()):
+        max_count = density_max_count(level)
+        for key, counts in sorted(level['tiles'].items()):
+            image_url = 'data:image/png;base64,' + base64.b64encode(density_png(density_image(counts, max_count))).decode('ascii')
+            overlay = folium.raster_layers.ImageOverlay(image=image_url, bounds=density_tile_bounds(key, zoom),
+                                                        mercator_project=False, opacity=1, interactive=False, control=False, show=False)
+            overlays.append((zoom, overlay.add_to(density)))
+
+    # Script that changes the image with the zoom
+    overlays_js = ', '.join(f'{{zoom: {zoom}, overlay: {overlay.get_name()}}}' for zoom, overlay in overlays)
+    switch_js = f"""{{% macro script(this, kwargs) %}}
+        (function() {{
+            var map = {m.get_name()}, group = {density.get_name()}, overlays = [{overlays_js}];
+            function showLevel() {{
+                if (overlays.length === 0) {{ return; }}
+                var level = overlays.filter(function(level) {{ return level.zoom <= map.getZoom() + 1; }}).pop() || overlays[0];
+                overlays.forEach(function(other) {{
+                    if (other.zoom === level.zoom) {{ group.addLayer(other.overlay); }} else {{ group.removeLayer(other.overlay); }}
+                }});
+            }}
+            map.on('zoomend', showLevel);
+            showLevel();
+        }})();
+    {{% endmacro %}}"""
 
-    # Add the layer control
+    # Add the script, the legend and the layer control
+    switch = MacroElement()
+    switch._template = Template(switch_js)
+    m.add_child(switch)
+    m.add_child(create_html_legend(density_color_dict, 'Raw points density - legend', 30))
     folium.LayerControl(position='topright', collapsed=False).add_to(m)
-    GroupedLayerControl(groups={'Edges painting': layers}, collapsed=True).add_to(m)
-    GroupedLayerControl(groups={'Add widgets': points}, exclusive_groups=False, collapsed=True).add_to(m)
 
-    return m
\ No newline at end of file
+    return m
+
+# Colors (RGBA, from a color column of the groups) and widths (from the popularity group) of the edges in the WebGL maps
+def webgl_edges_styles(edges_df, color_column):
+
+    hex_colors = edges_df[color_column].fillna('#808080')
+    rgba = {color: [int(color[i:i + 2], 16) for i in (1, 3, 5)] + [255] for color in hex_colors.unique()}
+    colors = np.array([rgba[color] for color in hex_colors], dtype=np.uint8).reshape(-1, 4)
+    widths = edges_df['total_tracks_group'].map(tracks_width_dict).fillna(2).to_numpy(dtype=np.float32)
+
+    return colors, widths
+
+# Lines of the edges for the WebGL maps - one level of the level of detail pyramid (lon and lat)
+def webgl_edges_paths(edges_df, level):
+    lod = create_edges_lod(edges_df, [lod_levels[level]])
+    return lod, decode_edges_lod(lod, lod['levels'][0])
+
+# Page of the WebGL map of the edges - deck.gl with the lines, colors and widths of the edges as binary attributes (the coordinates of all the
+# lines as offsets from the origin), and a selector of the painting. The colors and widths are sent for each edge, and the page repeats them for
+# the vertices of the edge (the binary attributes of the paths are per vertex)
+webgl_edges_page = """<!DOCTYPE html>
+<html>
+<head>
+    <meta charset="utf-8">
+    <script src="https://unpkg.com/deck.gl@9.1/dist.min.js"></script>
+    <script src="https://unpkg.com/maplibre-gl@4.7/dist/maplibre-gl.js"></script>
+    <link href="https://unpkg.com/maplibre-gl@4.7/dist/maplibre-gl.css" rel="stylesheet">
+    <style>
+        body { margin: 0; font-family: sans-serif; }
+        #map { position: absolute; width: 100%; height: 100%; }
+        #painting { position: absolute; top: 10px; right: 10px; z-index: 1; padding: 6px; font-size: 12px; border: 2px solid grey; border-radius: 5px; background: white; }
+    </style>
+</head>
+<body>
+    <div id="map"></div>
+    <select id="painting"><option value="popularity">Popularity</option><option value="pace">Average pace</option></select>
+    <script>
+        var edges = __EDGES__;
+
+        // Binary arrays of the data (little endian, in base64)
+        var arrayTypes = {float32: Float32Array, uint8: Uint8Array, uint32: Uint32Array};
+        function decodeArray(column) {
+            var binary = atob(column.data), bytes = new Uint8Array(binary.length);
+            for (var i = 0; i < binary.length; i++) { bytes[i] = binary.charCodeAt(i); }
+            return new arrayTypes[column.dtype](bytes.buffer);
+        }
+        var startIndices = decodeArray(edges.start_indices), positions = decodeArray(edges.positions);
+        var edgeColors = {popularity: decodeArray(edges.popularity_colors), pace: decodeArray(edges.pace_colors)};
+
+        // Values of each edge repeated for its vertices
+        var totalEdges = edges.id.length, totalVertices = positions.length / 2;
+        function perVertex(values, size) {
+            var result = new values.constructor(totalVertices * size);
+            for (var edge = 0; edge < totalEdges; edge++) {
+                var end = edge + 1 < totalEdges ? startIndices[edge + 1] : totalVertices;
+                for (var vertex = startIndices[edge]; vertex < end; vertex++) {
+                    for (var channel = 0; channel < size; channel++) { result[vertex * size + channel] = values[edge * size + channel]; }
+                }
+            }
+            return result;
+        }
+        var vertexColors = {};
+
+        // The data (and the lines) is the same for all the paintings, only the colors attribute is changed
+        var data = {length: totalEdges, startIndices: startIndices,
+                    attributes: {getPath: {value: positions, size: 2}, getWidth: {value: perVertex(decodeArray(edges.widths), 1), size: 1}}};
+        function createLayer(painting) {
+            vertexColors[painting] = vertexColors[painting] || perVertex(edgeColors[painting], 4);
+            data.attributes.getColor = {value: vertexColors[painting], size: 4};
+            return new deck.PathLayer({
+                id: 'edges', data: data, updateTriggers: {getColor: painting},
+                coordinateSystem: deck.COORDINATE_SYSTEM.LNGLAT_OFFSETS, coordinateOrigin: edges.origin,
+                widthUnits: 'pixels', _pathType: 'open', pickable: true, autoHighlight: true
+            });
+        }
+
+        var map = new deck.DeckGL({
+            container: 'map', mapStyle: 'https://basemaps.cartocdn.com/gl/positron-gl-style/style.json',
+            initialViewState: {longitude: __LON__, latitude: __LAT__, zoom: 12}, controller: true,
+            layers: [createLayer('popularity')],
+            getTooltip: function(info) {
+                if (info.index < 0) { return null; }
+                return {html: 'Edge <b>' + edges.id[info.index] + '</b><br>Total registered tracks: ' + edges.total_tracks[info.index] +
+                              '<br>Average pace: ' + (edges.average_pace[info.index] || '-')};
+            }
+        });
+        document.getElementById('painting').addEventListener('change', function(event) { map.setProps({layers: [createLayer(event.target.value)]}); });
+    </script>
+</body>
+</html>"""
+
+# Creates the page of the WebGL map of the edges - the lines of a level of detail, and the styles of the edges, as binary arrays
+def create_webgl_edges_page(edges_df, zone, level=2, data_path='../../Data/Processing-Data'):
+
+    edges_df, _, _ = add_edges_popup_columns(edges_df)
+    lod, paths = webgl_edges_paths(edges_df, level)
+    popularity_colors, widths = webgl_edges_styles(edges_df, 'total_tracks_color')
+    pace_colors, _ = webgl_edges_styles(edges_df, 'pace_color')
+
+    # Coordinates of the vertices and first vertex of each line, and the styles of each edge
+    lengths = np.array([len(path) for path in paths])
+    positions = np.concatenate(paths) - lod['origin'] if len(paths) > 0 else np.zeros((0, 2))
+    edges = {'origin': lod['origin'], 'start_indices': encode_column(np.concatenate([[0], np.cumsum(lengths)[:-1]]), 'uint32'),
+             'positions': encode_column(positions, 'float32'), 'widths': encode_column(widths, 'float32'),
+             'popularity_colors': encode_column(popularity_colors, 'uint8'), 'pace_colors': encode_column(pace_colors, 'uint8'),
+             **dataframe_to_columns(edges_df[['id','total_tracks','average_pace']])}
+
+    center_coords = zone_center(zone, data_path)
+    edges_js = json.dumps(edges, separators=(',', ':'), ensure_ascii=False).replace('</', '<\\/')
+    return webgl_edges_page.replace('__LON__', str(center_coords[0])).replace('__LAT__', str(center_coords[1])).replace('__EDGES__', edges_js)
+
+# Compares the edges map with GeoJSON layers against the PolyLine version - generation time (creating and rendering the HTML, in seconds),
+# size of the HTML (in MB), and number of Leaflet layers created by the browser when the map is loaded
+def benchmark_edges_map(edges_df, zone, tracks_info, waypoints_df, hubs_df=None, repeats=3):
+
+    results = []
+    for name, geojson in [('polylines', False), ('geojson', True)]:
+        start = time.perf_counter()
+        for _ in range(repeats):
+            map_html = create_edges_map(edges_df, zone, tracks_info, waypoints_df, hubs_df, geojson=geojson).get_root().render()
+        results.append({'version': name, 'generation_s': round((time.perf_counter() - start) / repeats, 3), 'html_mb': round(len(map_html.encode('utf-8')) / 1e6, 3),
+                        'leaflet_layers': map_html.count('L.polyline(') + map_html.count('L.geoJson(') + map_html.count('L.circleMarker(') + map_html.count('L.marker(')})
+
+    return pd.DataFrame(results)
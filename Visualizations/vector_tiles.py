@@ -0,0 +1,282 @@
+import pandas as pd
+import numpy as np
+import os
+import math
+import gzip
+import json
+import struct
+import sqlite3
+import shapely
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Vector tiles (Mapbox Vector Tiles) of the edges network of a zone. The edges are projected to Web Mercator once, and for each zoom they are
+# simplified with the size of a pixel of the zoom, clipped to each tile and quantized to the extent of the tile. The low zooms only keep the colors
+# of the edges, the properties of the popups are only added from the detail zoom. The tiles of each filter of the maps (all the edges, each
+# difficulty, weather condition and year) are saved as a MBTiles file, and they can be served locally with the tile server of this module
+
+# Zooms of the tiles, extent of a tile (units of the coordinates) and buffer around each tile (in units, to not cut the lines in the borders)
+tiles_min_zoom = 10
+tiles_max_zoom = 16
+tile_extent = 4096
+tile_buffer = 64
+
+# Simplification tolerance (in units of the tile - 16 units are one pixel of a 256 px tile) and name of the layer of the tiles
+simplify_tolerance = 8
+tiles_layer_name = 'edges'
+
+# Properties of the edges kept in the tiles - only the colors, and all the properties of the popups from the detail zoom
+tiles_color_properties = ['total_tracks_color','pace_color']
+tiles_detail_properties = ['id','total_tracks','average_pace','pace_range']
+tiles_detail_zoom = 14
+
+# Directory of the tiles of a zone (a MBTiles file for each filter), inside its edges maps directory
+vector_tiles_dir = 'Vector-Tiles'
+
+# Url of the tile server (for example, http://127.0.0.1:8766), if it is not defined the maps use the GeoJSON edges
+tiles_server_url = os.environ.get('VECTOR_TILES_URL')
+
+# Radius of the Web Mercator sphere, and half of the size of the world (in meters)
+mercator_radius = 6378137
+mercator_origin = math.pi * mercator_radius
+
+# Url of the tiles of a filter of a zone in the tile server, given the edges maps directory of the zone - with the time of the tiles, so the
+# browsers do not use the cached tiles of an older build (None if there is no server or the tiles of the filter are not created)
+def filter_tiles_url(maps_path, zone, filter_name):
+
+    mbtiles_path = os.path.join(maps_path, vector_tiles_dir, f'{filter_name}.mbtiles')
+    if not tiles_server_url or not os.path.exists(mbtiles_path):
+        return None
+
+    return f'{tiles_server_url.rstrip("/")}/{zone}/{filter_name}/{{z}}/{{x}}/{{y}}.pbf?v={int(os.path.getmtime(mbtiles_path))}'
+
+# Projects coordinates (lon, lat) to Web Mercator (meters)
+def project_mercator(coords):
+
+    lat = np.clip(coords[:, 1], -85.0511, 85.0511)
+    return np.column_stack([np.radians(coords[:, 0]) * mercator_radius, np.log(np.tan(np.pi / 4 + np.radians(lat) / 2)) * mercator_radius])
+
+# Encodes some unsigned integers as protobuf varints
+def encode_varints(values):
+
+    encoded = bytearray()
+    for value in values:
+        while value >= 0x80:
+            encoded.append((value & 0x7f) | 0x80)
+            value >>= 7
+        encoded.append(value)
+
+    return bytes(encoded)
+
+# Encodes a field of a protobuf message - varint (wire type 0), 64 bits (wire type 1) or bytes (wire type 2, with the length)
+def encode_field(number, wire_type, value):
+
+    key = encode_varints([(number << 3) | wire_type])
+    if wire_type == 0:
+        return key + encode_varints([value])
+    if wire_type == 1:
+        return key + value
+    return key + encode_varints([len(value)]) + value
+
+# Zigzag encoding of signed integers (the small negative numbers are also small)
+def zigzag(values):
+    return (values << 1) ^ (values >> 63)
+
+# Encodes a value of the layer - string, double, unsigned integer, signed integer or bool
+def encode_value(value):
+
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, bool):
+        return encode_field(7, 0, int(value))
+    if isinstance(value, int):
+        return encode_field(5, 0, value) if value >= 0 else encode_field(6, 0, int(zigzag(np.int64(value))))
+    if isinstance(value, float):
+        return encode_field(3, 1, struct.pack('<d', value))
+    return encode_field(1, 2, str(value).encode('utf-8'))
+
+# Geometry commands of some lines in tile coordinates: a MoveTo to the first point and a LineTo with the rest, with the moves as zigzag deltas
+def encode_lines_geometry(lines):
+
+    commands, cursor = [], np.zeros(2, dtype=np.int64)
+    for line in lines:
+        deltas = zigzag(np.diff(line, axis=0, prepend=[cursor])).ravel().tolist()
+        commands += [(1 << 3) | 1] + deltas[:2] + [((len(line) - 1) << 3) | 2] + deltas[2:]
+        cursor = line[-1]
+
+    return encode_varints(commands)
+
+# Encodes a tile with one layer of lines - each feature is the id, the properties and the lines in tile coordinates
+def encode_tile(features, layer_name=tiles_layer_name, extent=tile_extent):
+
+    keys, values, encoded_features = {}, {}, []
+    for feature_id, properties, lines in features:
+
+        # Tags of the feature, the indices of the keys and the values of the layer (the empty values are not added)
+        tags = []
+        for key, value in properties.items():
+            if value is None or (isinstance(value, float) and math.isnan(value)):
+                continue
+            encoded_value = encode_value(value)
+            tags += [keys.setdefault(key, len(keys)), values.setdefault(encoded_value, len(values))]
+
+        encoded_features.append(encode_field(1, 0, int(feature_id)) + encode_field(2, 2, encode_varints(tags)) +
+                                encode_field(3, 0, 2) + encode_field(4, 2, encode_lines_geometry(lines)))
+
+    layer = (encode_field(15, 0, 2) + encode_field(1, 2, layer_name.encode('utf-8')) + b''.join(encode_field(2, 2, feature) for feature in encoded_features) +
+             b''.join(encode_field(3, 2, key.encode('utf-8')) for key in keys) + b''.join(encode_field(4, 2, value) for value in values) + encode_field(5, 0, extent))
+
+    return encode_field(3, 2, layer)
+
+# Properties of the edges in the tiles of a zoom
+def zoom_properties(zoom):
+    return tiles_color_properties + (tiles_detail_properties if zoom >= tiles_detail_zoom else [])
+
+# Given the edges dataframe (with the geometries and the properties of the maps), returns the tiles of the zooms - a dictionary with the
+# encoded tile of each (z, x, y), only the tiles with edges
+def create_vector_tiles(edges_df, min_zoom=tiles_min_zoom, max_zoom=tiles_max_zoom):
+
+    # Geometries in Web Mercator, and the properties of the edges
+    geometries = shapely.transform(shapely.from_wkt(edges_df['geometry'].to_numpy()), project_mercator)
+    properties_df = edges_df.astype(object).where(edges_df.notna(), None)
+    feature_ids = edges_df['id'].astype(int).to_numpy()
+    min_x, min_y, max_x, max_y = shapely.total_bounds(geometries)
+
+    tiles = {}
+    for zoom in range(min_zoom, max_zoom + 1):
+
+        # Size of the tiles of the zoom (in meters), and the edges simplified with the size of the units of the zoom
+        tile_size = 2 * mercator_origin / 2 ** zoom
+        unit = tile_size / tile_extent
+        simplified = shapely.simplify(geometries, simplify_tolerance * unit)
+        tree = shapely.STRtree(simplified)
+        columns = [column for column in zoom_properties(zoom) if column in properties_df.columns]
+        properties = properties_df[columns].to_dict('records')
+
+        # Tiles covering the edges
+        x_range = range(int((min_x + mercator_origin) // tile_size), int((max_x + mercator_origin) // tile_size) + 1)
+        y_range = range(int((mercator_origin - max_y) // tile_size), int((mercator_origin - min_y) // tile_size) + 1)
+        for x in x_range:
+            for y in y_range:
+
+                # Edges of the tile, clipped to the tile with the buffer
+                left, top = x * tile_size - mercator_origin, mercator_origin - y * tile_size
+                rect = (left - tile_buffer * unit, top - tile_size - tile_buffer * unit, left + tile_size + tile_buffer * unit, top + tile_buffer * unit)
+                edges = tree.query(shapely.box(*rect))
+                if len(edges) == 0:
+                    continue
+                edges = np.sort(edges)
+                parts, part_edges = shapely.get_parts(shapely.clip_by_rect(simplified[edges], *rect), return_index=True)
+                keep = shapely.get_type_id(parts) == 1
+                parts, part_edges = parts[keep], part_edges[keep]
+                if len(parts) == 0:
+                    continue
+
+                # Coordinates of the parts in units of the tile (the y grows down), without the repeated points
+                coords, coords_parts = shapely.get_coordinates(parts, return_index=True)
+                coords = np.round(np.column_stack([(coords[:, 0] - left) / unit, (top - coords[:, 1]) / unit])).astype(np.int64)
+                moved = np.concatenate([[True], (np.diff(coords, axis=0) != 0).any(axis=1) | (np.diff(coords_parts) != 0)])
+                coords, coords_parts = coords[moved], coords_parts[moved]
+                lines = np.split(coords, np.searchsorted(coords_parts, np.arange(1, len(parts))))
+
+                # Lines of each edge (the lines collapsed to a point are removed)
+                edge_lines = {}
+                for line, part_edge in zip(lines, part_edges.tolist()):
+                    if len(line) > 1:
+                        edge_lines.setdefault(edges[part_edge], []).append(line)
+                if edge_lines:
+                    tiles[(zoom, x, y)] = encode_tile([(feature_ids[edge], properties[edge], edge_lines[edge]) for edge in sorted(edge_lines)])
+
+    return tiles
+
+# Saves the tiles as MBTiles - an SQLite file with the tiles compressed (the rows of the tiles go from the south, as in TMS) and the metadata.
+# The file is written aside and then replaces the old one, so the tile server never reads a file half written
+def save_tiles_mbtiles(tiles, mbtiles_path, name):
+
+    os.makedirs(os.path.dirname(mbtiles_path), exist_ok=True)
+    temporary_path = mbtiles_path + '.tmp'
+    if os.path.exists(temporary_path):
+        os.remove(temporary_path)
+
+    # Bounds of the tiles of the max zoom, in lon and lat (the whole world if there are no tiles)
+    zooms = [zoom for zoom, _, _ in tiles] or [tiles_min_zoom, tiles_max_zoom]
+    max_zoom, min_zoom = max(zooms), min(zooms)
+    xs = [x for zoom, x, _ in tiles if zoom == max_zoom] or [0, 2 ** max_zoom - 1]
+    ys = [y for zoom, _, y in tiles if zoom == max_zoom] or [0, 2 ** max_zoom - 1]
+    tile_lon = lambda x: x / 2 ** max_zoom * 360 - 180
+    tile_lat = lambda y: math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y / 2 ** max_zoom))))
+    bounds = [tile_lon(min(xs)), tile_lat(max(ys) + 1), tile_lon(max(xs) + 1), tile_lat(min(ys))]
+
+    fields = {column: 'String' if column in tiles_color_properties + ['average_pace','pace_range'] else 'Number' for column in tiles_color_properties + tiles_detail_properties}
+    metadata = {'name': name, 'format': 'pbf', 'type': 'overlay', 'version': '2', 'minzoom': str(min_zoom), 'maxzoom': str(max_zoom),
+                'bounds': ','.join(f'{value:.6f}' for value in bounds),
+                'center': f'{(bounds[0] + bounds[2]) / 2:.6f},{(bounds[1] + bounds[3]) / 2:.6f},{min_zoom}',
+                'json': json.dumps({'vector_layers': [{'id': tiles_layer_name, 'fields': fields, 'minzoom': min_zoom, 'maxzoom': max_zoom}]})}
+
+    with sqlite3.connect(temporary_path) as connection:
+        connection.execute('CREATE TABLE metadata (name TEXT, value TEXT)')
+        connection.execute('CREATE TABLE tiles (zoom_level INTEGER, tile_column INTEGER, tile_row INTEGER, tile_data BLOB)')
+        connection.execute('CREATE UNIQUE INDEX tile_index ON tiles (zoom_level, tile_column, tile_row)')
+        connection.executemany('INSERT INTO metadata VALUES (?, ?)', list(metadata.items()))
+        connection.executemany('INSERT INTO tiles VALUES (?, ?, ?, ?)', [(zoom, x, 2 ** zoom - 1 - y, gzip.compress(tile)) for (zoom, x, y), tile in tiles.items()])
+    connection.close()
+    os.replace(temporary_path, mbtiles_path)
+
+# Reads a tile (z, x, y) of a MBTiles file - returns the compressed tile, or None if it does not exist
+def read_mbtiles_tile(mbtiles_path, zoom, x, y):
+
+    connection = sqlite3.connect(mbtiles_path)
+    row = connection.execute('SELECT tile_data FROM tiles WHERE zoom_level = ? AND tile_column = ? AND tile_row = ?', (zoom, x, 2 ** zoom - 1 - y)).fetchone()
+    connection.close()
+
+    return row[0] if row is not None else None
+
+# Summary of the tiles of each zoom - number of tiles, and the total and the largest size (in KB)
+def summarize_vector_tiles(tiles):
+
+    sizes_df = pd.DataFrame([{'zoom': zoom, 'size': len(tile)} for (zoom, _, _), tile in tiles.items()], columns=['zoom','size'])
+    summary_df = sizes_df.groupby('zoom')['size'].agg(['count','sum','max']).reset_index()
+    summary_df.columns = ['zoom','tiles','total_kb','max_tile_kb']
+    summary_df[['total_kb','max_tile_kb']] = (summary_df[['total_kb','max_tile_kb']] / 1000).round(1)
+
+    return summary_df
+
+# Local tile server of the zones - answers /<zone>/<filter>/<z>/<x>/<y>.pbf with the tiles of the MBTiles file of the filter, given the
+# visualizations directory with the edges maps of each zone
+def run_tile_server(visualizations_path, port=8766):
+
+    class TilesHandler(BaseHTTPRequestHandler):
+
+        def do_GET(self):
+
+            # Zone and tile of the path
+            parts = self.path.split('?')[0].strip('/').split('/')
+            tile = None
+            if len(parts) == 5 and parts[4].endswith('.pbf') and all(part.isdigit() for part in parts[2:4] + [parts[4][:-4]]):
+                zone, filter_name, zoom, x, y = parts[0], parts[1], int(parts[2]), int(parts[3]), int(parts[4][:-4])
+                mbtiles_path = os.path.join(visualizations_path, os.path.basename(zone), 'Edges-Maps-Visualizations', vector_tiles_dir,
+                                            f'{os.path.basename(filter_name)}.mbtiles')
+                if os.path.exists(mbtiles_path):
+                    tile = read_mbtiles_tile(mbtiles_path, zoom, x, y)
+
+            # The tiles without edges do not exist
+            self.send_response(200 if tile is not None else 404)
+            self.send_header('Access-Control-Allow-Origin', '*')
+            if tile is not None:
+                self.send_header('Content-Type', 'application/x-protobuf')
+                self.send_header('Cache-Control', 'max-age=3600')
+                self.send_header('Content-Encoding', 'gzip')
+            self.send_header('Content-Length', str(len(tile) if tile is not None else 0))
+            self.end_headers()
+            if tile is not None:
+                self.wfile.write(tile)
+
+        def log_message(self, format, *args):
+            return
+
+    server = ThreadingHTTPServer(('127.0.0.1', port), TilesHandler)
+    print(f'Vector tiles server in http://127.0.0.1:{port}/<zone>/<filter>/{{z}}/{{x}}/{{y}}.pbf')
+    server.serve_forever()
+
+# Serve the tiles of the visualizations of the streamlit directory
+if __name__ == '__main__':
+    run_tile_server('../../Data/Streamlit-Data/Visualizations')